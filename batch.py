@@ -0,0 +1,145 @@
+"""
+Offline analysis of recorded GSMTAP captures (pcap/pcapng).
+
+The captures are split into shards, one per file or editcap chunks of
+--shard-frames packets. Each shard is dissected by the capture engine in a
+process pool. The shard results are merged in capture order into one
+IdentifierModel, the privacy tests run on it, and the identifier table,
+UE-connected log, UE chains and test results are written to --out.
+
+    python3 batch.py drive1.pcapng drive2.pcapng --out results --workers 16
+"""
+import argparse
+import glob
+import json
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import capture
+from cell_context import CellContext, CellSnapshot
+from shared_queue import EventBatch
+from model import IdentifierModel, write_chains_csv, write_identifiers_csv, write_ue_events_csv
+from log_setup import add_logging_args, setup_logging
+
+def plan_shards(paths, shard_frames, tmp_dir):
+    """
+    Shard paths in capture order. Without shard_frames every file is one
+    shard; otherwise each file is cut into chunks of shard_frames packets with
+    editcap, which copies packets without dissecting them.
+    """
+    shards = []
+    for n, path in enumerate(paths):
+        if not shard_frames:
+            shards.append(path)
+            continue
+        prefix = os.path.join(tmp_dir, f"{n:04d}")
+        subprocess.run(
+            ["editcap", "-F", "pcapng", "-c", str(shard_frames), path, prefix + ".pcapng"],
+            check=True, stdout=subprocess.DEVNULL
+        )
+        # editcap names the chunks <prefix>_<chunk number>_<timestamp>.pcapng
+        shards += sorted(glob.glob(prefix + "_*"))
+    return shards
+
+def init_worker(log_level, raw_trace):
+    # one trace file per worker process, gzip members must not interleave
+    if raw_trace:
+        raw_trace = f"{raw_trace}.{os.getpid()}.gz"
+    setup_logging(log_level, raw_trace=raw_trace)
+
+def run_shard(path, input_format="fields"):
+    """
+    Dissect one shard with the capture engine. Cell/MME context that the
+    shard did not see itself is left as capture.INHERIT for merge_shards.
+    Returns (events, final context).
+    """
+    capture.reset_context(capture.INHERIT)
+    queue = EventBatch()
+    cmd = capture.build_engine_cmd(input_format=input_format, read_file=path)
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            universal_newlines=True, bufsize=1 << 16)
+    if input_format == "ek":
+        capture.read_engine_ek(proc, queue)
+    else:
+        capture.read_engine(proc, queue)
+    proc.wait()
+    return queue, capture.context_state()
+
+def _resolve(snap, carried):
+    """
+    Fill the INHERIT fields of a shard's cell snapshot from the context the
+    shards before it ended with.
+    """
+    return CellSnapshot(*(c if v == capture.INHERIT else v for v, c in zip(snap, carried)))
+
+def merge_shards(results):
+    """
+    Yield the events of all shards in order, filling in inherited context
+    from the shard before. A shard's first CELL event is dropped when it only
+    repeats the inherited cell, as a single sequential run would not have
+    reported it.
+    """
+    carried = CellContext().current
+    for events, state in results:
+        resolved = {}
+        cell_seen = False
+        for ev in events:
+            snap = ev[3]
+            if capture.INHERIT in snap:
+                if snap not in resolved:
+                    resolved[snap] = _resolve(snap, carried)
+                ev = ev[:3] + (resolved[snap],) + ev[4:]
+            if ev[0] == "CELL" and not cell_seen:
+                cell_seen = True
+                if ev[3][1:5] == carried[1:5]:
+                    continue
+            yield ev
+        carried = _resolve(state, carried)
+
+def analyze(paths, out_dir, workers=None, shard_frames=0, input_format="fields",
+            log_level="WARNING", raw_trace=None):
+    os.makedirs(out_dir, exist_ok=True)
+    # batch results are written out whole, no UE window
+    model = IdentifierModel(ue_window=None)
+    with tempfile.TemporaryDirectory(prefix="identifier-shards-") as tmp_dir:
+        shards = plan_shards(paths, shard_frames, tmp_dir)
+        print(f"[batch] {len(shards)} shard(s) from {len(paths)} file(s)")
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(log_level, raw_trace)) as pool:
+            results = pool.map(run_shard, shards, [input_format] * len(shards))
+            n_events = 0
+            for ev in merge_shards(results):
+                model.ingest(ev)
+                n_events += 1
+
+    tests = model.tests.fill()
+    write_identifiers_csv(model.ids_dict, os.path.join(out_dir, "identifiers.csv"))
+    write_ue_events_csv(model.ue_events, os.path.join(out_dir, "ue_events.csv"))
+    write_chains_csv(model.linker, os.path.join(out_dir, "chains.csv"))
+    with open(os.path.join(out_dir, "tests.json"), "w") as f:
+        json.dump(tests, f, indent=2)
+    print(f"[batch] {n_events} events, {len(model.ids_dict)} unique IDs, "
+          f"{len(model.ue_events)} UE events, {len(model.linker.linked)} UE chains -> {out_dir}")
+    for t in tests:
+        print(f"[batch] {t['name']}: {t['result']}")
+    return model, tests
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline identifier extraction from GSMTAP captures.")
+    parser.add_argument("captures", nargs="+", help="pcap/pcapng files, in capture order")
+    parser.add_argument("--out", default="batch_results", help="output directory")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="dissection processes (default: CPU count)")
+    parser.add_argument("--shard-frames", type=int, default=0,
+                        help="split files into shards of this many packets (default: one shard per file)")
+    parser.add_argument("--input-format", choices=("fields", "ek"), default="fields")
+    add_logging_args(parser, default_level="WARNING")
+    args = parser.parse_args()
+    setup_logging(args.log_level, args.log_file)
+    analyze(args.captures, args.out, args.workers, args.shard_frames, args.input_format,
+            args.log_level, args.raw_trace)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Stand-in for tshark in the benchmarks. Understands the arguments the capture
+engine passes (-T fields/ek, -e ..., -i/-r, -Y, -E, -l, -Q) and prints
+synthetic frames for the requested fields instead of dissecting anything.
+The traffic is chosen with environment variables:
+
+    BENCH_SCENARIO  scenario of bench/generator.py (default: mixed)
+    BENCH_FRAMES    frames to print before exiting (default: 100000)
+    BENCH_UES       UE population (default: 10000)
+    BENCH_RATE      frames per second, 0 = as fast as possible (default: 0)
+
+bench/harness.py puts it first on PATH as "tshark".
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from bench.generator import FrameGenerator, render_ek, render_fields
+
+def parse_args(argv):
+    fmt, fields = "fields", []
+    it = iter(argv)
+    for arg in it:
+        if arg == "-T":
+            fmt = next(it)
+        elif arg == "-e":
+            fields.append(next(it))
+        elif arg in ("-i", "-r", "-Y", "-E", "-f", "-s", "-B"):
+            next(it)
+    return fmt, fields
+
+def main():
+    fmt, fields = parse_args(sys.argv[1:])
+    gen = FrameGenerator(os.environ.get("BENCH_SCENARIO", "mixed"),
+                         ues=int(os.environ.get("BENCH_UES", 10000)))
+    frames = int(os.environ.get("BENCH_FRAMES", 100000))
+    rate = float(os.environ.get("BENCH_RATE", 0))
+    render = render_ek if fmt == "ek" else render_fields
+    out = sys.stdout
+    start = time.monotonic()
+    chunk = 1000 if not rate else max(int(rate / 100), 1)
+    sent = 0
+    while sent < frames:
+        n = min(chunk, frames - sent)
+        out.write("".join(render(frame, fields) for frame in gen.frames(n)))
+        out.flush()
+        sent += n
+        if rate:
+            delay = start + sent / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        pass
@@ -0,0 +1,291 @@
+"""
+Synthetic tshark output for the benchmarks.
+
+Frames are drawn from a scenario mix (paging storm, SIB churn, NAS-EPS/5GS
+mix, ...) over a fixed population of UEs and cells, so the number of unique
+identifiers is controlled. A frame is (frame.protocols, {field: [values]}),
+rendered like tshark does: -T fields joins repeated values with "," in the
+order of the -e list, -T ek writes an index line and a layers document.
+
+    python3 -m bench.generator --scenario paging_storm --frames 100000 > storm.txt
+"""
+import argparse
+import json
+import random
+import sys
+
+GSMTAP = "eth:ethertype:ip:udp:gsmtap"
+
+# frame kind -> weight
+SCENARIOS = {
+    "paging_storm": {"lte_paging": 85, "nr_paging": 10, "lte_sib1": 5},
+    "sib_churn": {"lte_sib1": 40, "nr_sib1": 20, "nr_sa_sib1": 10, "lte_paging": 30},
+    "nas_mix": {"nas_eps": 30, "nas_5gs": 25, "rrc_connreq": 20, "nr_setup": 10,
+                "imeisv": 5, "newueid": 10},
+    "mixed": {"lte_paging": 40, "nr_paging": 10, "lte_sib1": 5, "nr_sib1": 3, "nas_eps": 15,
+              "nas_5gs": 10, "rrc_connreq": 10, "nr_setup": 3, "imeisv": 2, "newueid": 2},
+}
+
+EMM_CODES = ["0x41", "0x42", "0x45", "0x47", "0x48", "0x52", "0x56"]
+NAS_5GS_CODES = ["0x41", "0x42", "0x45", "0x4c", "0x5c"]
+
+class FrameGenerator:
+    """
+    Endless frames of one scenario. `ues` is the UE population the
+    identifiers are drawn from, `cells` the number of distinct cells.
+    """
+    def __init__(self, scenario="mixed", ues=10000, cells=20, seed=1, start=1700000000.0, rate=1000.0):
+        self.rng = random.Random(seed)
+        kinds = SCENARIOS[scenario]
+        self.kinds = list(kinds)
+        self.weights = list(kinds.values())
+        self.tmsis = ["0x%08x" % self.rng.getrandbits(32) for _ in range(ues)]
+        self.imsis = ["24201%010d" % self.rng.randrange(10 ** 10) for _ in range(max(ues // 20, 1))]
+        self.cells = [(str(self.rng.randint(1, 65535)), str(self.rng.getrandbits(28)))
+                      for _ in range(cells)]
+        self.ts = start
+        self.step = 1.0 / rate
+        self.number = 0
+
+    def frames(self, n):
+        rng = self.rng
+        for kind in rng.choices(self.kinds, self.weights, k=n):
+            self.number += 1
+            self.ts += self.step
+            protos, fields = getattr(self, "_" + kind)(rng)
+            fields["frame.number"] = [str(self.number)]
+            fields["frame.protocols"] = [protos]
+            fields["frame.time_epoch"] = ["%.6f" % self.ts]
+            yield fields
+
+    def _tmsi(self, rng):
+        return rng.choice(self.tmsis)
+
+    def _rrc_tmsi(self, rng):
+        # lte-rrc.m_TMSI is a BIT STRING: tshark prints its bytes, no "0x"
+        return rng.choice(self.tmsis)[2:]
+
+    def _lte_paging(self, rng):
+        records = rng.randint(1, 16)
+        choices, tmsis, digits, counts = [], [], [], []
+        for _ in range(records):
+            if rng.random() < 0.02:
+                imsi = rng.choice(self.imsis)
+                choices.append("1")
+                digits += list(imsi)
+                counts.append(str(len(imsi)))
+            else:
+                choices.append("0")
+                tmsis.append(self._rrc_tmsi(rng))
+        fields = {
+            "lte-rrc.PagingRecord_element": ["1"] * records,
+            "lte-rrc.ue_Identity": choices,
+            "lte-rrc.m_TMSI": tmsis,
+        }
+        if digits:
+            fields["lte-rrc.IMSI_Digit"] = digits
+            fields["lte-rrc.imsi"] = counts
+        return GSMTAP + ":lte_rrc", fields
+
+    def _nr_paging(self, rng):
+        records = rng.randint(1, 8)
+        return GSMTAP + ":nr-rrc", {
+            "nr-rrc.pagingRecordList": ["1"],
+            "nr-rrc.ng_5G_S_TMSI": ["%012x" % rng.getrandbits(48) for _ in range(records)],
+        }
+
+    def _plmn_cell(self, rng, prefix):
+        tac, cid = rng.choice(self.cells)
+        return {
+            prefix + ".MCC_MNC_Digit": list("24201"),
+            prefix + ".mcc": ["3"],
+            prefix + ".mnc": ["2"],
+            prefix + ".trackingAreaCode": [tac],
+            prefix + ".cellIdentity": [cid],
+        }
+
+    def _lte_sib1(self, rng):
+        fields = self._plmn_cell(rng, "lte-rrc")
+        fields["lte-rrc.bCCH_DL_SCH_Message.message"] = ["1"]
+        return GSMTAP + ":lte_rrc", fields
+
+    def _nr_sib1(self, rng):
+        fields = self._plmn_cell(rng, "nr-rrc")
+        fields["nr-rrc.bCCH_DL_SCH_Message.message"] = ["1"]
+        return GSMTAP + ":nr-rrc", fields
+
+    def _nr_sa_sib1(self, rng):
+        return GSMTAP + ":nr-rrc", self._plmn_cell(rng, "nr-rrc")
+
+    def _nas_eps(self, rng):
+        fields = {
+            "nas-eps.nas_msg_emm_type": [rng.choice(EMM_CODES)],
+            "nas-eps.emm.mme_grp_id": [str(rng.randint(1, 4))],
+            "nas-eps.emm.mme_code": [str(rng.randint(1, 8))],
+        }
+        if rng.random() < 0.3:
+            fields["e212.imsi"] = [rng.choice(self.imsis)]
+        else:
+            fields["nas-eps.emm.m_tmsi"] = [self._tmsi(rng)]
+        return GSMTAP + ":lte_rrc:nas-eps", fields
+
+    def _nas_5gs(self, rng):
+        fields = {"nas-5gs.mm.message_type": [rng.choice(NAS_5GS_CODES)]}
+        r = rng.random()
+        if r < 0.6:
+            fields["nas-5gs.5g_tmsi"] = [self._tmsi(rng)]
+        elif r < 0.9:
+            fields["nas-5gs.mm.suci.msin"] = [rng.choice(self.imsis)[5:]]
+        else:
+            fields["nas-5gs.mm.imeisv"] = ["35%014d" % rng.randrange(10 ** 14)]
+        return GSMTAP + ":nr-rrc:nas-5gs", fields
+
+    def _rrc_connreq(self, rng):
+        fields = {"lte-rrc.rrcConnectionRequest_element": ["1"]}
+        if rng.random() < 0.5:
+            fields["lte-rrc.randomValue"] = ["%010x" % rng.getrandbits(40)]
+        else:
+            fields["lte-rrc.mmec"] = ["%02x" % rng.randint(1, 8)]
+            fields["lte-rrc.m_TMSI"] = [self._rrc_tmsi(rng)]
+        return GSMTAP + ":lte_rrc", fields
+
+    def _nr_setup(self, rng):
+        if rng.random() < 0.5:
+            return GSMTAP + ":nr-rrc", {"nr-rrc.randomValue": ["%010x" % (rng.getrandbits(39) << 1)]}
+        return GSMTAP + ":nr-rrc", {
+            "nr-rrc.ng_5G_S_TMSI_Part1": ["%010x" % (rng.getrandbits(39) << 1)],
+        }
+
+    def _imeisv(self, rng):
+        return GSMTAP + ":lte_rrc:nas-eps:gsm_a", {"gsm_a.imeisv": ["35%014d" % rng.randrange(10 ** 14)]}
+
+    def _newueid(self, rng):
+        return GSMTAP + ":lte_rrc", {"lte-rrc.newUE_Identity": ["%04x" % rng.getrandbits(16)]}
+
+# ---------------- GSMTAP datagrams ----------------
+# The natively decoded messages (see gsmtap_listener), UPER encoded and
+# wrapped in the GSMTAP header SCAT sends: v2 for LTE RRC, v3 for NR RRC.
+DATAGRAM_SCENARIOS = {
+    "paging_storm": {"lte_paging": 85, "nr_paging": 15},
+    "mixed": {"lte_paging": 55, "nr_paging": 15, "rrc_connreq": 20, "nr_setup": 10},
+}
+
+class BitWriter:
+    def __init__(self):
+        self.value = 0
+        self.bits = 0
+
+    def put(self, value, n):
+        self.value = self.value << n | value
+        self.bits += n
+        return self
+
+    def data(self):
+        pad = -self.bits % 8
+        return (self.value << pad).to_bytes((self.bits + pad) // 8, "big")
+
+def gsmtap_v2(gtype, sub_type, payload, frame_number=0):
+    return bytes([2, 4, gtype, 0, 0, 0, 0, 0]) + frame_number.to_bytes(4, "big") \
+        + bytes([sub_type, 0, 0, 0]) + payload
+
+def gsmtap_v3(gtype, sub_type, payload):
+    return bytes([3, 0, 0, 2]) + gtype.to_bytes(2, "big") + sub_type.to_bytes(2, "big") + payload
+
+def encode_lte_paging(tmsis=(), imsis=()):
+    w = BitWriter().put(0, 1).put(0b1000, 4).put(len(tmsis) + len(imsis) - 1, 4)
+    for tmsi in tmsis:
+        w.put(0, 3).put(0, 8).put(tmsi, 32).put(0, 1)
+    for imsi in imsis:
+        w.put(0b001, 3).put(len(imsi) - 6, 4)
+        for d in imsi:
+            w.put(int(d), 4)
+        w.put(0, 1)
+    return gsmtap_v2(0x0d, 6, w.data())
+
+def encode_nr_paging(tmsis):
+    w = BitWriter().put(0, 2).put(0b100, 3).put(len(tmsis) - 1, 5)
+    for tmsi in tmsis:
+        w.put(0, 4).put(tmsi, 48)
+    return gsmtap_v3(0x0500, 6, w.data())
+
+def encode_lte_connreq(randv=None, mmec=0, mtmsi=0):
+    w = BitWriter().put(0b010, 3)
+    if randv is not None:
+        w.put(1, 1).put(randv, 40)
+    else:
+        w.put(0, 1).put(mmec, 8).put(mtmsi, 32)
+    return gsmtap_v2(0x0d, 2, w.put(0, 4).put(0, 1).data())
+
+def encode_nr_setup(part1=None, randv=None):
+    w = BitWriter().put(0, 3)
+    w.put(0, 1).put(part1, 39) if randv is None else w.put(1, 1).put(randv, 39)
+    return gsmtap_v3(0x0500, 7, w.put(0, 4).put(0, 1).data())
+
+def generate_datagrams(n=10000, scenario="mixed", **kwargs):
+    """
+    [(timestamp, GSMTAP datagram)] of the native message types.
+    """
+    gen = FrameGenerator(**kwargs)
+    rng = gen.rng
+    kinds = DATAGRAM_SCENARIOS[scenario]
+    out = []
+    for kind in rng.choices(list(kinds), list(kinds.values()), k=n):
+        gen.ts += gen.step
+        if kind == "lte_paging":
+            k = rng.randint(1, 16)
+            imsis = [rng.choice(gen.imsis)] if k > 1 and rng.random() < 0.02 else []
+            data = encode_lte_paging([int(gen._tmsi(rng), 16) for _ in range(k - len(imsis))], imsis)
+        elif kind == "nr_paging":
+            data = encode_nr_paging([rng.getrandbits(48) for _ in range(rng.randint(1, 8))])
+        elif kind == "rrc_connreq":
+            if rng.random() < 0.5:
+                data = encode_lte_connreq(randv=rng.getrandbits(40))
+            else:
+                data = encode_lte_connreq(mmec=rng.randint(1, 8), mtmsi=int(gen._tmsi(rng), 16))
+        else:
+            data = encode_nr_setup(randv=rng.getrandbits(39)) if rng.random() < 0.5 \
+                else encode_nr_setup(part1=rng.getrandbits(39))
+        out.append((gen.ts, data))
+    return out
+
+def render_fields(frame, fields):
+    """
+    One -T fields line (tab separated) with the -e `fields` in order.
+    """
+    return "\t".join(",".join(frame.get(f, ())) for f in fields) + "\n"
+
+def _ek_key(field):
+    return field.split(".")[0] + "_" + field.replace(".", "_")
+
+def render_ek(frame, fields):
+    """
+    The index line and the document line tshark -T ek prints for a frame.
+    """
+    layers = {_ek_key(f): frame[f] for f in fields if f in frame}
+    ms = int(float(frame["frame.time_epoch"][0]) * 1000)
+    return ('{"index":{"_index":"packets","_type":"doc"}}\n'
+            + json.dumps({"timestamp": str(ms), "layers": layers}) + "\n")
+
+def generate_lines(fields, input_format="fields", n=10000, **kwargs):
+    gen = FrameGenerator(**kwargs)
+    render = render_ek if input_format == "ek" else render_fields
+    return [render(frame, fields) for frame in gen.frames(n)]
+
+def main():
+    from capture import ENGINE_FIELDS, RECORD_FIELDS
+    parser = argparse.ArgumentParser(description="Synthetic tshark output of the capture engine.")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--format", choices=("fields", "ek"), default="fields")
+    parser.add_argument("--frames", type=int, default=10000)
+    parser.add_argument("--ues", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    fields = RECORD_FIELDS if args.format == "ek" else ENGINE_FIELDS
+    gen = FrameGenerator(args.scenario, ues=args.ues, seed=args.seed)
+    render = render_ek if args.format == "ek" else render_fields
+    out = sys.stdout
+    for frame in gen.frames(args.frames):
+        out.write(render(frame, fields))
+
+if __name__ == "__main__":
+    main()
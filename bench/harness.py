@@ -0,0 +1,279 @@
+"""
+Benchmarks of the capture -> model -> GUI pipeline.
+
+    python3 -m bench.harness                       # everything
+    python3 -m bench.harness --only readers,ingest --frames 20000
+    python3 -m bench.harness --json before.json
+    python3 -m bench.harness --baseline before.json  # show change per number
+
+Sections:
+    readers   read_engine / read_engine_ek on generated lines, per scenario
+    pipeline  capture_identifiers end to end against bench/fake_tshark.py
+    native    gsmtap_listener: decode rate, events per queue item after the
+              Coalescer in a paging storm, and the rate datagrams sent over a local UDP socket
+              are decoded (sender kept at most 1000 ahead)
+    queue     capture queue latency (put -> drain, put -> reorder release)
+              at a fixed event rate with the GUI's drain interval
+    ingest    IdentifierModel.ingest_many cost per event
+    gui       Details redraw / update_gui with 1k, 10k and 100k IDs, and an
+              update without events, in an offscreen Kivy window
+"""
+import argparse
+import io
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import capture
+from bench.generator import SCENARIOS, FrameGenerator, generate_datagrams, generate_lines
+from cell_context import CellSnapshot
+from model import IdentifierModel
+from shared_queue import Coalescer, EventBatch, EventQueue, ReorderBuffer
+
+SECTIONS = ("readers", "pipeline", "native", "queue", "ingest", "gui")
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class _Proc:
+    """
+    What the readers use of a Popen: stdout.
+    """
+    def __init__(self, lines):
+        self.stdout = io.StringIO("".join(lines))
+
+def _run_reader(input_format, lines):
+    capture.reset_context()
+    queue = EventQueue(capacity=len(lines) * 100)
+    reader = capture.read_engine_ek if input_format == "ek" else capture.read_engine
+    t = time.perf_counter()
+    reader(_Proc(lines), queue)
+    return time.perf_counter() - t, queue
+
+def bench_readers(results, frames):
+    for scenario in SCENARIOS:
+        for input_format in ("fields", "ek"):
+            fields = capture.RECORD_FIELDS if input_format == "ek" else capture.ENGINE_FIELDS
+            lines = generate_lines(fields, input_format, frames, scenario=scenario)
+            elapsed, queue = _run_reader(input_format, lines)
+            name = f"readers.{scenario}.{input_format}"
+            results[name + ".frames_per_s"] = frames / elapsed
+            results[name + ".events_per_s"] = queue.events / elapsed
+
+def bench_pipeline(results, frames):
+    with tempfile.TemporaryDirectory(prefix="bench-tshark-") as bin_dir:
+        os.symlink(os.path.join(BENCH_DIR, "fake_tshark.py"), os.path.join(bin_dir, "tshark"))
+        env = dict(os.environ)
+        os.environ["PATH"] = bin_dir + os.pathsep + env.get("PATH", "")
+        os.environ["BENCH_FRAMES"] = str(frames)
+        os.environ["BENCH_SCENARIO"] = "mixed"
+        try:
+            for input_format in ("fields", "ek"):
+                capture.reset_context()
+                queue = EventQueue(capacity=frames * 100)
+                t = time.perf_counter()
+                capture.capture_identifiers(queue, input_format=input_format, restart=False)
+                elapsed = time.perf_counter() - t
+                results[f"pipeline.{input_format}.frames_per_s"] = frames / elapsed
+                results[f"pipeline.{input_format}.events_per_s"] = queue.events / elapsed
+        finally:
+            os.environ.clear()
+            os.environ.update(env)
+
+def bench_native(results, frames, port=14729):
+    import gsmtap_listener
+    datagrams = generate_datagrams(frames)
+    capture.reset_context()
+    batch = EventBatch()
+    t = time.perf_counter()
+    for ts, data in datagrams:
+        gsmtap_listener.dispatch_datagram(data, ts, batch)
+    elapsed = time.perf_counter() - t
+    results["native.decode.frames_per_s"] = frames / elapsed
+    results["native.decode.events_per_s"] = len(batch) / elapsed
+
+    # a paging storm re-paging 1000 UEs, one frame per put like the readers
+    storm = EventQueue(capacity=frames * 100)
+    coalescer = Coalescer(storm)
+    events = 0
+    for ts, data in generate_datagrams(frames, "paging_storm", ues=1000):
+        frame = EventBatch()
+        gsmtap_listener.dispatch_datagram(data, ts, frame)
+        events += len(frame)
+        coalescer.put_many(frame)
+    coalescer.stop()
+    results["native.coalesce.events_per_item"] = events / max(len(storm), 1)
+
+    queue = EventQueue(capacity=frames * 100)
+    listener = gsmtap_listener.GsmtapListener(queue, (port,))
+    listener.start()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    t = time.perf_counter()
+    for i, (_, data) in enumerate(datagrams):
+        sock.sendto(data, ("127.0.0.1", port))
+        # don't run more than a socket buffer ahead of the listener
+        while i - listener.datagrams > 1000 and time.perf_counter() - t < 30:
+            time.sleep(0.0005)
+    deadline = time.perf_counter() + 1
+    while listener.datagrams < frames and time.perf_counter() < deadline:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - t
+    listener.stop()
+    sock.close()
+    results["native.socket.frames_per_s"] = listener.datagrams / elapsed
+    results["native.socket.lost"] = frames - listener.datagrams
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0.0
+
+def bench_queue(results, rate, seconds, tick):
+    """
+    A producer thread puts one batch of 5 events per frame at `rate` events/s
+    (timestamped with the wall clock at put), the consumer drains every
+    `tick` seconds like update_gui.
+    """
+    queue = EventQueue()
+    reorder = ReorderBuffer()
+    cell = CellSnapshot(1, "242", "01", "1", "1", "", "")
+    stop = threading.Event()
+
+    def produce():
+        n = 0
+        start = time.time()
+        while not stop.is_set():
+            now = time.time()
+            due = int((now - start) * rate)
+            while n < due:
+                queue.put_many([("m-TMSI", str(n + i), now, cell, "Paging", "m-TMSI") for i in range(5)])
+                n += 5
+            time.sleep(0.001)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    drained, released = [], []
+    end = time.time() + seconds
+    while time.time() < end:
+        time.sleep(tick)
+        items = queue.drain()
+        now = time.time()
+        drained += [now - item[2] for item in items]
+        reorder.push(items)
+        released += [now - item[2] for item in reorder.pop_ready()]
+    stop.set()
+    producer.join()
+    for name, lat in (("drain", drained), ("release", released)):
+        results[f"queue.{name}.p50_ms"] = _percentile(lat, 0.5) * 1000
+        results[f"queue.{name}.p99_ms"] = _percentile(lat, 0.99) * 1000
+    results["queue.dropped"] = queue.dropped
+
+def _reader_events(frames, scenario="mixed", ues=10000):
+    lines = generate_lines(capture.ENGINE_FIELDS, "fields", frames, scenario=scenario, ues=ues)
+    _, queue = _run_reader("fields", lines)
+    return list(queue.drain())
+
+def bench_ingest(results, frames):
+    events = _reader_events(frames)
+    model = IdentifierModel()
+    t = time.perf_counter()
+    for i in range(0, len(events), 500):
+        model.ingest_many(events[i:i + 500])
+    elapsed = time.perf_counter() - t
+    results["ingest.us_per_event"] = elapsed / max(len(events), 1) * 1e6
+    results["ingest.unique_ids"] = len(model.ids_dict)
+
+def _model_with_ids(n):
+    model = IdentifierModel()
+    gen = FrameGenerator("mixed", ues=n)
+    cell = CellSnapshot(1, "242", "01", "1", "1", "", "")
+    model.ingest_many([("m-TMSI", tmsi, 1700000000.0 + i, cell, "Paging", "m-TMSI")
+                       for i, tmsi in enumerate(gen.tmsis)])
+    return model, gen
+
+def bench_gui(results, sizes, repeat=5):
+    os.environ.setdefault("SDL_VIDEODRIVER", "offscreen")
+    os.environ.setdefault("KIVY_NO_ARGS", "1")
+    os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+    from kivy.clock import Clock
+    import gui
+
+    for n in sizes:
+        model, gen = _model_with_ids(n)
+        disp = gui.IdentifierDisplayMain(model=model)
+        disp.switch_to(disp.details_tab)
+        disp._refresh_display()
+        cell = CellSnapshot(1, "242", "01", "1", "1", "", "")
+        refresh, tick, idle = [], [], []
+        for r in range(repeat):
+            # one second of a busy cell: 1000 events on known IDs, 100 of them UE rows
+            batch = [("m-TMSI", gen.tmsis[(r * 1000 + i) % n], 1700100000.0 + r + i / 1000, cell,
+                      "Attach request" if i % 10 == 0 else "Paging", "m-TMSI") for i in range(1000)]
+            t = time.perf_counter()
+            rows = model.ingest_many(batch)
+            disp.data_changed()
+            if rows:
+                disp.update_ue_info(rows)
+            t1 = time.perf_counter()
+            disp.redraw()
+            t2 = time.perf_counter()
+            refresh.append(t2 - t1)
+            tick.append(t2 - t)
+            # a tick without events redraws nothing
+            model.ingest_many([])
+            disp.redraw()
+            idle.append(time.perf_counter() - t2)
+        Clock.tick()
+        results[f"gui.{n}.refresh_ms"] = statistics.median(refresh) * 1000
+        results[f"gui.{n}.update_gui_ms"] = statistics.median(tick) * 1000
+        results[f"gui.{n}.idle_ms"] = statistics.median(idle) * 1000
+
+def report(results, baseline=None):
+    width = max(len(k) for k in results)
+    for key, val in results.items():
+        line = f"{key:<{width}}  {val:14.2f}"
+        if baseline and baseline.get(key):
+            line += f"  ({(val - baseline[key]) / baseline[key] * 100:+.1f}%)"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture/GUI pipeline benchmarks.")
+    parser.add_argument("--only", default=",".join(SECTIONS),
+                        help=f"comma separated sections (default: {','.join(SECTIONS)})")
+    parser.add_argument("--frames", type=int, default=50000, help="frames per reader run")
+    parser.add_argument("--rate", type=float, default=20000, help="events/s for the queue test")
+    parser.add_argument("--seconds", type=float, default=5, help="duration of the queue test")
+    parser.add_argument("--tick", type=float, default=1.0, help="consumer drain interval (GUI: 1.0)")
+    parser.add_argument("--gui-sizes", default="1000,10000,100000")
+    parser.add_argument("--json", metavar="FILE", help="save the results")
+    parser.add_argument("--baseline", metavar="FILE", help="compare with results saved by --json")
+    args = parser.parse_args()
+
+    sections = args.only.split(",")
+    results = {}
+    if "readers" in sections:
+        bench_readers(results, args.frames)
+    if "pipeline" in sections:
+        bench_pipeline(results, args.frames)
+    if "native" in sections:
+        bench_native(results, args.frames)
+    if "queue" in sections:
+        bench_queue(results, args.rate, args.seconds, args.tick)
+    if "ingest" in sections:
+        bench_ingest(results, args.frames)
+    if "gui" in sections:
+        bench_gui(results, [int(n) for n in args.gui_sizes.split(",")])
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,108 @@
+import argparse
+import re
 import subprocess
 import threading
-from datetime import datetime
-from shared_queue import capture_queue
+import logging
+import time
+from time import perf_counter
+import metrics
+from shared_queue import capture_queue, Coalescer, EventBatch, COALESCE_WINDOW
+from ek_stream import iter_ek_records
+from cell_context import CellContext
 
-# Keep track of last known SIB info
-last_sib1 = {"mcc": None, "mnc": None, "tac": None, "cid": None}
+# Last known SIB cell and MME info (Group and Code), published as snapshots
+cell_context = CellContext()
 
-# Global store for MME info (Group and Code)
-last_mme_info = {"group": "", "code": ""}
+# Last cell key reported by each SIB stream, so CELL events only fire on change
+last_cell_keys = {"sib": (None, None, None, None), "sib5g_sa": (None, None, None, None)}
 
-def debug_print(msg):
-    now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{now_str}] [DEBUG] {msg}")
+# Capture time (frame.time_epoch) of the frame being dispatched. Handlers
+# stamp their events with it, so timestamps don't include queue/GUI latency.
+# Per thread: the tshark reader and the native GSMTAP listener dispatch
+# frames concurrently.
+_frame = threading.local()
+
+def frame_time():
+    ts = getattr(_frame, "ts", None)
+    return ts if ts is not None else time.time()
+
+def _set_frame_time(value):
+    try:
+        _frame.ts = float(value)
+    except (TypeError, ValueError):
+        _frame.ts = None
+
+log = logging.getLogger("capture")
+# Every engine line, only written when a raw trace file is configured
+raw_log = logging.getLogger("capture.raw")
+# off until log_setup.setup_logging() is given a trace file
+raw_log.propagate = False
+raw_log.setLevel(logging.CRITICAL + 1)
+# One logger per reader stream, so each one is rate limited on its own
+LOG = {name: logging.getLogger("capture." + name) for name in (
+    "gsm_a_imeisv", "paging", "sib", "sib5g", "sib5g_sa", "sa_paging",
+    "rrc_newueid", "rrc_connreq", "nas_eps", "nas_5gs"
+)}
+# tshark's stderr: dissector warnings and the capture statistics at exit
+engine_log = logging.getLogger("capture.engine")
+
+# ---------------- Metrics ----------------
+FRAMES = metrics.Counter("capture_frames_total", "Engine lines/records read")
+PCAP_DROPPED = metrics.Counter("capture_pcap_dropped_total",
+                               "Packets tshark/libpcap dropped (capture buffer full), "
+                               "as reported by each engine when it ends")
+PARSE_SECONDS = metrics.Histogram("capture_parse_seconds", "Handler time per frame", label="stream")
+# the running tshark engine, the interface it captures on and the coalescer
+# in front of the queue
+engine_proc = None
+engine_interface = None
+coalescer = None
+
+def _engine_pid():
+    p = engine_proc
+    return p.pid if p is not None and p.returncode is None else None
+
+metrics.watch_process("tshark", _engine_pid)
+metrics.Gauge("capture_queue_depth", "Events waiting in the capture queue", lambda: len(capture_queue))
+metrics.Gauge("capture_queue_max_depth", "Highest capture queue depth seen",
+              lambda: capture_queue.max_depth)
+metrics.Gauge("capture_queue_age_seconds", "Wait of the oldest queued event", capture_queue.age)
+metrics.Gauge("capture_queue_events_total", "Events put into the capture queue",
+              lambda: capture_queue.events, kind="counter")
+metrics.Gauge("capture_queue_dropped_total", "Events dropped by a full capture queue",
+              lambda: capture_queue.dropped, kind="counter")
+metrics.Gauge("capture_coalesced_total", "Repeated events merged before the capture queue",
+              lambda: coalescer and coalescer.merged, kind="counter")
+metrics.Gauge("capture_interface_rx_packets_total", "Packets received on the capture interface",
+              lambda: engine_interface and metrics.interface_stat(engine_interface, "rx_packets"),
+              kind="counter")
+metrics.Gauge("capture_interface_rx_dropped_total",
+              "Packets the capture interface's driver dropped (/sys rx_dropped, not capture drops)",
+              lambda: engine_interface and metrics.interface_stat(engine_interface, "rx_dropped"),
+              kind="counter")
+
+# Placeholder for cell/MME context that is not known yet in a batch shard.
+# It is replaced by the previous shard's context when the shards are merged.
+INHERIT = "<inherit>"
+
+def reset_context(value=None):
+    """
+    Forget the cell and MME context, e.g. before dissecting a new batch shard.
+    """
+    cell_context.reset(value)
+    for k in last_cell_keys:
+        last_cell_keys[k] = (value, value, value, value)
+
+def set_source(name):
+    """
+    Tag the events of this process with capture source `name` (a fresh
+    context, see sources.py).
+    """
+    cell_context.source = name
+    reset_context()
+
+def context_state():
+    return cell_context.current
 
 def should_ignore_line(line):
     if not line:
@@ -51,337 +142,269 @@ def is_valid_mtmsi(val):
 
     return False
 
+# ---------------- Event helpers ----------------
+def emit_id(queue, filt, ident, ts, packet_info, disp_type, with_mme=False, with_cell=True):
+    """
+    Put one identifier event (filt, ident, ts, cell snapshot, packet_info,
+    disp_type) on the queue. The snapshot is the current cell context, without
+    the MME fields unless `with_mme`, or no cell if `with_cell` is False
+    (IMSI in paging carries no cell info).
+    """
+    if not with_cell:
+        cell = cell_context.no_cell
+    elif with_mme:
+        cell = cell_context.current
+    else:
+        cell = cell_context.no_mme
+    queue.put((filt, ident, ts, cell, packet_info, disp_type))
+
+def update_cell(stream, mcc, mnc, tac, cid, queue, packet_info):
+    """
+    Store a SIB1 cell and post a CELL event when it differs from the last
+    cell this stream reported.
+    """
+    new_key = (mcc, mnc, tac, cid)
+    changed = (new_key != last_cell_keys[stream])
+    cell_context.update(mcc=mcc, mnc=mnc, tac=tac, cid=cid)
+    if changed:
+        last_cell_keys[stream] = new_key
+        LOG[stream].debug("Updated cell => %s", cell_context.current)
+        now_ts = frame_time()
+        queue.put(("CELL", cid, now_ts, cell_context.no_mme, packet_info, "CELL"))
+
+def first(rec, field):
+    """
+    First occurrence of `field` in a typed record, or "".
+    """
+    vals = rec.get(field)
+    return vals[0] if vals else ""
+
+def plmn_from_digits(digits, mcc_counts, mnc_counts):
+    """
+    (mcc, mnc) of the first PLMN in a typed SIB record. The digit lists of all
+    PLMNs are flattened, so the per-PLMN digit counts say where MCC and MNC end.
+    """
+    try:
+        n_mcc = int(mcc_counts[0]) if mcc_counts else 3
+        n_mnc = int(mnc_counts[0]) if mnc_counts else 2
+    except ValueError:
+        n_mcc, n_mnc = 3, 2
+    return "".join(digits[:n_mcc]), "".join(digits[n_mcc:n_mcc + n_mnc])
+
 # ---------------- GSM A IMEISV ----------------
-def read_gsm_a_imeisv(proc):
-    debug_print("Entered read_gsm_a_imeisv (GSM A IMEISV).")
-    while True:
-        line = proc.stdout.readline()
-        if not line:
-            break
-        line = line.strip()
-        if should_ignore_line(line):
-            continue
-        debug_print(f"[GSM_A_IMEISV] Raw: {line}")
-        cols = line.split(",")
-        if len(cols) < 2:
-            continue
-        imeisv_val = cols[1].strip()
-        if not imeisv_val:
-            continue
-        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        ue_ts = datetime.now().strftime("%d-%m-%y %H:%M:%S")
-        packet_info = "Identity Response"
-        data_dict = {
-            "timestamp": ue_ts,
-            "id_type": "IMEISV",
-            "id": imeisv_val,
-            "packet_info": packet_info,
-            "tac": last_sib1["tac"],
-            "cid": last_sib1["cid"],
-            "mcc": last_sib1["mcc"],
-            "mnc": last_sib1["mnc"],
-            "mme_group_id": "",
-            "mme_code": ""
-        }
-        capture_queue.put(("nas-eps-ue", data_dict))
-        capture_queue.put((
-            "IMEISV",
-            imeisv_val,
-            ts,
-            last_sib1["mcc"],
-            last_sib1["mnc"],
-            last_sib1["tac"],
-            last_sib1["cid"],
-            packet_info,
-            "IMEISV",
-            "",
-            ""
-        ))
+def handle_gsm_a_imeisv(line, queue):
+    line = line.strip()
+    if should_ignore_line(line):
+        return
+    LOG["gsm_a_imeisv"].debug("Raw: %s", line)
+    cols = line.split(",")
+    if len(cols) < 2:
+        return
+    emit_gsm_a_imeisv(queue, [cols[1].strip()])
+
+def handle_gsm_a_imeisv_record(rec, queue):
+    emit_gsm_a_imeisv(queue, rec.get("gsm_a.imeisv", []))
+
+def emit_gsm_a_imeisv(queue, imeisvs):
+    ts = frame_time()
+    for imeisv_val in imeisvs:
+        if imeisv_val:
+            emit_id(queue, "IMEISV", imeisv_val, ts, "Identity Response", "IMEISV")
 
 # ---------------- LTE Paging ----------------
-def read_paging(proc):
-    debug_print("Entered read_paging (LTE Paging).")
-    while True:
-        line = proc.stdout.readline()
-        if not line:
-            break
-        line = line.strip()
-        if should_ignore_line(line):
-            continue
+def handle_paging(line, queue):
+    line = line.strip()
+    if should_ignore_line(line):
+        return
 
-        debug_print(f"[Paging] Raw: {line}")
-        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cols = line.split(",")
-        # we expect at least: frame.number, m_TMSI, IMSI_Digit
-        if len(cols) < 3:
-            continue
+    LOG["paging"].debug("Raw: %s", line)
+    ts = frame_time()
+    cols = line.split(",")
+    # we expect at least: frame.number, m_TMSI, IMSI_Digit
+    if len(cols) < 3:
+        return
 
-        # 1) gather *all* possible TMSI candidates from both cols[1] & cols[2]
-        raw_fields = cols[1:3]
-        tmsi_candidates = []
-        for field in raw_fields:
-            for sub in field.split(","):
-                sub = sub.strip()
-                if not sub:
-                    continue
-                # any valid hex or decimal string is a TMSI
-                if is_valid_mtmsi(sub):
-                    tmsi_candidates.append(sub)
-
-        # enqueue each TMSI exactly once
-        for tmsi in tmsi_candidates:
-            capture_queue.put((
-                "m-TMSI",
-                tmsi,
-                ts,
-                last_sib1["mcc"],
-                last_sib1["mnc"],
-                last_sib1["tac"],
-                last_sib1["cid"],
-                "Paging",
-                "m-TMSI",
-                last_mme_info["group"],
-                last_mme_info["code"]
-            ))
-
-        # 2) separately, pull out any *true* IMSI values (14-15 digit decimal) from the IMSI_Digit field
-        imsi_field = cols[2]
-        for sub in imsi_field.split(","):
+    # 1) gather *all* possible TMSI candidates from both cols[1] & cols[2]
+    raw_fields = cols[1:3]
+    tmsi_candidates = []
+    for field in raw_fields:
+        for sub in field.split(","):
             sub = sub.strip()
-            if is_valid_imsi(sub):
-                capture_queue.put((
-                    "IMSI",
-                    sub,
-                    ts,
-                    None,
-                    None,
-                    None,
-                    None,
-                    "Paging",
-                    "IMSI",
-                    "",
-                    ""
-                ))
+            if not sub:
+                continue
+            # any valid hex or decimal string is a TMSI
+            if is_valid_mtmsi(sub):
+                tmsi_candidates.append(sub)
+
+    # enqueue each TMSI exactly once
+    for tmsi in tmsi_candidates:
+        emit_id(queue, "m-TMSI", tmsi, ts, "Paging", "m-TMSI", with_mme=True)
 
+    # 2) separately, pull out any *true* IMSI values (14-15 digit decimal) from the IMSI_Digit field
+    imsi_field = cols[2]
+    for sub in imsi_field.split(","):
+        sub = sub.strip()
+        if is_valid_imsi(sub):
+            emit_id(queue, "IMSI", sub, ts, "Paging", "IMSI", with_cell=False)
+
+def handle_paging_record(rec, queue):
+    """
+    One pass over the paging records of a frame. lte-rrc.ue_Identity holds the
+    PagingUE-Identity choice of each record in order (0 = s-TMSI, 1 = imsi),
+    so every m-TMSI and every run of IMSI digits is attributed to its record.
+    lte-rrc.imsi is the digit count of each IMSI record.
+    """
+    ts = frame_time()
+    tmsis = rec.get("lte-rrc.m_TMSI", [])
+    digits = rec.get("lte-rrc.IMSI_Digit", [])
+    choices = rec.get("lte-rrc.ue_Identity") or ["0"] * len(tmsis) + (["1"] if digits else [])
+    tmsi_iter = iter(tmsis)
+    count_iter = iter(rec.get("lte-rrc.imsi", []))
+    pos = 0
+    for choice in choices:
+        if choice == "0":
+            tmsi = next(tmsi_iter, "")
+            if is_valid_mtmsi(tmsi):
+                emit_id(queue, "m-TMSI", tmsi, ts, "Paging", "m-TMSI", with_mme=True)
+        elif choice == "1":
+            try:
+                n = int(next(count_iter))
+            except (StopIteration, ValueError):
+                n = len(digits) - pos
+            imsi = "".join(digits[pos:pos + n])
+            pos += n
+            if is_valid_imsi(imsi):
+                emit_id(queue, "IMSI", imsi, ts, "Paging", "IMSI", with_cell=False)
 
 # ---------------- LTE SIB1 ----------------
-def read_sib(proc):
-    global last_sib1
-    debug_print("Entered read_sib (LTE SIB1).")
-    prev_key = (last_sib1["mcc"], last_sib1["mnc"], last_sib1["tac"], last_sib1["cid"])
-    while True:
-        line = proc.stdout.readline()
-        if not line:
-            break
-        line = line.strip()
-        if should_ignore_line(line):
-            continue
-        debug_print(f"[SIB] Raw line: {line}")
-        cols = line.split(",")
-        if len(cols) < 8:
-            continue
-        mcc = cols[1].strip() + cols[2].strip() + cols[3].strip()
-        mnc = cols[4].strip() + cols[5].strip()
-        tac = cols[6].strip()
-        cid = cols[7].strip()
-        new_key = (mcc, mnc, tac, cid)
-        changed = (new_key != prev_key)
-        last_sib1["mcc"] = mcc
-        last_sib1["mnc"] = mnc
-        last_sib1["tac"] = tac
-        last_sib1["cid"] = cid
-        debug_print(f"[SIB] Updated last_sib1 => {last_sib1}")
-        if changed:
-            prev_key = new_key
-            now_ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            capture_queue.put((
-                "CELL",
-                cid,
-                now_ts,
-                mcc,
-                mnc,
-                tac,
-                cid,
-                "SIB1 update",
-                "CELL",
-                "",
-                ""
-            ))
+def handle_sib(line, queue):
+    line = line.strip()
+    if should_ignore_line(line):
+        return
+    LOG["sib"].debug("Raw line: %s", line)
+    cols = line.split(",")
+    if len(cols) < 8:
+        return
+    mcc = cols[1].strip() + cols[2].strip() + cols[3].strip()
+    mnc = cols[4].strip() + cols[5].strip()
+    tac = cols[6].strip()
+    cid = cols[7].strip()
+    update_cell("sib", mcc, mnc, tac, cid, queue, "SIB1 update")
+
+def handle_sib_record(rec, queue):
+    digits = rec.get("lte-rrc.MCC_MNC_Digit", [])
+    if not digits:
+        return
+    mcc, mnc = plmn_from_digits(digits, rec.get("lte-rrc.mcc"), rec.get("lte-rrc.mnc"))
+    update_cell("sib", mcc, mnc, first(rec, "lte-rrc.trackingAreaCode"),
+                first(rec, "lte-rrc.cellIdentity"), queue, "SIB1 update")
 
 # ---------------- NSA 5G SIB1 ----------------
-def read_sib_5g(proc):
-    global last_sib1
-    debug_print("Entered read_sib_5g (5G NSA).")
-    prev_key = (last_sib1["mcc"], last_sib1["mnc"], last_sib1["tac"], last_sib1["cid"])
-    while True:
-        line = proc.stdout.readline()
-        if not line:
-            break
-        line = line.strip()
-        if should_ignore_line(line):
-            continue
-        debug_print(f"[SIB5G] Raw: {line}")
-        cols = line.split(",")
-        if len(cols) < 4:
-            continue
-        mcc_mnc_5g = cols[1].strip()
-        tac_5g = cols[2].strip()
-        cid_5g = cols[3].strip()
-        old = (last_sib1["mcc"], last_sib1["mnc"], last_sib1["tac"], last_sib1["cid"])
-        parts = mcc_mnc_5g.split(",")
-        if len(parts) >= 5:
-            mcc = parts[0] + parts[1] + parts[2]
-            mnc = parts[3] + parts[4]
-            last_sib1["mcc"] = mcc
-            last_sib1["mnc"] = mnc
-        last_sib1["tac"] = tac_5g
-        last_sib1["cid"] = cid_5g
-        debug_print(f"[SIB5G] Updated last_sib1 => {last_sib1}")
-        new = (last_sib1["mcc"], last_sib1["mnc"], last_sib1["tac"], last_sib1["cid"])
-        if new != old:
-            now_ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            capture_queue.put((
-                "CELL",
-                cid_5g,
-                now_ts,
-                last_sib1["mcc"],
-                last_sib1["mnc"],
-                tac_5g,
-                cid_5g,
-                "SIB1(5G) update",
-                "CELL",
-                "",
-                ""
-            ))
+def handle_sib_5g(line, queue):
+    line = line.strip()
+    if should_ignore_line(line):
+        return
+    LOG["sib5g"].debug("Raw: %s", line)
+    cols = line.split(",")
+    if len(cols) < 4:
+        return
+    mcc_mnc_5g = cols[1].strip()
+    tac_5g = cols[2].strip()
+    cid_5g = cols[3].strip()
+    parts = mcc_mnc_5g.split(",")
+    plmn = None
+    if len(parts) >= 5:
+        plmn = (parts[0] + parts[1] + parts[2], parts[3] + parts[4])
+    update_sib_5g(queue, plmn, tac_5g, cid_5g)
+
+def handle_sib_5g_record(rec, queue):
+    digits = rec.get("nr-rrc.MCC_MNC_Digit", [])
+    plmn = None
+    if digits:
+        plmn = plmn_from_digits(digits, rec.get("nr-rrc.mcc"), rec.get("nr-rrc.mnc"))
+    update_sib_5g(queue, plmn, first(rec, "nr-rrc.trackingAreaCode"), first(rec, "nr-rrc.cellIdentity"))
+
+def update_sib_5g(queue, plmn, tac_5g, cid_5g):
+    # compare the cell, not the snapshot: the native listener may publish a
+    # new snapshot for an MME change in between
+    old_key = cell_context.cell()
+    if plmn:
+        new = cell_context.update(mcc=plmn[0], mnc=plmn[1], tac=tac_5g, cid=cid_5g)
+    else:
+        new = cell_context.update(tac=tac_5g, cid=cid_5g)
+    LOG["sib5g"].debug("Updated cell => %s", new)
+    if (new.mcc, new.mnc, new.tac, new.cid) != old_key:
+        now_ts = frame_time()
+        queue.put(("CELL", cid_5g, now_ts, cell_context.no_mme, "SIB1(5G) update", "CELL"))
 
 # ---------------- 5G SA SIB1 ----------------
-def read_sib_5g_sa(proc):
-    global last_sib1
-    debug_print("Entered read_sib_5g_sa (5G SA SIB1).")
-    prev_key = (last_sib1["mcc"], last_sib1["mnc"], last_sib1["tac"], last_sib1["cid"])
-    while True:
-        line = proc.stdout.readline()
-        if not line:
-            break
-        line = line.strip()
-        if not line or should_ignore_line(line):
-            continue
-        debug_print(f"[SIB5G-SA] Raw: {line}")
-        cols = line.split(",")
-        if len(cols) < 8:
-            continue
-        mcc = cols[1].strip() + cols[2].strip() + cols[3].strip()
-        mnc = cols[4].strip() + cols[5].strip()
-        tac = cols[6].strip()
-        cid = cols[7].strip()
-        new_key = (mcc, mnc, tac, cid)
-        last_sib1["mcc"] = mcc
-        last_sib1["mnc"] = mnc
-        last_sib1["tac"] = tac
-        last_sib1["cid"] = cid
-        if new_key != prev_key:
-            prev_key = new_key
-            now_ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            debug_print(f"[SIB5G-SA] Updated last_sib1 => {last_sib1}")
-            capture_queue.put((
-                "CELL",
-                cid,
-                now_ts,
-                mcc,
-                mnc,
-                tac,
-                cid,
-                "SIB1(5G-SA) update",
-                "CELL",
-                "",
-                ""
-            ))
+def handle_sib_5g_sa(line, queue):
+    line = line.strip()
+    if not line or should_ignore_line(line):
+        return
+    LOG["sib5g_sa"].debug("Raw: %s", line)
+    cols = line.split(",")
+    if len(cols) < 8:
+        return
+    mcc = cols[1].strip() + cols[2].strip() + cols[3].strip()
+    mnc = cols[4].strip() + cols[5].strip()
+    tac = cols[6].strip()
+    cid = cols[7].strip()
+    update_cell("sib5g_sa", mcc, mnc, tac, cid, queue, "SIB1(5G-SA) update")
+
+def handle_sib_5g_sa_record(rec, queue):
+    digits = rec.get("nr-rrc.MCC_MNC_Digit", [])
+    if not digits:
+        return
+    mcc, mnc = plmn_from_digits(digits, rec.get("nr-rrc.mcc"), rec.get("nr-rrc.mnc"))
+    update_cell("sib5g_sa", mcc, mnc, first(rec, "nr-rrc.trackingAreaCode"),
+                first(rec, "nr-rrc.cellIdentity"), queue, "SIB1(5G-SA) update")
 
 # ---------------- 5G SA Paging ----------------
-def read_5g_paging(proc):
-    debug_print("Entered read_5g_paging (5G SA Paging).")
-    while True:
-        line = proc.stdout.readline()
-        if not line:
-            break
-        line = line.strip()
-        if should_ignore_line(line):
-            continue
-        debug_print(f"[5G Paging] Raw: {line}")
-        cols = line.split(",")
-        if len(cols) < 2:
-            continue
-        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        tmsi_5g = cols[1].strip()
-        subvals = [x.strip() for x in tmsi_5g.split(",") if x.strip()]
-        if not subvals:
-            subvals = [""]
-        for s in subvals:
-            if is_valid_mtmsi(s):
-                capture_queue.put((
-                    "5G-TMSI",
-                    s,
-                    ts,
-                    last_sib1["mcc"],
-                    last_sib1["mnc"],
-                    last_sib1["tac"],
-                    last_sib1["cid"],
-                    "Paging(5G)",
-                    "5G-TMSI",
-                    last_mme_info["group"],
-                    last_mme_info["code"]
-                ))
+def handle_5g_paging(line, queue):
+    line = line.strip()
+    if should_ignore_line(line):
+        return
+    LOG["sa_paging"].debug("Raw: %s", line)
+    cols = line.split(",")
+    if len(cols) < 2:
+        return
+    tmsi_5g = cols[1].strip()
+    emit_5g_paging(queue, [x.strip() for x in tmsi_5g.split(",") if x.strip()])
+
+def handle_5g_paging_record(rec, queue):
+    emit_5g_paging(queue, rec.get("nr-rrc.ng_5G_S_TMSI", []))
+
+def emit_5g_paging(queue, tmsis):
+    ts = frame_time()
+    for s in tmsis:
+        if is_valid_mtmsi(s):
+            emit_id(queue, "5G-TMSI", s, ts, "Paging(5G)", "5G-TMSI", with_mme=True)
 
 # ---------------- RRC newUE_Identity ----------------
-def read_rrc_newueid(proc):
-    debug_print("Entered read_rrc_newueid (RRC newUE_Identity).")
-    while True:
-        line = proc.stdout.readline()
-        if not line:
-            break
-        line = line.strip()
-        if should_ignore_line(line):
-            continue
-        debug_print(f"[RRC-UEID] Raw: {line}")
-        cols = line.split(",")
-        if len(cols) < 2:
-            continue
-        new_id = cols[1].strip()
-        if not new_id:
-            continue
-        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        ue_ts = datetime.now().strftime("%d-%m-%y %H:%M:%S")
-        data_dict = {
-            "timestamp": ue_ts,
-            "id_type": "UE-IDENTITY",
-            "id": new_id,
-            "packet_info": "RRCReconfiguration",
-            "tac": last_sib1["tac"],
-            "cid": last_sib1["cid"],
-            "mcc": last_sib1["mcc"],
-            "mnc": last_sib1["mnc"],
-            "mme_group_id": "",
-            "mme_code": ""
-        }
-        capture_queue.put(("nas-eps-ue", data_dict))
-        capture_queue.put((
-            "NAS-EPS",
-            new_id,
-            ts,
-            last_sib1["mcc"],
-            last_sib1["mnc"],
-            last_sib1["tac"],
-            last_sib1["cid"],
-            "RRCReconfiguration",
-            "UE-IDENTITY",
-            "",
-            ""
-        ))
+def handle_rrc_newueid(line, queue):
+    line = line.strip()
+    if should_ignore_line(line):
+        return
+    LOG["rrc_newueid"].debug("Raw: %s", line)
+    cols = line.split(",")
+    if len(cols) < 2:
+        return
+    emit_rrc_newueid(queue, [cols[1].strip()])
+
+def handle_rrc_newueid_record(rec, queue):
+    emit_rrc_newueid(queue, rec.get("lte-rrc.newUE_Identity", []))
+
+def emit_rrc_newueid(queue, new_ids):
+    ts = frame_time()
+    for new_id in new_ids:
+        if new_id:
+            emit_id(queue, "NAS-EPS", new_id, ts, "RRCReconfiguration", "UE-IDENTITY")
 
 # ---------------- NEW: RRC ConnectionRequest processing ----------------
-def read_rrc_connreq_merged(proc):
+def handle_rrc_connreq_merged(line, queue):
     """
-    Reads lines from the RRCConnectionRequest command.
+    Handles one line of the RRCConnectionRequest stream.
     Expected CSV fields (separated by commas):
       index 0: frame.number
       index 1: lte-rrc.randomValue
@@ -395,575 +418,677 @@ def read_rrc_connreq_merged(proc):
     Both are posted with packet_info "RRCConnectionRequest".
     We always parse mmec_str as hex => '18' => decimal 24, etc.
     """
-    debug_print("Entered read_rrc_connreq_merged.")
-    global last_mme_info
-    while True:
-        line = proc.stdout.readline()
-        if not line:
-            break
-        raw_line = line.strip()
-        # Skip any warnings
-        if "cannot find dissector" in raw_line.lower() or "falling back to data" in raw_line.lower():
-            continue
-        debug_print(f"[RRC-CONNREQ] Raw: {raw_line}")
+    raw_line = line.strip()
+    # Skip any warnings
+    if "cannot find dissector" in raw_line.lower() or "falling back to data" in raw_line.lower():
+        return
+    LOG["rrc_connreq"].debug("Raw: %s", raw_line)
 
-        cols = raw_line.split(",")
-        while len(cols) < 4:
+    cols = raw_line.split(",")
+    while len(cols) < 4:
+        cols.append("")
+    frame_str = cols[0].strip()
+    randv_str = cols[1].strip()
+    mmec_str  = cols[2].strip()
+    mtmsi_str = cols[3].strip()
+
+    if not frame_str and not randv_str and not mmec_str and not mtmsi_str:
+        return
+    emit_rrc_connreq(queue, randv_str, mmec_str, mtmsi_str)
+
+def handle_rrc_connreq_record(rec, queue):
+    emit_rrc_connreq(queue, first(rec, "lte-rrc.randomValue"), first(rec, "lte-rrc.mmec"),
+                     first(rec, "lte-rrc.m_TMSI"))
+
+def emit_rrc_connreq(queue, randv_str, mmec_str, mtmsi_str):
+    # Always interpret mmec_str as hex
+    if mmec_str:
+        try:
+            mmec_dec = str(int(mmec_str, 16))
+            cell_context.update(mme_code=mmec_dec)
+        except:
+            pass
+
+    now_ts = frame_time()
+
+    # randomValue => ID type "randomValue"
+    if is_valid_mtmsi(randv_str):
+        emit_id(queue, "NAS-EPS", randv_str, now_ts, "RRCConnectionRequest", "randomValue",
+                with_mme=True)
+
+    # m_TMSI => ID type "m-TMSI"
+    if is_valid_mtmsi(mtmsi_str):
+        emit_id(queue, "NAS-EPS", mtmsi_str, now_ts, "RRCConnectionRequest", "m-TMSI",
+                with_mme=True)
+
+# ---------------- 4G NAS‐EPS (fixed) ----------------
+EMM_TYPE_MAP = {
+    "0x41": "Attach Request",
+    "0x42": "Attach Accept",
+    "0x43": "Attach Complete",
+    "0x44": "Attach Reject",
+    "0x45": "Detach Request",
+    "0x46": "Detach Accept",
+    "0x47": "TAU Request",
+    "0x48": "TAU Accept",
+    "0x49": "TAU Complete",
+    "0x4a": "TAU Reject",
+    "0x4b": "Extended Service Request",
+    "0x4c": "Service Reject",
+    "0x4d": "GUTI Reallocation Command",
+    "0x4e": "GUTI Reallocation Complete",
+    "0x4f": "Authentication Request",
+    "0x50": "Authentication Response",
+    "0x51": "Identity Request",
+    "0x52": "Identity Response",
+    "0x53": "Security Mode Command",
+    "0x54": "Security Mode Complete",
+    "0x55": "EMM Status",
+    "0x56": "Identity Response",
+    "0x57": "Spare",
+    "0x61": "EMM Information"
+}
+
+def handle_nas_eps(line, queue):
+    line = line.rstrip("\n")
+    if not line or should_ignore_line(line):
+        return
+
+    LOG["nas_eps"].debug("Raw: %s", line)
+    cols = line.split("\t")
+    if len(cols) < 6:
+        parts = line.split()
+        if len(parts) == 3:
+            m_tmsi, imsi, emm_raw = parts
+            assoc = mme_grp = mme_cd = ""
+            emm_hex = emm_raw.lower()
+        else:
+            return
+    else:
+        while len(cols) < 6:
             cols.append("")
-        frame_str = cols[0].strip()
-        randv_str = cols[1].strip()
-        mmec_str  = cols[2].strip()
-        mtmsi_str = cols[3].strip()
+        m_tmsi, imsi, assoc, mme_grp, mme_cd, emm_raw = [c.strip() for c in cols[:6]]
+        emm_hex = emm_raw.lower()
 
-        if not frame_str and not randv_str and not mmec_str and not mtmsi_str:
+    # split out each packet code
+    codes = [c.strip().removeprefix("packet=") for c in emm_hex.split(",") if c.strip()]
+    emit_nas_eps(queue, m_tmsi, imsi, assoc, mme_grp, mme_cd, codes)
+
+def handle_nas_eps_record(rec, queue):
+    codes = [c.lower().removeprefix("packet=") for c in rec.get("nas-eps.nas_msg_emm_type", []) if c]
+    emit_nas_eps(queue, first(rec, "nas-eps.emm.m_tmsi"), first(rec, "e212.imsi"),
+                 first(rec, "e212.assoc.imsi"), first(rec, "nas-eps.emm.mme_grp_id"),
+                 first(rec, "nas-eps.emm.mme_code"), codes)
+
+def emit_nas_eps(queue, m_tmsi, imsi, assoc, mme_grp, mme_cd, codes):
+    if mme_grp:
+        cell_context.update(mme_group=mme_grp)
+    if mme_cd:
+        cell_context.update(mme_code=mme_cd)
+
+    now_ts = frame_time()
+
+    for code in codes:
+        human = EMM_TYPE_MAP.get(code, f"packet={code}") if code.startswith("0x") else f"packet={code}"
+
+        # pick which ID field to show
+        if is_valid_imsi(imsi):
+            used_type, used_id = "IMSI", imsi
+        elif is_valid_imsi(assoc):
+            used_type, used_id = "IMSI", assoc
+        elif is_valid_mtmsi(m_tmsi):
+            used_type, used_id = "m-TMSI", m_tmsi
+        else:
             continue
 
-        # Always interpret mmec_str as hex
-        if mmec_str:
-            try:
-                mmec_dec = str(int(mmec_str, 16))
-                last_mme_info["code"] = mmec_dec
-            except:
-                pass
-
-        now_ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        ue_ts  = datetime.now().strftime("%d-%m-%y %H:%M:%S")
-
-        # randomValue => ID type "randomValue"
-        if is_valid_mtmsi(randv_str):
-            data_dict_randv = {
-                "timestamp": ue_ts,
-                "id_type": "randomValue",
-                "id": randv_str,
-                "packet_info": "RRCConnectionRequest",
-                "tac": last_sib1["tac"],
-                "cid": last_sib1["cid"],
-                "mcc": last_sib1["mcc"],
-                "mnc": last_sib1["mnc"],
-                "mme_group_id": last_mme_info["group"],
-                "mme_code": last_mme_info["code"]
-            }
-            capture_queue.put(("nas-eps-ue", data_dict_randv))
-            capture_queue.put((
-                "NAS-EPS",
-                randv_str,
-                now_ts,
-                last_sib1["mcc"],
-                last_sib1["mnc"],
-                last_sib1["tac"],
-                last_sib1["cid"],
-                "RRCConnectionRequest",
-                "randomValue",
-                last_mme_info["group"],
-                last_mme_info["code"]
-            ))
-
-        # m_TMSI => ID type "m-TMSI"
-        if is_valid_mtmsi(mtmsi_str):
-            data_dict_mt = {
-                "timestamp": ue_ts,
-                "id_type": "m-TMSI",
-                "id": mtmsi_str,
-                "packet_info": "RRCConnectionRequest",
-                "tac": last_sib1["tac"],
-                "cid": last_sib1["cid"],
-                "mcc": last_sib1["mcc"],
-                "mnc": last_sib1["mnc"],
-                "mme_group_id": last_mme_info["group"],
-                "mme_code": last_mme_info["code"]
-            }
-            capture_queue.put(("nas-eps-ue", data_dict_mt))
-            capture_queue.put((
-                "NAS-EPS",
-                mtmsi_str,
-                now_ts,
-                last_sib1["mcc"],
-                last_sib1["mnc"],
-                last_sib1["tac"],
-                last_sib1["cid"],
-                "RRCConnectionRequest",
-                "m-TMSI",
-                last_mme_info["group"],
-                last_mme_info["code"]
-            ))
+        emit_id(queue, "NAS-EPS", used_id, now_ts, human, used_type, with_mme=True)
 
-# ---------------- 4G NAS‐EPS (fixed) ----------------
-# capture.py
+# ---------------- 5G SA NAS-5GS ----------------
+NAS_5GS_MSG_TYPE_MAP = {
+    "0x41": "Registration request",
+    "0x42": "Registration accept",
+    "0x43": "Registration complete",
+    "0x45": "Deregistration request",
+    "0x46": "Deregistration accept",
+    "0x4c": "Service request",
+    "0x4e": "Service accept",
+    "0x5c": "Identity response",
+    "0x61": "EMM Information",
+    "0x67": "UL NAS transport",
+    "0x68": "DL NAS transport"
+}
 
-from datetime import datetime
-import subprocess
-from shared_queue import capture_queue
-
-def read_nas_eps(proc, queue):
-    debug_print("Entered read_nas_eps (4G NAS-EPS).")
-    emm_type_map = {
-        "0x41": "Attach Request",
-        "0x42": "Attach Accept",
-        "0x43": "Attach Complete",
-        "0x44": "Attach Reject",
-        "0x45": "Detach Request",
-        "0x46": "Detach Accept",
-        "0x47": "TAU Request",
-        "0x48": "TAU Accept",
-        "0x49": "TAU Complete",
-        "0x4a": "TAU Reject",
-        "0x4b": "Extended Service Request",
-        "0x4c": "Service Reject",
-        "0x4d": "GUTI Reallocation Command",
-        "0x4e": "GUTI Reallocation Complete",
-        "0x4f": "Authentication Request",
-        "0x50": "Authentication Response",
-        "0x51": "Identity Request",
-        "0x52": "Identity Response",
-        "0x53": "Security Mode Command",
-        "0x54": "Security Mode Complete",
-        "0x55": "EMM Status",
-        "0x56": "Identity Response",
-        "0x57": "Spare",
-        "0x61": "EMM Information"
+def human_5gs_msg(code):
+    if code in NAS_5GS_MSG_TYPE_MAP:
+        return NAS_5GS_MSG_TYPE_MAP[code]
+    elif code.startswith("0x"):
+        return f"packet={code}"
+    elif code.lower() == "rrconly":
+        return "RRC Setup Request"
+    else:
+        return f"packet={code}"
+
+def handle_nas_5gs(line, queue):
+    line = line.rstrip("\n")
+    if not line or should_ignore_line(line):
+        return
+
+    LOG["nas_5gs"].debug("Raw: %s", line)
+    cols = line.split("\t")
+    while len(cols) < 9:
+        cols.append("")
+    _frame, g_tmsi, msin, imeisv, msg_field, regt, p1, p2, rv = [c.strip() for c in cols]
+    emit_nas_5gs(
+        queue,
+        tmsis=[x.strip() for x in g_tmsi.split(",") if is_valid_mtmsi(x)],
+        msins=[x.strip() for x in msin.split(",") if x.strip()],
+        imeisvs=[x.strip() for x in imeisv.split(",") if x.strip()],
+        codes=[x.strip() for x in msg_field.split(",") if x.strip()],
+        p1=p1, p2=p2,
+        rvs=[x.strip() for x in rv.split(",") if x.strip()]
+    )
+
+def handle_nas_5gs_record(rec, queue):
+    emit_nas_5gs(
+        queue,
+        tmsis=[x for x in rec.get("nas-5gs.5g_tmsi", []) if is_valid_mtmsi(x)],
+        msins=[x for x in rec.get("nas-5gs.mm.suci.msin", []) if x],
+        imeisvs=[x for x in rec.get("nas-5gs.mm.imeisv", []) if x],
+        codes=[x for x in rec.get("nas-5gs.mm.message_type", []) if x],
+        p1=first(rec, "nr-rrc.ng_5G_S_TMSI_Part1"),
+        p2=first(rec, "nr-rrc.ng_5G_S_TMSI_Part2"),
+        rvs=[x for x in rec.get("nr-rrc.randomValue", []) if x]
+    )
+
+def emit_nas_5gs(queue, tmsis, msins, imeisvs, codes, p1, p2, rvs):
+    ts = frame_time()
+
+    # IMEISV
+    for sub in imeisvs:
+        emit_id(queue, "NAS-5GS", sub, ts, "IMEISV", "IMEISV")
+
+    # MSIN
+    for sub in msins:
+        emit_id(queue, "MSIN", sub, ts, "MSIN", "MSIN")
+
+    # randomValue entries
+    for rv_val in rvs:
+        if is_valid_mtmsi(rv_val):
+            emit_id(queue, "NAS-5GS", rv_val, ts, "RRC Setup Request", "randomValue")
+
+    # Part1, Part2, Combined
+    combined = (p1 + p2).strip()
+    parts = [
+        ("RRC Setup Request (Part1)", p1),
+        ("RRC Setup Request (Part2)", p2),
+        ("RRC Setup Request", combined)
+    ]
+    for pkt_name, val in parts:
+        if val and is_valid_mtmsi(val):
+            emit_id(queue, "NAS-5GS", val, ts, pkt_name, "5G-TMSI")
+
+    # genuine 5G-TMSI per message code
+    for tmsi in tmsis:
+        for code in codes:
+            emit_id(queue, "NAS-5GS", tmsi, ts, human_5gs_msg(code), "5G-TMSI")
+
+# ---------------- Capture streams ----------------
+# Each stream used to be its own "tshark -i lo" process, so every GSMTAP frame
+# was dissected ten times. They are now served by one dissection engine: its
+# display filter is the union of the stream filters, its "-e" list is the union
+# of the stream fields, and every frame is routed to the handlers whose tag
+# matches. A stream is tagged by a field being present or by a protocol in
+# frame.protocols. In "fields" mode the handler gets the exact line the old
+# process printed; in "ek" mode the record handler gets a typed record with
+# every repeated field as a list, plus the extra "record_fields" it needs to
+# attribute repeated values without guessing.
+STREAMS = [
+    {
+        "name": "sib",
+        "filter": "lte-rrc.bCCH_DL_SCH_Message.message",
+        "tag_fields": ["lte-rrc.bCCH_DL_SCH_Message.message"],
+        "tag_protos": [],
+        "fields": ["frame.number", "lte-rrc.MCC_MNC_Digit", "lte-rrc.trackingAreaCode", "lte-rrc.cellIdentity"],
+        "separator": ",",
+        "handler": handle_sib,
+        "record_fields": ["lte-rrc.mcc", "lte-rrc.mnc"],
+        "record_handler": handle_sib_record
+    },
+    {
+        "name": "sib5g",
+        "filter": "nr-rrc.bCCH_DL_SCH_Message.message",
+        "tag_fields": ["nr-rrc.bCCH_DL_SCH_Message.message"],
+        "tag_protos": [],
+        "fields": ["nr-rrc.MCC_MNC_Digit", "nr-rrc.trackingAreaCode", "nr-rrc.cellIdentity"],
+        "separator": ",",
+        "handler": handle_sib_5g,
+        "record_fields": ["nr-rrc.mcc", "nr-rrc.mnc"],
+        "record_handler": handle_sib_5g_record
+    },
+    {
+        "name": "sib5g_sa",
+        "filter": "nr-rrc",
+        "tag_fields": [],
+        "tag_protos": ["nr-rrc"],
+        "fields": ["frame.number", "nr-rrc.MCC_MNC_Digit", "nr-rrc.trackingAreaCode", "nr-rrc.cellIdentity"],
+        "separator": ",",
+        "handler": handle_sib_5g_sa,
+        "record_fields": ["nr-rrc.mcc", "nr-rrc.mnc"],
+        "record_handler": handle_sib_5g_sa_record
+    },
+    {
+        "name": "nas_eps",
+        "filter": "nas-eps",
+        "tag_fields": [],
+        "tag_protos": ["nas-eps"],
+        "fields": [
+            "nas-eps.emm.m_tmsi", "e212.imsi", "e212.assoc.imsi",
+            "nas-eps.emm.mme_grp_id", "nas-eps.emm.mme_code", "nas-eps.nas_msg_emm_type"
+        ],
+        "separator": "\t",
+        "handler": handle_nas_eps,
+        "record_fields": [],
+        "record_handler": handle_nas_eps_record
+    },
+    {
+        "name": "rrc_connreq",
+        "filter": "lte-rrc.rrcConnectionRequest_element",
+        "tag_fields": ["lte-rrc.rrcConnectionRequest_element"],
+        "tag_protos": [],
+        "fields": ["frame.number", "lte-rrc.randomValue", "lte-rrc.mmec", "lte-rrc.m_TMSI"],
+        "separator": ",",
+        "handler": handle_rrc_connreq_merged,
+        "record_fields": [],
+        "record_handler": handle_rrc_connreq_record
+    },
+    {
+        "name": "gsm_a_imeisv",
+        "filter": "gsm_a.imeisv",
+        "tag_fields": ["gsm_a.imeisv"],
+        "tag_protos": [],
+        "fields": ["frame.number", "gsm_a.imeisv"],
+        "separator": ",",
+        "handler": handle_gsm_a_imeisv,
+        "record_fields": [],
+        "record_handler": handle_gsm_a_imeisv_record
+    },
+    {
+        "name": "paging",
+        "filter": "lte-rrc.PagingRecord_element",
+        "tag_fields": ["lte-rrc.PagingRecord_element"],
+        "tag_protos": [],
+        "fields": ["frame.number", "lte-rrc.m_TMSI", "lte-rrc.IMSI_Digit"],
+        "separator": ",",
+        "handler": handle_paging,
+        "record_fields": ["lte-rrc.ue_Identity", "lte-rrc.imsi"],
+        "record_handler": handle_paging_record
+    },
+    {
+        "name": "nas_5gs",
+        "filter": "nas-5gs or nr-rrc.ng_5G_S_TMSI_Part1 or nr-rrc.ng_5G_S_TMSI_Part2 or nr-rrc.randomValue",
+        "tag_fields": ["nr-rrc.ng_5G_S_TMSI_Part1", "nr-rrc.ng_5G_S_TMSI_Part2", "nr-rrc.randomValue"],
+        "tag_protos": ["nas-5gs"],
+        "fields": [
+            "frame.number", "nas-5gs.5g_tmsi", "nas-5gs.mm.suci.msin", "nas-5gs.mm.imeisv",
+            "nas-5gs.mm.message_type", "nas-5gs.mm.5gs_reg_type",
+            "nr-rrc.ng_5G_S_TMSI_Part1", "nr-rrc.ng_5G_S_TMSI_Part2", "nr-rrc.randomValue"
+        ],
+        "separator": "\t",
+        "handler": handle_nas_5gs,
+        "record_fields": [],
+        "record_handler": handle_nas_5gs_record
+    },
+    {
+        "name": "sa_paging",
+        "filter": "nr-rrc.pagingRecordList",
+        "tag_fields": ["nr-rrc.pagingRecordList"],
+        "tag_protos": [],
+        "fields": ["frame.number", "nr-rrc.ng_5G_S_TMSI"],
+        "separator": ",",
+        "handler": handle_5g_paging,
+        "record_fields": [],
+        "record_handler": handle_5g_paging_record
+    },
+    {
+        "name": "rrc_newueid",
+        "filter": "lte-rrc.newUE_Identity",
+        "tag_fields": ["lte-rrc.newUE_Identity"],
+        "tag_protos": [],
+        "fields": ["frame.number", "lte-rrc.newUE_Identity"],
+        "separator": ",",
+        "handler": handle_rrc_newueid,
+        "record_fields": [],
+        "record_handler": handle_rrc_newueid_record
     }
-    global last_mme_info, last_sib1
+]
 
-    while True:
-        raw = proc.stdout.readline()
-        if not raw:
-            break
-        line = raw.rstrip("\n")
-        if not line or should_ignore_line(line):
-            continue
+def _engine_fields(streams, typed=False):
+    fields = ["frame.number", "frame.protocols", "frame.time_epoch"]
+    for stream in streams:
+        extra = stream["record_fields"] if typed else []
+        for f in stream["tag_fields"] + stream["fields"] + extra:
+            if f not in fields:
+                fields.append(f)
+    return fields
 
-        debug_print(f"[NAS-EPS] Raw: {line}")
-        cols = line.split("\t")
-        if len(cols) < 6:
-            parts = line.split()
-            if len(parts) == 3:
-                m_tmsi, imsi, emm_raw = parts
-                assoc = mme_grp = mme_cd = ""
-                emm_hex = emm_raw.lower()
-            else:
-                continue
+ENGINE_FIELDS = _engine_fields(STREAMS)
+RECORD_FIELDS = _engine_fields(STREAMS, typed=True)
+
+# Column positions of each stream's tag and fields within an engine line
+for _stream in STREAMS:
+    _stream["tag_idx"] = [ENGINE_FIELDS.index(f) for f in _stream["tag_fields"]]
+    _stream["field_idx"] = [ENGINE_FIELDS.index(f) for f in _stream["fields"]]
+    _stream["parse_time"] = PARSE_SECONDS.labels(_stream["name"])
+
+# ---------------- Capture filter ----------------
+# SCAT sends GSMTAP to UDP port 4729 on loopback. The BPF capture filter keeps
+# everything else (other local services on lo) in the kernel, so tshark only
+# copies and dissects GSMTAP.
+GSMTAP_PORT = 4729
+
+# Channel name -> (GSMTAP version, type). The GSMTAP header starts right after
+# the 8 byte UDP header: udp[8] is the version and udp[10] the v2 type. SCAT
+# sends 5G NR as GSMTAP v3, which is selected by its version only.
+GSMTAP_TYPES = {
+    "um": (2, 0x01),
+    "lte_rrc": (2, 0x0d),
+    "lte_mac": (2, 0x0e),
+    "lte_nas": (2, 0x12),
+    "nr": (3, None),
+}
+
+def gsmtap_filter(ports=(GSMTAP_PORT,), types=None):
+    """
+    BPF for GSMTAP on `ports`, optionally only the GSMTAP_TYPES names in
+    `types` (None = every channel type).
+    """
+    bpf = "udp and (" + " or ".join(f"dst port {p}" for p in ports) + ")"
+    if not types:
+        return bpf
+    v2 = []
+    alts = []
+    for name in types:
+        version, gtype = GSMTAP_TYPES[name]
+        if gtype is None:
+            alts.append(f"udp[8] = {version}")
         else:
-            while len(cols) < 6:
-                cols.append("")
-            m_tmsi, imsi, assoc, mme_grp, mme_cd, emm_raw = [c.strip() for c in cols[:6]]
-            emm_hex = emm_raw.lower()
+            v2.append(f"udp[10] = {gtype:#04x}")
+    if v2:
+        alts.insert(0, "(udp[8] = 2 and (" + " or ".join(v2) + "))")
+    return f"{bpf} and ({' or '.join(alts)})"
 
-        if mme_grp:
-            last_mme_info["group"] = mme_grp
-        if mme_cd:
-            last_mme_info["code"] = mme_cd
+DEFAULT_CAPTURE_FILTER = gsmtap_filter()
 
-        # split out each packet code
-        codes = [c.strip().removeprefix("packet=") for c in emm_hex.split(",") if c.strip()]
+def _gsmtap_types(text):
+    types = [t.strip() for t in text.split(",") if t.strip()]
+    unknown = [t for t in types if t not in GSMTAP_TYPES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown GSMTAP type(s): {', '.join(unknown)}")
+    return types
 
-        now_ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        ue_ts  = datetime.now().strftime("%d-%m-%y %H:%M:%S")
+def add_capture_args(parser):
+    parser.add_argument("--gsmtap-port", type=int, action="append", metavar="PORT",
+                        help=f"UDP port(s) GSMTAP arrives on, repeatable (default: {GSMTAP_PORT})")
+    parser.add_argument("--gsmtap-types", type=_gsmtap_types, metavar="TYPES",
+                        help="only capture these GSMTAP channel types, comma separated: "
+                             + ", ".join(GSMTAP_TYPES) + " (default: all)")
+    parser.add_argument("--capture-filter", metavar="BPF",
+                        help="BPF capture filter replacing the GSMTAP one (\"\" captures everything)")
+    parser.add_argument("--snaplen", type=int, help="bytes captured per packet (tshark -s)")
+    parser.add_argument("--buffer-size", type=int, metavar="MIB",
+                        help="kernel capture buffer in MiB (tshark -B)")
+    parser.add_argument("--coalesce", type=float, default=COALESCE_WINDOW, metavar="SECONDS",
+                        help="merge repeats of an event (same ID, type, packet info and cell) "
+                             f"within this window, 0 = off (default: {COALESCE_WINDOW})")
+    parser.add_argument("--stall-timeout", type=float, default=30.0, metavar="SECONDS",
+                        help="restart tshark after this long without output while GSMTAP "
+                             "it should dissect keeps arriving (default: 30)")
+    parser.add_argument("--native-gsmtap", action="store_true",
+                        help="decode LTE/NR paging and RRC setup requests from the GSMTAP "
+                             "UDP socket instead of tshark")
 
-        for code in codes:
-            human = emm_type_map.get(code, f"packet={code}") if code.startswith("0x") else f"packet={code}"
-
-            # pick which ID field to show
-            if human.lower() == "attach request":
-                if is_valid_imsi(imsi):
-                    used_type, used_id = "IMSI", imsi
-                elif is_valid_imsi(assoc):
-                    used_type, used_id = "IMSI", assoc
-                elif is_valid_mtmsi(m_tmsi):
-                    used_type, used_id = "m-TMSI", m_tmsi
-                else:
-                    continue
-            else:
-                if is_valid_imsi(imsi):
-                    used_type, used_id = "IMSI", imsi
-                elif is_valid_imsi(assoc):
-                    used_type, used_id = "IMSI", assoc
-                elif is_valid_mtmsi(m_tmsi):
-                    used_type, used_id = "m-TMSI", m_tmsi
-                else:
-                    continue
-
-            # detail tab
-            detail = {
-                "timestamp": ue_ts,
-                "id_type": used_type,
-                "id": used_id,
-                "packet_info": human,
-                "tac": last_sib1["tac"],
-                "cid": last_sib1["cid"],
-                "mcc": last_sib1["mcc"],
-                "mnc": last_sib1["mnc"],
-                "mme_group_id": last_mme_info["group"],
-                "mme_code": last_mme_info["code"]
-            }
-            queue.put(("nas-eps-ue", detail))
-
-            # UE-connected tab
-            queue.put((
-                "NAS-EPS",
-                used_id,
-                now_ts,
-                last_sib1["mcc"],
-                last_sib1["mnc"],
-                last_sib1["tac"],
-                last_sib1["cid"],
-                human,
-                used_type,
-                last_mme_info["group"],
-                last_mme_info["code"]
-            ))
-
-
-def read_nas_5gs(proc, queue):
-    debug_print("Entered read_nas_5gs (5G SA).")
-    msg_type_map = {
-        "0x41": "Registration request",
-        "0x42": "Registration accept",
-        "0x43": "Registration complete",
-        "0x45": "Deregistration request",
-        "0x46": "Deregistration accept",
-        "0x4c": "Service request",
-        "0x4e": "Service accept",
-        "0x5c": "Identity response",
-        "0x61": "EMM Information",
-        "0x67": "UL NAS transport",
-        "0x68": "DL NAS transport"
+def capture_kwargs(args):
+    """
+    capture_identifiers() keyword arguments from the add_capture_args() flags.
+    """
+    bpf = args.capture_filter
+    if bpf is None:
+        bpf = gsmtap_filter(args.gsmtap_port or (GSMTAP_PORT,), args.gsmtap_types)
+    return {
+        "interface": args.interface,
+        "input_format": args.input_format,
+        "capture_filter": bpf,
+        "snaplen": args.snaplen,
+        "buffer_size": args.buffer_size,
+        "native_ports": tuple(args.gsmtap_port or (GSMTAP_PORT,)) if args.native_gsmtap else (),
+        "coalesce": args.coalesce,
+        "stall_timeout": args.stall_timeout,
+        # what the capture filter passes; unknown for a custom --capture-filter
+        "gsmtap": None if args.capture_filter is not None else
+                  (tuple(args.gsmtap_port or (GSMTAP_PORT,)), args.gsmtap_types),
     }
-    global last_sib1
-
-    def human_msg(code):
-        if code in msg_type_map:
-            return msg_type_map[code]
-        elif code.startswith("0x"):
-            return f"packet={code}"
-        elif code.lower() == "rrconly":
-            return "RRC Setup Request"
+
+def build_engine_cmd(interface="lo", input_format="fields", read_file=None,
+                     capture_filter=None, snaplen=None, buffer_size=None):
+    """
+    One tshark that dissects each frame once and prints the union of all
+    stream fields: tab separated in ENGINE_FIELDS order for "fields", or one
+    JSON record per frame with RECORD_FIELDS for "ek". With `read_file` it
+    reads a capture file instead of capturing live on `interface`.
+    `capture_filter` (BPF), `snaplen` and `buffer_size` (MiB) only apply to
+    live capture.
+    """
+    display_filter = " or ".join(f"({s['filter']})" for s in STREAMS)
+    if read_file:
+        source = ["-r", read_file]
+    else:
+        source = ["-i", interface]
+        if capture_filter:
+            source += ["-f", capture_filter]
+        if snaplen:
+            source += ["-s", str(snaplen)]
+        if buffer_size:
+            source += ["-B", str(buffer_size)]
+    # line buffering only matters for live capture
+    flush = [] if read_file else ["-l"]
+    cmd = ["tshark"] + source + [
+        "-Y", f"({display_filter}) and not icmp"
+    ]
+    if input_format == "ek":
+        cmd += ["-T", "ek"]
+        for f in RECORD_FIELDS:
+            cmd += ["-e", f]
+        cmd += flush + ["-Q"]
+        return cmd
+    cmd += ["-T", "fields"]
+    for f in ENGINE_FIELDS:
+        cmd += ["-e", f]
+    cmd += ["-E", "separator=\t"] + flush + ["-Q"]
+    return cmd
+
+def dispatch_line(line, queue):
+    """
+    Route one engine line to every stream whose tag matches the frame.
+    """
+    cols = line.rstrip("\n").split("\t")
+    if len(cols) < len(ENGINE_FIELDS):
+        cols += [""] * (len(ENGINE_FIELDS) - len(cols))
+    protos = cols[1].split(":")
+    _set_frame_time(cols[2])
+    for stream in STREAMS:
+        if any(cols[i] for i in stream["tag_idx"]) or any(p in protos for p in stream["tag_protos"]):
+            t = perf_counter()
+            stream["handler"](stream["separator"].join(cols[i] for i in stream["field_idx"]), queue)
+            stream["parse_time"].observe(perf_counter() - t)
+
+def dispatch_record(rec, queue):
+    """
+    Route one typed record to every stream whose tag matches the frame.
+    """
+    protos = first(rec, "frame.protocols").split(":")
+    _set_frame_time(first(rec, "frame.time_epoch"))
+    for stream in STREAMS:
+        if any(rec.get(f) for f in stream["tag_fields"]) or any(p in protos for p in stream["tag_protos"]):
+            t = perf_counter()
+            stream["record_handler"](rec, queue)
+            stream["parse_time"].observe(perf_counter() - t)
+
+# "N packets dropped from IFACE" / "(N packets dropped)" in tshark's summary
+DROPPED_RE = re.compile(r"(\d+) packets? dropped")
+
+def read_engine_stderr(proc):
+    """
+    Drain the engine's stderr: dissector warnings are logged at DEBUG (so
+    they don't clutter the output), and the packets tshark reports dropped
+    when it ends (libpcap/kernel buffer full) are counted.
+    """
+    for line in proc.stderr:
+        line = line.strip()
+        if not line:
+            continue
+        m = DROPPED_RE.search(line)
+        if m:
+            PCAP_DROPPED.inc(int(m.group(1)))
+            if int(m.group(1)):
+                engine_log.warning("%s", line)
         else:
-            return f"packet={code}"
+            engine_log.debug("%s", line)
 
+def read_engine(proc, queue):
+    """
+    The handlers of one line put their events into a local EventBatch, which
+    goes to `queue` in one put_many(): one hand-off per frame, not per event.
+    """
+    log.debug("Entered read_engine (single dissection engine).")
     while True:
-        raw = proc.stdout.readline()
-        if not raw:
+        line = proc.stdout.readline()
+        if not line:
             break
-        line = raw.rstrip("\n")
-        if not line or should_ignore_line(line):
+        raw_log.debug("%s", line.rstrip("\n"))
+        FRAMES.inc()
+        if should_ignore_line(line.strip()):
             continue
+        batch = EventBatch()
+        dispatch_line(line, batch)
+        if batch:
+            queue.put_many(batch)
 
-        debug_print(f"[NAS-5GS] Raw: {line}")
-        cols = line.split("\t")
-        while len(cols) < 9:
-            cols.append("")
-        _frame, g_tmsi, msin, imeisv, msg_field, regt, p1, p2, rv = [c.strip() for c in cols]
-        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def read_engine_ek(proc, queue):
+    log.debug("Entered read_engine_ek (single dissection engine, EK records).")
+    for rec in iter_ek_records(proc.stdout, RECORD_FIELDS):
+        raw_log.debug("%s", rec)
+        FRAMES.inc()
+        batch = EventBatch()
+        dispatch_record(rec, batch)
+        if batch:
+            queue.put_many(batch)
 
-        # detail-only IMEISV
-        for sub in imeisv.split(","):
-            sub = sub.strip()
-            if sub:
-                detail = {
-                    "timestamp": datetime.now().strftime("%d-%m-%y %H:%M:%S"),
-                    "id_type": "IMEISV",
-                    "id": sub,
-                    "packet_info": "IMEISV",
-                    "tac": last_sib1["tac"],
-                    "cid": last_sib1["cid"],
-                    "mcc": last_sib1["mcc"],
-                    "mnc": last_sib1["mnc"],
-                    "mme_group_id": "",
-                    "mme_code": ""
-                }
-                queue.put(("nas-5gs-ue", detail))
-                queue.put((
-                    "NAS-5GS", sub, ts,
-                    last_sib1["mcc"], last_sib1["mnc"],
-                    last_sib1["tac"], last_sib1["cid"],
-                    "IMEISV", "IMEISV", "", ""
-                ))
-
-        # detail-only MSIN
-        for sub in msin.split(","):
-            sub = sub.strip()
-            if sub:
-                detail = {
-                    "timestamp": datetime.now().strftime("%d-%m-%y %H:%M:%S"),
-                    "id_type": "MSIN",
-                    "id": sub,
-                    "packet_info": "MSIN",
-                    "tac": last_sib1["tac"],
-                    "cid": last_sib1["cid"],
-                    "mcc": last_sib1["mcc"],
-                    "mnc": last_sib1["mnc"],
-                    "mme_group_id": "",
-                    "mme_code": ""
-                }
-                queue.put(("nas-5gs-ue", detail))
-                queue.put((
-                    "MSIN", sub, ts,
-                    last_sib1["mcc"], last_sib1["mnc"],
-                    last_sib1["tac"], last_sib1["cid"],
-                    "MSIN", "MSIN", "", ""
-                ))
-
-        # randomValue entries
-        for rv_val in [x.strip() for x in rv.split(",") if x.strip()]:
-            if is_valid_mtmsi(rv_val):
-                detail = {
-                    "timestamp": datetime.now().strftime("%d-%m-%y %H:%M:%S"),
-                    "id_type": "randomValue",
-                    "id": rv_val,
-                    "packet_info": "RRC Setup Request",
-                    "tac": last_sib1["tac"],
-                    "cid": last_sib1["cid"],
-                    "mcc": last_sib1["mcc"],
-                    "mnc": last_sib1["mnc"],
-                    "mme_group_id": "",
-                    "mme_code": ""
-                }
-                queue.put(("nas-5gs-ue", detail))
-                queue.put((
-                    "NAS-5GS", rv_val, ts,
-                    last_sib1["mcc"], last_sib1["mnc"],
-                    last_sib1["tac"], last_sib1["cid"],
-                    "RRC Setup Request", "randomValue", "", ""
-                ))
-
-        # Part1, Part2, Combined
-        combined = (p1 + p2).strip()
-        parts = [
-            ("RRC Setup Request (Part1)", p1),
-            ("RRC Setup Request (Part2)", p2),
-            ("RRC Setup Request", combined)
-        ]
-        for pkt_name, val in parts:
-            if val and is_valid_mtmsi(val):
-                detail = {
-                    "timestamp": datetime.now().strftime("%d-%m-%y %H:%M:%S"),
-                    "id_type": "5G-TMSI",
-                    "id": val,
-                    "packet_info": pkt_name,
-                    "tac": last_sib1["tac"],
-                    "cid": last_sib1["cid"],
-                    "mcc": last_sib1["mcc"],
-                    "mnc": last_sib1["mnc"],
-                    "mme_group_id": "",
-                    "mme_code": ""
-                }
-                queue.put(("nas-5gs-ue", detail))
-                queue.put((
-                    "NAS-5GS", val, ts,
-                    last_sib1["mcc"], last_sib1["mnc"],
-                    last_sib1["tac"], last_sib1["cid"],
-                    pkt_name, "5G-TMSI", "", ""
-                ))
-
-        # genuine 5G-TMSI per message code
-        tmsis = [x.strip() for x in g_tmsi.split(",") if is_valid_mtmsi(x)]
-        codes = [x.strip() for x in msg_field.split(",") if x.strip()]
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        for tmsi in tmsis:
-            for code in codes:
-                human = human_msg(code)
-                ue_data = {
-                    "timestamp": now,
-                    "id_type": "5G-TMSI",
-                    "id": tmsi,
-                    "packet_info": human,
-                    "tac": last_sib1["tac"],
-                    "cid": last_sib1["cid"],
-                    "mcc": last_sib1["mcc"],
-                    "mnc": last_sib1["mnc"],
-                    "mme_group_id": "",
-                    "mme_code": ""
-                }
-                queue.put(("nas-5gs-ue", ue_data))
-                queue.put((
-                    "NAS-5GS", tmsi, ts,
-                    last_sib1["mcc"], last_sib1["mnc"],
-                    last_sib1["tac"], last_sib1["cid"],
-                    human, "5G-TMSI", "", ""
-                ))
-
-
-
-def capture_identifiers(queue):
-    debug_print("capture_identifiers started.")
-
-    gsm_a_imeisv_cmd = [
-        "tshark", "-i", "lo",
-        "-Y", "gsm_a.imeisv and not icmp",
-        "-T", "fields",
-        "-e", "frame.number",
-        "-e", "gsm_a.imeisv",
-        "-E", "separator=,", "-l", "-Q"
-    ]
-    paging_cmd = [
-        "tshark", "-i", "lo",
-        "-Y", "lte-rrc.PagingRecord_element and not icmp",
-        "-T", "fields",
-        "-e", "frame.number",
-        "-e", "lte-rrc.m_TMSI",
-        "-e", "lte-rrc.IMSI_Digit",
-        "-E", "separator=,", "-l", "-Q"
-    ]
-    sib_cmd = [
-        "tshark", "-i", "lo",
-        "-Y", "lte-rrc.bCCH_DL_SCH_Message.message and not icmp",
-        "-T", "fields",
-        "-e", "frame.number",
-        "-e", "lte-rrc.MCC_MNC_Digit",
-        "-e", "lte-rrc.trackingAreaCode",
-        "-e", "lte-rrc.cellIdentity",
-        "-E", "separator=,", "-l", "-Q"
-    ]
-    sib5g_cmd = [
-        "tshark", "-i", "lo",
-        "-Y", "nr-rrc.bCCH_DL_SCH_Message.message and not icmp",
-        "-T", "fields",
-        "-e", "nr-rrc.MCC_MNC_Digit",
-        "-e", "nr-rrc.trackingAreaCode",
-        "-e", "nr-rrc.cellIdentity",
-        "-E", "separator=,", "-l", "-Q"
-    ]
-    nas_eps_cmd = [
-        "tshark", "-i", "lo",
-        "-Y", "nas-eps and not icmp",
-        "-T", "fields",
-        "-e", "nas-eps.emm.m_tmsi",
-        "-e", "e212.imsi",
-        "-e", "e212.assoc.imsi",
-        "-e", "nas-eps.emm.mme_grp_id",
-        "-e", "nas-eps.emm.mme_code",
-        "-e", "nas-eps.nas_msg_emm_type",
-        "-E", "separator=\t", "-l", "-Q"
-    ]
-    nas_5gs_cmd = [
-        "tshark", "-i", "lo",
-        "-Y", "(nas-5gs or nr-rrc.ng_5G_S_TMSI_Part1 or nr-rrc.ng_5G_S_TMSI_Part2 or nr-rrc.randomValue) and not icmp",
-        "-T", "fields",
-        "-e", "frame.number",
-        "-e", "nas-5gs.5g_tmsi",
-        "-e", "nas-5gs.mm.suci.msin",
-        "-e", "nas-5gs.mm.imeisv",
-        "-e", "nas-5gs.mm.message_type",
-        "-e", "nas-5gs.mm.5gs_reg_type",
-        "-e", "nr-rrc.ng_5G_S_TMSI_Part1",
-        "-e", "nr-rrc.ng_5G_S_TMSI_Part2",
-        "-e", "nr-rrc.randomValue",
-        "-E", "separator=\t", "-l", "-Q"
-    ]
-    sa_paging_cmd = [
-        "tshark", "-i", "lo",
-        "-Y", "nr-rrc.pagingRecordList and not icmp",
-        "-T", "fields",
-        "-e", "frame.number",
-        "-e", "nr-rrc.ng_5G_S_TMSI",
-        "-E", "separator=,", "-l", "-Q"
-    ]
-    sib5g_sa_cmd = [
-        "tshark", "-i", "lo",
-        "-Y", "nr-rrc and not icmp",
-        "-T", "fields",
-        "-e", "frame.number",
-        "-e", "nr-rrc.MCC_MNC_Digit",
-        "-e", "nr-rrc.trackingAreaCode",
-        "-e", "nr-rrc.cellIdentity",
-        "-E", "separator=,", "-l", "-Q"
-    ]
-    rrc_newueid_cmd = [
-        "tshark", "-i", "lo",
-        "-Y", "lte-rrc.newUE_Identity and not icmp",
-        "-T", "fields",
-        "-e", "frame.number",
-        "-e", "lte-rrc.newUE_Identity",
-        "-E", "separator=,", "-l", "-Q"
-    ]
-    # EXACT command that works for RRCConnectionRequest:
-    rrc_connreq_merged_cmd = [
-        "tshark", "-i", "lo",
-        "-Y", "lte-rrc.rrcConnectionRequest_element and not icmp",
-        "-T", "fields",
-        "-e", "frame.number",
-        "-e", "lte-rrc.randomValue",
-        "-e", "lte-rrc.mmec",
-        "-e", "lte-rrc.m_TMSI",
-        "-E", "separator=,", "-l"
-    ]
+def _start_native(queue, interface, ports, capture_filter):
+    """
+    Start a GsmtapListener on `ports` and return (listener, capture filter
+    without the channels it decodes). If the ports can't be bound, tshark
+    keeps dissecting everything: (None, capture_filter).
+    """
+    from gsmtap_listener import GsmtapListener, exclude_native
 
-    debug_print("Starting TShark subprocesses.")
+    host = "127.0.0.1" if interface == "lo" else ""
+    try:
+        listener = GsmtapListener(queue, ports, host=host)
+    except OSError as e:
+        log.warning("Native GSMTAP listener unavailable (%s), tshark dissects everything.", e)
+        return None, capture_filter
+    listener.start()
+    log.info("Native GSMTAP listener on UDP %s.", ", ".join(map(str, ports)))
+    return listener, exclude_native(capture_filter, ports)
 
-    from threading import Thread
+def _engine_traffic(interface, gsmtap, native_ports):
+    """
+    supervisor.EngineTraffic counting what the engine should dissect, or
+    None (no stall restarts) if that is unknown or can't be counted.
+    """
+    from supervisor import EngineTraffic
 
-    # Send other TShark processes' stderr to DEVNULL so warnings don't clutter
-    p_gsm_a = subprocess.Popen(gsm_a_imeisv_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
-                               bufsize=1, universal_newlines=True)
-    p_paging = subprocess.Popen(paging_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
-                                bufsize=1, universal_newlines=True)
-    p_sib = subprocess.Popen(sib_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
-                             bufsize=1, universal_newlines=True)
-    p_sib5g = subprocess.Popen(sib5g_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
-                               bufsize=1, universal_newlines=True)
-    p_nas = subprocess.Popen(nas_eps_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
-                             bufsize=1, universal_newlines=True)
-    p_5gs = subprocess.Popen(nas_5gs_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
-                             bufsize=1, universal_newlines=True)
-    p_sa_pg = subprocess.Popen(sa_paging_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
-                               bufsize=1, universal_newlines=True)
-    p_sib5g_sa = subprocess.Popen(sib5g_sa_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
-                                  bufsize=1, universal_newlines=True)
-    p_rrc_nu = subprocess.Popen(rrc_newueid_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    if gsmtap is None:
+        log.info("Custom capture filter: engine stall restarts are off.")
+        return None
+    ports, types = gsmtap
+    exclude = ()
+    if native_ports:
+        from gsmtap_listener import CHANNELS
+        exclude = list(CHANNELS)
+    try:
+        return EngineTraffic(interface, ports, [GSMTAP_TYPES[t] for t in types] if types else None,
+                             exclude)
+    except (OSError, ValueError) as e:
+        log.warning("Can't count the engine's packets on %s (%s): engine stall restarts are off.",
+                    interface, e)
+        return None
+
+def start_engine(queue, interface="lo", input_format="fields", capture_filter=None,
+                 snaplen=None, buffer_size=None):
+    """
+    Start one tshark engine and its reader thread. Returns (process, thread).
+    """
+    engine_cmd = build_engine_cmd(interface, input_format, capture_filter=capture_filter,
+                                  snaplen=snaplen, buffer_size=buffer_size)
+    global engine_proc, engine_interface
+    p_engine = subprocess.Popen(engine_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
                                 bufsize=1, universal_newlines=True)
+    engine_proc, engine_interface = p_engine, interface
+    threading.Thread(target=read_engine_stderr, args=(p_engine,), daemon=True).start()
+    reader = read_engine_ek if input_format == "ek" else read_engine
+    t_engine = threading.Thread(target=reader, args=(p_engine, queue), daemon=True)
+    t_engine.start()
+    return p_engine, t_engine
 
-    # For the RRC ConnectionRequest command, merge stderr→stdout so we can parse lines
-    p_connreq_merged = subprocess.Popen(
-        rrc_connreq_merged_cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        bufsize=1, universal_newlines=True
-    )
+def capture_identifiers(queue, interface="lo", input_format="fields", capture_filter=DEFAULT_CAPTURE_FILTER,
+                        snaplen=None, buffer_size=None, native_ports=(), coalesce=0,
+                        stall_timeout=30.0, restart=True, gsmtap=None):
+    """
+    Run the tshark engine on `interface`, putting events on `queue`. The
+    engine is supervised (supervisor.py): if it exits or stalls for
+    `stall_timeout` seconds it is restarted with backoff, and the restarts
+    are posted on `queue` as ("status", {...}). With restart=False it runs
+    once. With `native_ports`, LTE/NR paging and RRC setup requests are
+    decoded straight from the GSMTAP socket(s) by gsmtap_listener and
+    excluded from tshark's capture filter. With `coalesce` > 0, repeats of
+    an event within that many seconds are merged before the queue.
+    `gsmtap` = (ports, GSMTAP_TYPES names or None) describes what
+    `capture_filter` passes; the stall test only counts those packets and
+    is off without it.
+    """
+    from supervisor import EngineSupervisor
+
+    log.info("capture_identifiers started.")
+
+    global coalescer
+    events = queue
+    if coalesce > 0:
+        events = coalescer = Coalescer(queue, coalesce).start()
+
+    listener = None
+    if native_ports:
+        listener, capture_filter = _start_native(events, interface, native_ports, capture_filter)
+    log.info("Capture filter: %s", capture_filter or "none")
 
-    t_gsm_a = Thread(target=read_gsm_a_imeisv, args=(p_gsm_a,))
-    t_pg    = Thread(target=read_paging, args=(p_paging,))
-    t_sib_  = Thread(target=read_sib, args=(p_sib,))
-    t_sib5g = Thread(target=read_sib_5g, args=(p_sib5g,))
-    t_ne    = Thread(target=read_nas_eps, args=(p_nas, capture_queue))
-    t_n5    = Thread(target=read_nas_5gs, args=(p_5gs, capture_queue))
-    t_sa_pg = Thread(target=read_5g_paging, args=(p_sa_pg,))
-    t_sib5g_sa = Thread(target=read_sib_5g_sa, args=(p_sib5g_sa,))
-    t_rrc_nu = Thread(target=read_rrc_newueid, args=(p_rrc_nu,))
-    t_connreq_merged = Thread(target=read_rrc_connreq_merged, args=(p_connreq_merged,))
-
-    # Start threads
-    t_gsm_a.start()
-    t_pg.start()
-    t_sib_.start()
-    t_sib5g.start()
-    t_ne.start()
-    t_n5.start()
-    t_sa_pg.start()
-    t_sib5g_sa.start()
-    t_rrc_nu.start()
-    t_connreq_merged.start()
-
-    debug_print("Threads running. Press Ctrl+C to stop.")
+    traffic = _engine_traffic(interface, gsmtap, native_ports if listener else ())
+    supervisor = EngineSupervisor(
+        lambda: start_engine(events, interface, input_format, capture_filter, snaplen, buffer_size),
+        progress=lambda: FRAMES._default.value,
+        traffic=traffic,
+        status_queue=queue, stall_timeout=stall_timeout,
+        max_restarts=None if restart else 0)
+    log.info("Starting TShark engine. Press Ctrl+C to stop.")
     try:
-        t_gsm_a.join()
-        t_pg.join()
-        t_sib_.join()
-        t_sib5g.join()
-        t_ne.join()
-        t_n5.join()
-        t_sa_pg.join()
-        t_sib5g_sa.join()
-        t_rrc_nu.join()
-        t_connreq_merged.join()
+        supervisor.run()
     except KeyboardInterrupt:
-        debug_print("KeyboardInterrupt => stopping.")
+        log.info("KeyboardInterrupt => stopping.")
     finally:
-        procs = [
-            p_gsm_a, p_paging, p_sib, p_sib5g, p_nas,
-            p_5gs, p_sa_pg, p_sib5g_sa, p_rrc_nu, p_connreq_merged
-        ]
-        for p in procs:
-            p.terminate()
-        for p in procs:
-            p.wait()
-        debug_print("capture_identifiers finished.")
+        supervisor.stop()
+        if listener is not None:
+            listener.stop()
+        if traffic is not None:
+            traffic.close()
+        if events is not queue:
+            events.stop()
+        log.info("capture_identifiers finished.")
@@ -0,0 +1,77 @@
+"""
+Serving cell and MME context of the capture.
+
+Writers (the tshark reader and the native GSMTAP listener) are serialized
+by a lock. Every change publishes a new immutable CellSnapshot by replacing
+CellContext.current, a single reference swap, so
+another thread reading `current` always sees a consistent
+MCC/MNC/TAC/CID/MME combination and never a half-updated one. Events carry
+the snapshot object itself instead of copies of its six strings.
+"""
+import threading
+from collections import namedtuple
+
+# `source` is the capture source (modem) the context belongs to, "" for the
+# single default source; it tags every event through its snapshot.
+CellSnapshot = namedtuple("CellSnapshot", "version mcc mnc tac cid mme_group mme_code source",
+                          defaults=("",))
+
+# Context of events that carry no cell info (e.g. IMSI in paging)
+NO_CELL = CellSnapshot(0, None, None, None, None, "", "")
+
+class CellContext:
+    def __init__(self, fill=None, source=""):
+        self._lock = threading.Lock()
+        self.source = source
+        self.reset(fill)
+
+    def reset(self, fill=None):
+        """
+        Forget the context. `fill` is the value of every field (None for
+        unknown, or a batch placeholder); the MME fields default to "".
+        """
+        mme = "" if fill is None else fill
+        self._version = 0
+        self._no_mme = None
+        self.current = CellSnapshot(0, fill, fill, fill, fill, mme, mme, self.source)
+        self.no_cell = NO_CELL._replace(source=self.source)
+
+    def update(self, **changes):
+        """
+        Publish a snapshot with `changes` applied. Returns the current
+        snapshot, which is the old object if nothing changed.
+        """
+        with self._lock:
+            cur = self.current
+            new = cur._replace(**changes)
+            if new == cur:
+                return cur
+            self._version += 1
+            self.current = new._replace(version=self._version)
+            return self.current
+
+    def cell(self):
+        snap = self.current
+        return (snap.mcc, snap.mnc, snap.tac, snap.cid)
+
+    @property
+    def no_mme(self):
+        """
+        The current snapshot without MME info, for events that don't report
+        it. Derived once per version.
+        """
+        snap = self.current
+        if not snap.mme_group and not snap.mme_code:
+            return snap
+        nm = self._no_mme
+        if nm is None or nm.version != snap.version:
+            nm = self._no_mme = snap._replace(mme_group="", mme_code="")
+        return nm
+
+def event_from_json(item):
+    """
+    Rebuild an event tuple from its JSON form (the snapshot becomes a list).
+    A merged event keeps its repeat count as the seventh element.
+    """
+    filt, ident, ts, cell, packet_info, disp_type, *repeats = item
+    return (filt, ident, ts, CellSnapshot(*cell), packet_info, disp_type, *repeats)
@@ -1,13 +1,65 @@
+import argparse
 import threading
-from capture import capture_identifiers, capture_queue
+from capture import capture_identifiers, capture_queue, add_capture_args, capture_kwargs
+from daemon import attach, DEFAULT_SOCKET
 from gui import IdentifierApp
+from log_setup import add_logging_args, setup_from_args
+from session_store import add_session_args, open_session
+from metrics import add_metrics_args, start_from_args
+from model import IdentifierModel, UE_WINDOW
+from sources import add_source_args, check_sources, start_sources
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Identifier capture and GUI.")
+    parser.add_argument("--interface", default="lo",
+                        help="interface tshark captures GSMTAP on (default: lo)")
+    parser.add_argument("--input-format", choices=("fields", "ek"), default="fields",
+                        help="tshark output read by the engine: -T fields lines or -T ek JSON records")
+    parser.add_argument("--attach", nargs="?", const=DEFAULT_SOCKET, metavar="SOCKET",
+                        help="show the state of a running daemon.py instead of capturing "
+                             f"(default socket: {DEFAULT_SOCKET})")
+    parser.add_argument("--ue-window", type=int, default=UE_WINDOW,
+                        help=f"UE-connected rows kept in memory (default: {UE_WINDOW})")
+    parser.add_argument("--ue-spill", metavar="CSV",
+                        help="append UE-connected rows that leave the window to this CSV file")
+    add_capture_args(parser)
+    add_source_args(parser)
+    add_session_args(parser)
+    add_metrics_args(parser)
+    add_logging_args(parser)
+    args = parser.parse_args()
+    if args.db and args.attach:
+        parser.error("--db records a local capture; start the daemon with --db instead")
+    if args.source and args.attach:
+        parser.error("--source captures locally; start the daemon with --source instead")
+    check_sources(parser, args)
+    return args
 
 def main():
-    tcap = threading.Thread(target=capture_identifiers, args=(capture_queue,))
-    tcap.daemon=True
-    tcap.start()
+    args = parse_args()
+    setup_from_args(args)
+    start_from_args(args)
+    model = IdentifierModel(args.ue_window, args.ue_spill)
+    store = open_session(args, model)
+    sources = []
+    if args.source:
+        sources = start_sources(args, capture_queue)
+    else:
+        if args.attach:
+            tcap = threading.Thread(target=attach, args=(capture_queue, args.attach))
+        else:
+            tcap = threading.Thread(target=capture_identifiers, args=(capture_queue,),
+                                    kwargs=capture_kwargs(args))
+        tcap.daemon=True
+        tcap.start()
 
-    IdentifierApp().run()
+    try:
+        IdentifierApp(model=model).run()
+    finally:
+        for source in sources:
+            source.stop()
+        if store is not None:
+            store.close()
 
 if __name__=="__main__":
     main()
@@ -0,0 +1,262 @@
+"""
+Headless capture daemon.
+
+Runs the capture engine, the identifier aggregation and the privacy tests
+without Kivy, so it can run for days on a field box with no display. The live
+state is served on a unix socket, and any number of GUIs can attach with
+`controller.py --attach`.
+
+Protocol: newline-delimited JSON. The client sends one command line:
+    {"cmd": "snapshot"}   -> one {"type": "snapshot", ...} line, then close
+    {"cmd": "subscribe"}  -> a snapshot line, then {"type": "events", "items": [[...], ...]}
+                             for every batch of new capture events, and
+                             {"type": "status", "status": {...}} when the
+                             capture engine changes state (see supervisor.py)
+"""
+import argparse
+import errno
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import sys
+import threading
+import time
+
+import capture
+from cell_context import event_from_json
+from shared_queue import capture_queue, EventQueue, ReorderBuffer
+from model import IdentifierModel, UE_WINDOW
+from log_setup import add_logging_args, setup_from_args
+from session_store import add_session_args, open_session
+from sources import add_source_args, check_sources, start_sources
+import metrics
+
+log = logging.getLogger("daemon")
+
+INGEST_SECONDS = metrics.Histogram("daemon_ingest_seconds", "Model ingest and fan-out per batch")
+
+DEFAULT_SOCKET = "/tmp/identifier-app.sock"
+# events buffered per subscriber before a slow client is dropped
+SUBSCRIBER_BACKLOG = 100000
+
+class IdentifierDaemon:
+    def __init__(self, model=None):
+        self.model = model if model is not None else IdentifierModel()
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.events = 0
+        # last state change of the capture engine, per capture source
+        self.engine_status = {}
+
+    def consume(self, source=capture_queue):
+        """
+        Aggregate capture events and fan them out to the subscribers, one
+        batch per drain of the capture queue. Runs on its own thread for the
+        lifetime of the daemon.
+        """
+        reorder = ReorderBuffer()
+        while True:
+            events = []
+            for item in source.drain(timeout=reorder.window):
+                if not isinstance(item, tuple):
+                    continue
+                if len(item) in (6, 7):
+                    events.append(item)
+                elif item[0] == "status":
+                    self._post_status(item)
+            reorder.push(events)
+            items = reorder.pop_ready()
+            if not items:
+                continue
+            t = time.perf_counter()
+            with self.lock:
+                self.model.ingest_many(items)
+                self.events += len(items)
+                for sub in list(self.subscribers):
+                    sub.put_many(items)
+                    if sub.dropped:
+                        # the client can't keep up; it gets a fresh snapshot on reconnect
+                        self.subscribers.remove(sub)
+            INGEST_SECONDS.observe(time.perf_counter() - t)
+
+    def _post_status(self, item):
+        with self.lock:
+            self.engine_status[item[1].get("source", "")] = item[1]
+            for sub in self.subscribers:
+                sub.put(item)
+
+    def _snapshot_locked(self):
+        snap = self.model.snapshot()
+        snap["engine"] = list(self.engine_status.values())
+        snap["tests"] = self.model.tests.fill()
+        snap["events"] = self.events
+        snap["queue"] = capture_queue.stats()
+        snap["type"] = "snapshot"
+        return snap
+
+    def snapshot(self):
+        with self.lock:
+            return self._snapshot_locked()
+
+    def subscribe(self):
+        """
+        Register a subscriber. Returns (snapshot, event queue) taken under the
+        same lock, so no event is missed or delivered twice.
+        """
+        sub = EventQueue(SUBSCRIBER_BACKLOG)
+        with self.lock:
+            snap = self._snapshot_locked()
+            self.subscribers.append(sub)
+        return snap, sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            if sub in self.subscribers:
+                self.subscribers.remove(sub)
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon = self.server.daemon_state
+        try:
+            req = json.loads(self.rfile.readline() or "{}")
+        except ValueError:
+            return
+        cmd = req.get("cmd")
+        if cmd == "snapshot":
+            self._send(daemon.snapshot())
+        elif cmd == "subscribe":
+            snap, sub = daemon.subscribe()
+            try:
+                self._send(snap)
+                while not sub.dropped:
+                    items = sub.drain(timeout=1.0)
+                    events = [item for item in items if item[0] != "status"]
+                    for item in items:
+                        if item[0] == "status":
+                            self._send({"type": "status", "status": item[1]})
+                    if events:
+                        self._send({"type": "events", "items": events})
+            except OSError:
+                pass
+            finally:
+                daemon.unsubscribe(sub)
+        else:
+            self._send({"type": "error", "error": f"unknown command {cmd!r}"})
+
+    def _send(self, msg):
+        self.wfile.write((json.dumps(msg) + "\n").encode())
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+def _remove_stale_socket(path):
+    """
+    Remove the socket a daemon that died left at `path`. Raises OSError if
+    another daemon still listens there, or `path` is not a socket.
+    """
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(errno.EEXIST, f"{path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(path)
+        except ConnectionRefusedError:
+            log.info("removing stale socket %s", path)
+            os.unlink(path)
+            return
+        except FileNotFoundError:
+            return
+    raise OSError(errno.EADDRINUSE, f"another daemon is already serving {path}")
+
+def serve(daemon, path=DEFAULT_SOCKET):
+    _remove_stale_socket(path)
+    server = _Server(path, _Handler)
+    server.daemon_state = daemon
+    return server
+
+def attach(out_queue, path=DEFAULT_SOCKET, retry=2.0):
+    """
+    GUI side: subscribe to a running daemon and feed its state into out_queue,
+    first ("snapshot", data), then the event tuples. Reconnects if the daemon
+    goes away.
+    """
+    while True:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.connect(path)
+                s.sendall(b'{"cmd": "subscribe"}\n')
+                for line in s.makefile("r"):
+                    msg = json.loads(line)
+                    if msg["type"] == "snapshot":
+                        out_queue.put(("snapshot", msg))
+                        for status in msg.get("engine") or ():
+                            out_queue.put(("status", status))
+                    elif msg["type"] == "status":
+                        out_queue.put(("status", msg["status"]))
+                    elif msg["type"] == "events":
+                        out_queue.put_many([event_from_json(item) for item in msg["items"]])
+        except (OSError, ValueError) as e:
+            log.warning("attach %s: %s", path, e)
+        time.sleep(retry)
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless identifier capture daemon.")
+    parser.add_argument("--interface", default="lo",
+                        help="interface tshark captures GSMTAP on (default: lo)")
+    parser.add_argument("--input-format", choices=("fields", "ek"), default="fields")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET,
+                        help=f"unix socket GUIs attach to (default: {DEFAULT_SOCKET})")
+    parser.add_argument("--ue-window", type=int, default=UE_WINDOW,
+                        help=f"UE-connected rows kept in memory (default: {UE_WINDOW})")
+    parser.add_argument("--ue-spill", metavar="CSV",
+                        help="append UE-connected rows that leave the window to this CSV file")
+    capture.add_capture_args(parser)
+    add_source_args(parser)
+    add_session_args(parser)
+    metrics.add_metrics_args(parser)
+    add_logging_args(parser)
+    args = parser.parse_args()
+    check_sources(parser, args)
+    setup_from_args(args)
+    metrics.start_from_args(args)
+
+    model = IdentifierModel(args.ue_window, args.ue_spill)
+    daemon = IdentifierDaemon(model)
+    # claim the socket before capturing, so a second daemon stops right away
+    try:
+        server = serve(daemon, args.socket)
+    except OSError as e:
+        log.error("can't serve %s: %s", args.socket, e.strerror or e)
+        return 1
+    store = open_session(args, model)
+    sources = []
+    if args.source:
+        sources = start_sources(args, capture_queue)
+    else:
+        tcap = threading.Thread(target=capture.capture_identifiers, args=(capture_queue,),
+                                kwargs=capture.capture_kwargs(args))
+        tcap.daemon = True
+        tcap.start()
+    threading.Thread(target=daemon.consume, daemon=True).start()
+
+    log.info("capturing on %s, serving %s", args.interface, args.socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+        for source in sources:
+            source.stop()
+        if store is not None:
+            store.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+import json
+
+# tshark -T ek prints one JSON document per line: an {"index": ...} line
+# followed by {"timestamp": ..., "layers": {...}} for every frame. Depending on
+# the tshark version the layer keys are the requested field with "." replaced
+# by "_" ("lte-rrc_m_TMSI") or additionally prefixed with the protocol
+# ("lte-rrc_lte-rrc_m_TMSI"). Both are mapped back to the field name.
+
+def _norm(name):
+    return name.replace(".", "_").replace("-", "_").lower()
+
+def build_key_map(fields):
+    """
+    Map every layer key tshark may use for `fields` to the field name.
+    """
+    key_map = {}
+    for f in fields:
+        key_map[_norm(f)] = f
+        key_map[_norm(f.split(".")[0]) + "_" + _norm(f)] = f
+    return key_map
+
+def parse_ek_line(line, key_map):
+    """
+    Turn one -T ek line into a typed record {field: [values]}, or None for
+    index lines and anything that is not a frame.
+    """
+    line = line.strip()
+    if not line.startswith("{"):
+        return None
+    try:
+        doc = json.loads(line)
+    except ValueError:
+        return None
+    layers = doc.get("layers")
+    if not layers:
+        return None
+    rec = {}
+    for key, val in layers.items():
+        field = key_map.get(_norm(key))
+        if field is None:
+            continue
+        if not isinstance(val, list):
+            val = [val]
+        rec[field] = [str(v) for v in val]
+    return rec
+
+def iter_ek_records(stream, fields):
+    """
+    Incrementally parse a -T ek stream (any iterable of lines, e.g. a pipe)
+    and yield one typed record per frame as soon as its line is complete.
+    """
+    key_map = build_key_map(fields)
+    for line in stream:
+        rec = parse_ek_line(line, key_map)
+        if rec is not None:
+            yield rec
@@ -0,0 +1,237 @@
+"""
+Background export of the collected state.
+
+start_export() takes a snapshot of the model on the calling (GUI) thread,
+which only copies references (model.freeze(), copy on write), and a worker
+thread builds the rows and writes them out in chunks, reporting progress.
+One file is written per table:
+
+    <name>_identifiers.<ext>   the identifier table
+    <name>_ue_events.<ext>     the UE-connected log kept in memory
+    <name>_chains.<ext>        the UE chains across TMSI reallocations
+    <name>_events.<ext>        every event of the session, with --db
+
+The format follows the extension: .csv, .csv.gz, .parquet or .arrow (Arrow
+IPC file). Parquet and Arrow need the optional pyarrow (requirements-export.txt);
+without it only the CSV formats are offered (export_extensions()). There the
+timestamps are epoch seconds (float64), in CSV they are formatted like in
+the GUI.
+"""
+import csv
+import gzip
+import itertools
+import logging
+import threading
+
+from id_store import format_ts, source_names
+from model import IDENTIFIER_CSV_HEADER, UE_COLUMNS
+from session_store import count_events, iter_events
+from tmsi_linker import CHAIN_COLUMNS, CHAIN_KINDS
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+log = logging.getLogger("exporter")
+
+EXPORT_EXTENSIONS = (".csv.gz", ".csv", ".parquet", ".arrow")
+CHUNK_ROWS = 10000
+# seconds the worker waits for the session store to commit the snapshot's events
+DB_BARRIER_TIMEOUT = 60.0
+
+# column kinds: "str", "int" or "ts" (epoch seconds)
+IDENTIFIER_KINDS = ["str", "str", "int", "ts", "ts"] + ["str"] * 8
+UE_KINDS = ["ts"] + ["str"] * 10
+EVENT_HEADER = [
+    "Timestamp", "Filter Type", "Identifier", "ID Type", "Packet Info",
+    "MCC", "MNC", "TAC", "CID", "MME Group ID", "MME Code", "Count", "Source"
+]
+EVENT_KINDS = ["ts"] + ["str"] * 10 + ["int", "str"]
+
+UE_KEYS = [col.lower().replace(" ", "_") for col in UE_COLUMNS]
+
+class ExportError(Exception):
+    pass
+
+def export_extensions():
+    """
+    The extensions that can be exported with the installed packages.
+    """
+    if pa is None:
+        return tuple(ext for ext in EXPORT_EXTENSIONS if ext.startswith(".csv"))
+    return EXPORT_EXTENSIONS
+
+def split_name(fname):
+    """
+    "out.csv.gz" -> ("out", ".csv.gz"). Unknown extensions export as CSV.
+    """
+    for ext in EXPORT_EXTENSIONS:
+        if fname.endswith(ext):
+            return fname[:-len(ext)], ext
+    return fname, ".csv"
+
+class CsvSink:
+    def __init__(self, fname, header, kinds):
+        if fname.endswith(".gz"):
+            self.f = gzip.open(fname, "wt", newline="")
+        else:
+            self.f = open(fname, "w", newline="")
+        self.w = csv.writer(self.f)
+        self.w.writerow(header)
+        self.ts_idx = [i for i, k in enumerate(kinds) if k == "ts"]
+
+    def write(self, rows):
+        if self.ts_idx:
+            rows = [list(r) for r in rows]
+            for r in rows:
+                for i in self.ts_idx:
+                    r[i] = format_ts(r[i])
+        self.w.writerows(rows)
+
+    def close(self):
+        self.f.close()
+
+class ArrowSink:
+    """
+    Writes chunks as record batches of one Parquet or Arrow IPC file.
+    """
+    def __init__(self, fname, header, kinds):
+        if pa is None:
+            raise ExportError("Parquet/Arrow export needs pyarrow "
+                              "(pip install -r requirements-export.txt)")
+        types = {"str": pa.string(), "int": pa.int64(), "ts": pa.float64()}
+        self.schema = pa.schema([(h.lower().replace(" ", "_"), types[k])
+                                 for h, k in zip(header, kinds)])
+        if fname.endswith(".parquet"):
+            self.writer = pq.ParquetWriter(fname, self.schema, compression="zstd")
+            self.sink = None
+        else:
+            self.sink = pa.OSFile(fname, "wb")
+            self.writer = pa.ipc.new_file(self.sink, self.schema)
+
+    def write(self, rows):
+        cols = list(zip(*rows))
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(c, type=f.type) for c, f in zip(cols, self.schema)], schema=self.schema)
+        if self.sink is None:
+            self.writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self.writer.write_batch(batch)
+
+    def close(self):
+        self.writer.close()
+        if self.sink is not None:
+            self.sink.close()
+
+def open_sink(fname, header, kinds):
+    if fname.endswith((".parquet", ".arrow")):
+        return ArrowSink(fname, header, kinds)
+    return CsvSink(fname, header, kinds)
+
+def take_snapshot(model):
+    """
+    Snapshot of the model for the export worker, cheap enough for the GUI
+    thread: a FrozenView of the identifiers and chains (references, their
+    rows are built by the worker), the list of UE rows, which never change
+    once logged, and a barrier behind the events the session store has been
+    given so far. release_snapshot() it when the export is done.
+    """
+    snap = {"model": model, "view": model.freeze(), "ue_events": list(model.ue_events), "db": None}
+    if model.store is not None:
+        snap["db"] = (model.store.path, model.store.session, model.store.barrier())
+    return snap
+
+def release_snapshot(snap):
+    snap["model"].thaw(snap["view"])
+
+def _identifier_rows(ids):
+    for row in ids:
+        yield row[:11] + (",".join(sorted(source_names(row[11]))), row[12])
+
+def _ue_rows(ue_events):
+    for ev in ue_events:
+        yield tuple(ev.get(k, "") for k in UE_KEYS)
+
+def _event_rows(path, session, last_row):
+    for row in iter_events(path, session=session, last_row=last_row):
+        yield row[1:]
+
+def _events_cutoff(barrier):
+    """
+    The last rowid of the snapshot's events, once the store committed them.
+    """
+    if not barrier.wait(DB_BARRIER_TIMEOUT):
+        log.warning("session store did not flush within %.0f s; exporting the events written so far",
+                    DB_BARRIER_TIMEOUT)
+    return barrier.last_row
+
+def run_export(snap, fname, progress=None):
+    """
+    Write a take_snapshot() result. progress(done, total) is called after
+    every chunk. Returns the files written.
+    """
+    stem, ext = split_name(fname)
+    view = snap["view"]
+    tables = [
+        ("identifiers", IDENTIFIER_CSV_HEADER, IDENTIFIER_KINDS,
+         _identifier_rows(view.identifier_rows()), len(view.ids)),
+        ("ue_events", UE_COLUMNS, UE_KINDS,
+         _ue_rows(snap["ue_events"]), len(snap["ue_events"])),
+        ("chains", CHAIN_COLUMNS, CHAIN_KINDS, view.chain_rows(), len(view.chains)),
+    ]
+    if snap["db"] is not None:
+        path, session, barrier = snap["db"]
+        # the same cutoff for the count and the rows: the events ingested up
+        # to the snapshot, none that were still queued or arrived later
+        last_row = _events_cutoff(barrier)
+        tables.append(("events", EVENT_HEADER, EVENT_KINDS,
+                       _event_rows(path, session, last_row),
+                       count_events(path, session=session, last_row=last_row)))
+
+    total = sum(t[4] for t in tables)
+    done = 0
+    files = []
+    for name, header, kinds, rows, _ in tables:
+        out = f"{stem}_{name}{ext}"
+        sink = open_sink(out, header, kinds)
+        try:
+            while True:
+                chunk = list(itertools.islice(rows, CHUNK_ROWS))
+                if not chunk:
+                    break
+                sink.write(chunk)
+                done += len(chunk)
+                if progress is not None:
+                    progress(done, total)
+        finally:
+            sink.close()
+        files.append(out)
+    return files
+
+def start_export(model, fname, progress=None, done=None):
+    """
+    Snapshot `model` now and export it on a worker thread. done(files, error)
+    is called from the worker when it finishes.
+    """
+    snap = take_snapshot(model)
+
+    def work():
+        try:
+            files = run_export(snap, fname, progress)
+        except Exception as e:
+            log.error("export to %s failed: %s", fname, e)
+            if done is not None:
+                done([], e)
+            return
+        finally:
+            release_snapshot(snap)
+        log.info("exported %s", ", ".join(files))
+        if done is not None:
+            done(files, None)
+
+    t = threading.Thread(target=work, daemon=True)
+    t.start()
+    return t
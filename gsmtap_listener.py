@@ -0,0 +1,557 @@
+"""
+Native GSMTAP ingest for the hot message types.
+
+SCAT sends every GSMTAP frame as a UDP datagram to port 4729. Most of what the
+identifier streams take from a full tshark dissection is a few fields of four
+messages: LTE and NR paging, the LTE RRCConnectionRequest and the NR
+RRCSetupRequest. GsmtapListener receives the datagrams on a UDP socket, reads
+the GSMTAP header, decodes just those fields from the unaligned PER (UPER)
+encoding and puts the events into the capture queue through the same emit
+helpers as the tshark streams. capture.py removes the channels it decodes
+from tshark's capture filter (exclude_native), so tshark only dissects the
+rest (SIBs, NAS, ...).
+
+Python has no recvmmsg(), so datagrams are taken in batches instead: the
+listener waits until a socket is readable, then reads it with non-blocking
+recv_into() into one reused buffer until it is empty or BATCH datagrams were
+read, and hands the events of the batch over in one put_many().
+
+Recorded captures can be replayed to a listener over a local socket:
+
+    python3 gsmtap_listener.py --listen                  # print decoded events
+    python3 gsmtap_listener.py --replay drive1.pcapng --speed 0
+"""
+import argparse
+import logging
+import selectors
+import socket
+import struct
+import sys
+import threading
+import time
+from time import perf_counter
+
+import capture
+import metrics
+from shared_queue import EventBatch, EventQueue
+
+log = logging.getLogger("capture.native")
+
+# datagrams read per wake-up before the events are handed over
+BATCH = 256
+# requested socket receive buffer (capped by net.core.rmem_max)
+RCVBUF = 4 * 1024 * 1024
+POLL_SECONDS = 0.5
+
+DATAGRAMS = metrics.Counter("gsmtap_datagrams_total", "GSMTAP datagrams received natively",
+                            label="channel")
+UNDECODED = metrics.Counter("gsmtap_undecoded_total",
+                            "Natively received datagrams that could not be decoded")
+SKIPPED = metrics.Counter("gsmtap_skipped_records_total",
+                          "Paging records whose UE identity is not an identifier stream's",
+                          label="identity")
+# SKIPPED series of the LTE extension alternatives by index (later ones
+# unknown yet) and of NR fullI-RNTI / extensions
+_skipped_lte = [SKIPPED.labels(n) for n in ("lte_ng_5g_s_tmsi", "lte_full_i_rnti", "lte_extension")]
+_skipped_nr = [SKIPPED.labels(n) for n in ("nr_full_i_rnti", "nr_extension")]
+
+class DecodeError(Exception):
+    pass
+
+# ---------------- GSMTAP header ----------------
+def parse_gsmtap(data):
+    """
+    (version, type, sub_type, payload) of a GSMTAP v2 or v3 datagram, or None.
+    v2: version, hdr_len (32 bit words), type, ..., sub_type at byte 12.
+    v3: version, reserved, hdr_len (16 bit, words), type (16 bit), sub_type
+    (16 bit), then metadata TLVs up to hdr_len.
+    """
+    if len(data) < 8:
+        return None
+    version = data[0]
+    if version == 2:
+        hlen = data[1] * 4
+        if hlen < 16 or len(data) < hlen:
+            return None
+        return 2, data[2], data[12], data[hlen:]
+    if version == 3:
+        hlen = (data[2] << 8 | data[3]) * 4
+        if hlen < 8 or len(data) < hlen:
+            return None
+        return 3, data[4] << 8 | data[5], data[6] << 8 | data[7], data[hlen:]
+    return None
+
+# ---------------- UPER ----------------
+def bits_hex(value, nbits):
+    """
+    A BIT STRING of `nbits` as tshark prints it (FT_BYTES): the bits
+    left-aligned in whole octets, lowercase hex without separators.
+    """
+    pad = -nbits % 8
+    return "%0*x" % ((nbits + pad) // 4, value << pad)
+
+class BitReader:
+    """
+    Reads big-endian bit fields off an unaligned PER encoding.
+    """
+    __slots__ = ("value", "left")
+
+    def __init__(self, data):
+        self.value = int.from_bytes(data, "big")
+        self.left = len(data) * 8
+
+    def read(self, n):
+        if n > self.left:
+            raise DecodeError("message truncated")
+        self.left -= n
+        return (self.value >> self.left) & ((1 << n) - 1)
+
+    def skip(self, n):
+        if n > self.left:
+            raise DecodeError("message truncated")
+        self.left -= n
+
+    def length(self):
+        """
+        Unconstrained length determinant (X.691 11.9); fragmented lengths
+        (>= 16K) never occur in these messages.
+        """
+        if not self.read(1):
+            return self.read(7)
+        if not self.read(1):
+            return self.read(14)
+        raise DecodeError("fragmented length")
+
+    def small(self):
+        """
+        A normally small non-negative number (X.691 11.6), e.g. the index
+        of an extension alternative.
+        """
+        if self.read(1):
+            return self.read(self.length() * 8)
+        return self.read(6)
+
+    def skip_open_type(self):
+        self.skip(self.length() * 8)
+
+    def skip_extensions(self):
+        """
+        Skip the extension additions of a SEQUENCE whose extension bit was
+        set: a bitmap preceded by a normally small length, then one open type
+        per present addition.
+        """
+        if self.read(1):
+            raise DecodeError("large extension bitmap")
+        n = self.read(6) + 1
+        present = bin(self.read(n)).count("1")
+        for _ in range(present):
+            self.skip_open_type()
+
+def decode_lte_paging(payload):
+    """
+    ([m-TMSI], [IMSI]) of an LTE PCCH-Message (36.331). Records whose
+    PagingUE-Identity is an extension (ng-5G-S-TMSI-r15, fullI-RNTI-r15) are
+    counted in SKIPPED: the paging stream doesn't take them from tshark
+    either.
+    """
+    r = BitReader(payload)
+    tmsis, imsis = [], []
+    # PCCH-MessageType: c1 (its only alternative, paging, takes no bits)
+    if r.read(1):
+        return tmsis, imsis
+    # Paging: pagingRecordList, systemInfoModification, etws-Indication,
+    # nonCriticalExtension present
+    if not r.read(4) & 0b1000:
+        return tmsis, imsis
+    for _ in range(r.read(4) + 1):
+        # PagingRecord ::= SEQUENCE { ue-Identity, cn-Domain, ... }
+        extended = r.read(1)
+        if r.read(1):
+            _skipped_lte[min(r.small(), 2)].inc()
+            r.skip_open_type()
+        elif r.read(1) == 0:
+            r.skip(8)  # mmec
+            tmsis.append(bits_hex(r.read(32), 32))
+        else:
+            imsis.append("".join(str(r.read(4)) for _ in range(r.read(4) + 6)))
+        r.skip(1)  # cn-Domain
+        if extended:
+            r.skip_extensions()
+    return tmsis, imsis
+
+def decode_nr_paging(payload):
+    """
+    [5G-S-TMSI] of an NR PCCH-Message (38.331). fullI-RNTI and extension
+    records are counted in SKIPPED.
+    """
+    r = BitReader(payload)
+    tmsis = []
+    # PCCH-MessageType: c1 / c1: paging, spare1
+    if r.read(1) or r.read(1):
+        return tmsis
+    # Paging: pagingRecordList, lateNonCriticalExtension, nonCriticalExtension
+    if not r.read(3) & 0b100:
+        return tmsis
+    for _ in range(r.read(5) + 1):
+        # PagingRecord ::= SEQUENCE { ue-Identity, accessType OPTIONAL, ... }
+        extended = r.read(1)
+        r.skip(1)  # accessType present; ENUMERATED {non3GPP} takes no bits
+        if r.read(1):
+            _skipped_nr[1].inc()
+            r.small()
+            r.skip_open_type()
+        elif r.read(1) == 0:
+            tmsis.append(bits_hex(r.read(48), 48))
+        else:
+            _skipped_nr[0].inc()
+            r.skip(40)  # fullI-RNTI
+        if extended:
+            r.skip_extensions()
+    return tmsis
+
+def decode_lte_connreq(payload):
+    """
+    (randomValue, mmec, m-TMSI) of an LTE UL-CCCH-Message holding an
+    RRCConnectionRequest, as tshark prints them for
+    capture.emit_rrc_connreq() (unused fields ""), or None for other UL-CCCH
+    messages.
+    """
+    r = BitReader(payload)
+    # UL-CCCH-MessageType: c1 / c1: rrcConnectionReestablishmentRequest,
+    # rrcConnectionRequest / criticalExtensions: rrcConnectionRequest-r8
+    if r.read(1) or not r.read(1) or r.read(1):
+        return None
+    # InitialUE-Identity: s-TMSI, randomValue
+    if r.read(1):
+        return bits_hex(r.read(40), 40), "", ""
+    mmec = r.read(8)
+    return "", bits_hex(mmec, 8), bits_hex(r.read(32), 32)
+
+def decode_nr_setup(payload):
+    """
+    (ng-5G-S-TMSI-Part1, randomValue) of an NR UL-CCCH-Message holding an
+    RRCSetupRequest (one of them ""), or None for other UL-CCCH messages.
+    """
+    r = BitReader(payload)
+    # UL-CCCH-MessageType: c1 / c1: rrcSetupRequest, rrcResumeRequest,
+    # rrcReestablishmentRequest, rrcSystemInfoRequest
+    if r.read(1) or r.read(2):
+        return None
+    # InitialUE-Identity: ng-5G-S-TMSI-Part1, randomValue
+    if r.read(1):
+        return "", bits_hex(r.read(39), 39)
+    return bits_hex(r.read(39), 39), ""
+
+# ---------------- Channels ----------------
+def _lte_pcch(payload, queue):
+    tmsis, imsis = decode_lte_paging(payload)
+    ts = capture.frame_time()
+    for tmsi in tmsis:
+        capture.emit_id(queue, "m-TMSI", tmsi, ts, "Paging", "m-TMSI", with_mme=True)
+    for imsi in imsis:
+        if capture.is_valid_imsi(imsi):
+            capture.emit_id(queue, "IMSI", imsi, ts, "Paging", "IMSI", with_cell=False)
+
+def _lte_ul_ccch(payload, queue):
+    req = decode_lte_connreq(payload)
+    if req is not None:
+        capture.emit_rrc_connreq(queue, *req)
+
+def _nr_pcch(payload, queue):
+    capture.emit_5g_paging(queue, decode_nr_paging(payload))
+
+def _nr_ul_ccch(payload, queue):
+    req = decode_nr_setup(payload)
+    if req is not None:
+        part1, randv = req
+        capture.emit_nas_5gs(queue, [], [], [], [], part1, "", [randv] if randv else [])
+
+# (GSMTAP version, type, sub_type) -> (channel, handler). v2 type 0x0d is
+# LTE RRC (sub types: 2 UL-CCCH, 6 PCCH); v3 type 0x0500 is NR RRC (sub
+# types: 6 PCCH, 7 UL-CCCH), as in Wireshark's packet-gsmtap.h.
+CHANNELS = {
+    (2, 0x0d, 6): ("lte_pcch", _lte_pcch),
+    (2, 0x0d, 2): ("lte_ul_ccch", _lte_ul_ccch),
+    (3, 0x0500, 6): ("nr_pcch", _nr_pcch),
+    (3, 0x0500, 7): ("nr_ul_ccch", _nr_ul_ccch),
+}
+
+_counts = {name: DATAGRAMS.labels(name) for name, _ in CHANNELS.values()}
+_counts["other"] = DATAGRAMS.labels("other")
+_parse_time = {name: capture.PARSE_SECONDS.labels("native_" + name) for name, _ in CHANNELS.values()}
+
+def dispatch_datagram(data, ts, queue):
+    """
+    Decode one GSMTAP datagram received at `ts` into `queue`. Returns False
+    for channels tshark handles.
+    """
+    hdr = parse_gsmtap(data)
+    channel = CHANNELS.get(hdr[:3]) if hdr is not None else None
+    if channel is None:
+        _counts["other"].inc()
+        return False
+    name, handler = channel
+    _counts[name].inc()
+    capture._set_frame_time(ts)
+    t = perf_counter()
+    try:
+        handler(hdr[3], queue)
+    except DecodeError as e:
+        UNDECODED.inc()
+        log.debug("%s: %s (%s)", name, e, bytes(hdr[3]).hex())
+    _parse_time[name].observe(perf_counter() - t)
+    return True
+
+def native_bpf(ports=(capture.GSMTAP_PORT,)):
+    """
+    BPF matching the datagrams of the CHANNELS decoded here. The GSMTAP
+    header starts at udp[8]; the v2 type is udp[10] and its sub_type udp[20],
+    the v3 type and sub_type are the 16 bit udp[12:2] and udp[14:2].
+    """
+    v2, v3 = {}, {}
+    for version, gtype, sub in CHANNELS:
+        (v2 if version == 2 else v3).setdefault(gtype, []).append(sub)
+    alts = []
+    for gtype, subs in v2.items():
+        subs = " or ".join(f"udp[20] = {s}" for s in subs)
+        alts.append(f"(udp[8] = 2 and udp[10] = {gtype:#04x} and ({subs}))")
+    for gtype, subs in v3.items():
+        subs = " or ".join(f"udp[14:2] = {s}" for s in subs)
+        alts.append(f"(udp[8] = 3 and udp[12:2] = {gtype:#06x} and ({subs}))")
+    dst = " or ".join(f"dst port {p}" for p in ports)
+    return f"udp and ({dst}) and ({' or '.join(alts)})"
+
+def exclude_native(capture_filter, ports=(capture.GSMTAP_PORT,)):
+    """
+    `capture_filter` (None/"" = everything) without the natively decoded
+    datagrams.
+    """
+    if capture_filter:
+        return f"({capture_filter}) and not ({native_bpf(ports)})"
+    return f"not ({native_bpf(ports)})"
+
+# ---------------- Listener ----------------
+class GsmtapListener:
+    """
+    Receives GSMTAP on UDP `ports` and decodes the CHANNELS into `queue`.
+    The sockets are bound in the constructor, so a port in use raises
+    OSError before anything is started.
+    """
+    def __init__(self, queue, ports=(capture.GSMTAP_PORT,), host="127.0.0.1", batch=BATCH):
+        self.queue = queue
+        self.batch = batch
+        self.datagrams = 0
+        self.socks = []
+        try:
+            for port in ports:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.socks.append(sock)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+                sock.bind((host, port))
+                sock.setblocking(False)
+        except OSError:
+            self.close()
+            raise
+        self._buf = bytearray(65535)
+        self._view = memoryview(self._buf)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="gsmtap-listener", daemon=True)
+        self._thread.start()
+
+    def run(self):
+        sel = selectors.DefaultSelector()
+        for sock in self.socks:
+            sel.register(sock, selectors.EVENT_READ)
+        try:
+            while not self._stop.is_set():
+                for key, _ in sel.select(POLL_SECONDS):
+                    self._drain(key.fileobj)
+        finally:
+            sel.close()
+
+    def _drain(self, sock):
+        batch = EventBatch()
+        view = self._view
+        n = 0
+        while n < self.batch:
+            try:
+                size = sock.recv_into(self._buf)
+            except BlockingIOError:
+                break
+            dispatch_datagram(view[:size], time.time(), batch)
+            n += 1
+        self.datagrams += n
+        if batch:
+            self.queue.put_many(batch)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.close()
+
+    def close(self):
+        for sock in self.socks:
+            sock.close()
+
+# ---------------- Recorded captures ----------------
+# link type -> offset of the IP header (None: read the ethertype)
+_LINK_IP = {0: 4, 1: None, 12: 0, 101: 0, 113: 16, 228: 0, 276: 20}
+
+def _udp_payload(linktype, frame, port):
+    off = _LINK_IP.get(linktype, -1)
+    if off == -1:
+        return None
+    if off is None:
+        off = 14
+        ethertype = frame[12:14]
+        if ethertype == b"\x81\x00":
+            off, ethertype = 18, frame[16:18]
+        if ethertype not in (b"\x08\x00", b"\x86\xdd"):
+            return None
+    if len(frame) < off + 1:
+        return None
+    version = frame[off] >> 4
+    if version == 4:
+        if frame[off + 9] != 17:
+            return None
+        off += (frame[off] & 0x0f) * 4
+    elif version == 6:
+        if frame[off + 6] != 17:
+            return None
+        off += 40
+    else:
+        return None
+    if len(frame) < off + 8:
+        return None
+    if port is not None and struct.unpack_from("!H", frame, off + 2)[0] != port:
+        return None
+    return frame[off + 8:]
+
+def _pcap_frames(f, head):
+    magic = head[:4]
+    if magic in (b"\xd4\xc3\xb2\xa1", b"\x4d\x3c\xb2\xa1"):
+        endian = "<"
+    elif magic in (b"\xa1\xb2\xc3\xd4", b"\xa1\xb2\x3c\x4d"):
+        endian = ">"
+    else:
+        raise ValueError("not a pcap/pcapng file")
+    frac = 1e-9 if magic in (b"\x4d\x3c\xb2\xa1", b"\xa1\xb2\x3c\x4d") else 1e-6
+    rest = f.read(16)
+    linktype = struct.unpack(endian + "I", rest[12:16])[0] & 0x0fffffff
+    while True:
+        rec = f.read(16)
+        if len(rec) < 16:
+            return
+        sec, sub, caplen, _ = struct.unpack(endian + "IIII", rec)
+        yield linktype, sec + sub * frac, f.read(caplen)
+
+def _pcapng_frames(f, head):
+    endian = "<"
+    linktypes = []
+    resolution = []
+    block = head
+    while True:
+        if len(block) < 8:
+            return
+        btype = struct.unpack(endian + "I", block[:4])[0]
+        if btype == 0x0a0d0d0a:
+            endian = "<" if f.read(4) == b"\x4d\x3c\x2b\x1a" else ">"
+            f.seek(-4, 1)
+            linktypes, resolution = [], []
+        blen = struct.unpack(endian + "I", block[4:8])[0]
+        body = f.read(blen - 8)
+        if btype == 1:
+            linktypes.append(struct.unpack(endian + "H", body[:2])[0])
+            resolution.append(_if_tsresol(body[8:-4], endian))
+        elif btype == 6:
+            iface, hi, lo, caplen = struct.unpack(endian + "IIII", body[:16])
+            yield linktypes[iface], (hi << 32 | lo) * resolution[iface], body[20:20 + caplen]
+        elif btype == 3:
+            yield linktypes[0], None, body[4:-4]
+        block = f.read(8)
+
+def _if_tsresol(options, endian):
+    pos = 0
+    while pos + 4 <= len(options):
+        code, length = struct.unpack_from(endian + "HH", options, pos)
+        if code == 0:
+            break
+        if code == 9 and length == 1:
+            v = options[pos + 4]
+            return 2.0 ** -(v & 0x7f) if v & 0x80 else 10.0 ** -v
+        pos += 4 + (length + 3) // 4 * 4
+    return 1e-6
+
+def read_datagrams(path, port=capture.GSMTAP_PORT):
+    """
+    (timestamp, GSMTAP datagram) of every UDP packet to `port` (None = any)
+    in a pcap or pcapng file. Timestamps are None for simple packet blocks.
+    """
+    with open(path, "rb") as f:
+        head = f.read(8)
+        frames = _pcapng_frames(f, head) if head[:4] == b"\x0a\x0d\x0d\x0a" else _pcap_frames(f, head)
+        for linktype, ts, frame in frames:
+            payload = _udp_payload(linktype, frame, port)
+            if payload is not None:
+                yield ts, payload
+
+def replay(path, host="127.0.0.1", port=capture.GSMTAP_PORT, speed=1.0, file_port=capture.GSMTAP_PORT):
+    """
+    Send the GSMTAP datagrams of a recorded capture to host:port, keeping the
+    recorded gaps divided by `speed` (0 = as fast as possible). Returns the
+    number of datagrams sent.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sent = 0
+    start = first = None
+    try:
+        for ts, data in read_datagrams(path, file_port):
+            if speed and ts is not None:
+                if first is None:
+                    start, first = time.monotonic(), ts
+                delay = (ts - first) / speed - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            sock.sendto(data, (host, port))
+            sent += 1
+    finally:
+        sock.close()
+    return sent
+
+def main():
+    parser = argparse.ArgumentParser(description="Native GSMTAP listener and capture replay.")
+    parser.add_argument("--port", type=int, default=capture.GSMTAP_PORT, help="GSMTAP UDP port")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--listen", action="store_true", help="print the events decoded from --port")
+    parser.add_argument("--replay", metavar="PCAP", help="send the GSMTAP of a pcap/pcapng file to --port")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay speed factor, 0 = as fast as possible (default: 1)")
+    args = parser.parse_args()
+
+    if args.replay:
+        sent = replay(args.replay, args.host, args.port, args.speed)
+        print(f"sent {sent} datagrams to {args.host}:{args.port}")
+        return 0
+    if not args.listen:
+        parser.error("give --listen or --replay")
+
+    queue = EventQueue()
+    listener = GsmtapListener(queue, (args.port,), host=args.host)
+    listener.start()
+    try:
+        while True:
+            for filt, ident, ts, cell, info, disp in queue.drain(timeout=1.0):
+                print(f"{ts:.6f}\t{filt}\t{ident}\t{disp}\t{info}\t{cell.tac or ''}\t{cell.cid or ''}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.stop()
+        print(f"{listener.datagrams} datagrams, {UNDECODED.values()[None]} undecoded", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
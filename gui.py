@@ -1,22 +1,61 @@
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.anchorlayout import AnchorLayout
-from kivy.uix.scrollview import ScrollView
 from kivy.uix.label import Label
 from kivy.uix.textinput import TextInput
 from kivy.uix.button import Button
 from kivy.uix.tabbedpanel import TabbedPanel, TabbedPanelItem
-from kivy.graphics import Color, Rectangle
+from kivy.graphics import Color, Line, Rectangle
 from kivy.uix.popup import Popup
+from kivy.uix.progressbar import ProgressBar
 from kivy.uix.spinner import Spinner
 from kivy.uix.behaviors import ButtonBehavior
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.widget import Widget
 from kivy.clock import Clock
 from kivy.core.window import Window
-from collections import defaultdict
-from datetime import datetime
-import csv
-
-from shared_queue import capture_queue
+import itertools
+import logging
+import time
+
+from shared_queue import capture_queue, ReorderBuffer
+from model import IdentifierModel, UE_COLUMNS
+from exporter import export_extensions, start_export
+from id_store import format_ts
+from privacy_tests import new_tests
+from tmsi_linker import chain_row
+from rates import ALL_CELLS, KINDS, RESOLUTIONS
+import metrics
+
+log = logging.getLogger("gui")
+
+DRAIN_SECONDS = metrics.Histogram("gui_drain_seconds", "Capture queue drain per GUI update")
+INGEST_SECONDS = metrics.Histogram("gui_ingest_seconds", "Model ingest per GUI update")
+REFRESH_SECONDS = metrics.Histogram("gui_refresh_seconds", "Display refresh per GUI update")
+REDRAWS = metrics.Counter("gui_redraws_total", "Views redrawn by the GUI", label="view")
+
+# seconds between GUI updates: BUSY_INTERVAL while events arrive, halved
+# (down to MIN_INTERVAL) while the events drained per update keep growing
+# past BACKLOG_EVENTS, longer (up to MAX_INTERVAL) if an update would use
+# more than FRAME_BUDGET of the main thread; idle updates back off to
+# IDLE_INTERVAL and only poll the queue
+BUSY_INTERVAL = 1.0
+MIN_INTERVAL = 0.25
+MAX_INTERVAL = 2.0
+IDLE_INTERVAL = 2.0
+FRAME_BUDGET = 0.2
+BACKLOG_EVENTS = 2000
+# the Stats tab is redrawn at most this often
+STATS_INTERVAL = 1.0
+# the Details tab is redrawn this often without events, for its "active" column
+STALE_INTERVAL = 60.0
+
+# newest UE chains listed on the Chains tab
+CHAINS_SHOWN = 1000
+CHAIN_TAB_COLUMNS = ["Chain", "Source", "TAC", "CID", "Identifiers", "Reallocations",
+                     "Mean Interval", "Last Seen"]
 
 def format_lifespan(seconds):
     try:
@@ -58,12 +97,70 @@ def convert_id(id_str):
                 return id_str
         return id_str
 
-class UEConnectedRow(BoxLayout):
-    def __init__(self, data, columns, **kwargs):
+class RefreshScheduler:
+    """
+    Dirty tracking for the GUI views ("details", "tests", "ue", "chains",
+    "rates", "stats"). New data marks views dirty; a view is only redrawn
+    when it is the visible tab and dirty. next_interval() adapts the update
+    period to the events the last update drained and the work it did.
+    """
+    def __init__(self):
+        self.dirty = set()
+        self.interval = BUSY_INTERVAL
+        self._events = 0
+        self._stats_at = 0.0
+        self._details_at = time.monotonic()
+
+    def mark(self, *views):
+        self.dirty.update(views)
+
+    def take(self, view):
+        """
+        True if `view` must be redrawn now; clears its mark.
+        """
+        now = time.monotonic()
+        if view == "stats":
+            if now - self._stats_at < STATS_INTERVAL:
+                return False
+            self._stats_at = now
+            return True
+        if view == "details" and now - self._details_at >= STALE_INTERVAL:
+            self.dirty.add(view)
+        if view not in self.dirty:
+            return False
+        self.dirty.discard(view)
+        if view == "details":
+            self._details_at = now
+        return True
+
+    def next_interval(self, events, work_seconds):
+        """
+        Seconds to the next update after one that drained `events` queue
+        items in `work_seconds`.
+        """
+        if not events:
+            self.interval = min(self.interval * 2, IDLE_INTERVAL)
+        else:
+            interval = min(self.interval, BUSY_INTERVAL)
+            if events < BACKLOG_EVENTS:
+                interval = BUSY_INTERVAL
+            elif events > self._events:
+                # the backlog grows: drain it in smaller steps
+                interval = max(interval / 2, MIN_INTERVAL)
+            self.interval = min(max(interval, work_seconds / FRAME_BUDGET), MAX_INTERVAL)
+        self._events = events
+        return self.interval
+
+class UEConnectedRow(RecycleDataViewBehavior, BoxLayout):
+    """
+    One recycled row of the UE-connected log. The view data are the model's
+    UE row dicts themselves; the columns are set on the class by the table.
+    """
+    columns = UE_COLUMNS
+
+    def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.orientation = 'horizontal'
-        self.size_hint_y = None
-        self.height = 40
         self.padding = (5, 2, 5, 2)
         self.spacing = 5
         with self.canvas.before:
@@ -71,71 +168,100 @@ class UEConnectedRow(BoxLayout):
             self.bg_rect = Rectangle(pos=self.pos, size=self.size)
         self.bind(pos=self._update_bg, size=self._update_bg)
 
-        for col in columns:
-            val = data.get(col.lower().replace(" ", "_"), "")
-            text_val = str(val if val is not None else "")
+        self.keys = [col.lower().replace(" ", "_") for col in self.columns]
+        self.labels = []
+        for _ in self.columns:
             lbl = Label(
-                text=text_val,
                 color=(1, 1, 1, 1),
                 halign='left',  # Ensure left alignment
                 valign='middle'
             )
             lbl.bind(size=lambda inst, v: setattr(inst, 'text_size', v))
             self.add_widget(lbl)
+            self.labels.append(lbl)
+
+    def refresh_view_attrs(self, rv, index, data):
+        for lbl, k in zip(self.labels, self.keys):
+            val = data.get(k, "")
+            if k == "timestamp":
+                val = format_ts(val)
+            lbl.text = str(val if val is not None else "")
 
     def _update_bg(self, *args):
         self.bg_rect.pos = self.pos
         self.bg_rect.size = self.size
 
-class TableRow(ButtonBehavior, BoxLayout):
-    def __init__(
-        self,
-        id_type,
-        identifier,
-        info,
-        lifespan_str,
-        show_details_callback,
-        selection_mode_ref,
-        track_mode_ref,
-        selected_ids_ref,
-        col_keys,
-        **kwargs
-    ):
+class ChainRow(UEConnectedRow):
+    """
+    One recycled row of the Chains tab; the view data are dicts keyed like
+    CHAIN_TAB_COLUMNS.
+    """
+    columns = CHAIN_TAB_COLUMNS
+
+    def refresh_view_attrs(self, rv, index, data):
+        for lbl, k in zip(self.labels, self.keys):
+            val = data.get(k, "")
+            if k == "last_seen":
+                val = format_ts(val)
+            lbl.text = str(val if val is not None else "")
+
+# Details columns with the "All" filter; a type filter drops the ID type
+DETAIL_COLUMNS = ("id_type", "identifier", "count", "last_seen", "lifespan",
+                  "tracking_area_code", "cell_identity", "active")
+TYPE_DETAIL_COLUMNS = DETAIL_COLUMNS[1:]
+
+class TableRow(RecycleDataViewBehavior, ButtonBehavior, BoxLayout):
+    """
+    One row of the Details table. Rows are recycled by the RecycleView: only
+    the rows in the viewport exist, and refresh_view_attrs() refills them from
+    a data dict {"id_type", "identifier", "info", "col_keys", "owner"}.
+    """
+    def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.orientation = 'horizontal'
-        self.size_hint_y = None
-        self.height = 35
         self.padding = (5, 0, 5, 0)
 
-        self.id_type = id_type
-        self.identifier = identifier
-        self.info = info
-        self.lifespan_str = lifespan_str
-        self.show_details_callback = show_details_callback
-        self.selection_mode_ref = selection_mode_ref
-        self.track_mode_ref = track_mode_ref
-        self.selected_ids_ref = selected_ids_ref
-        self.col_keys = col_keys
+        self.id_type = None
+        self.identifier = None
+        self.info = None
+        self.lifespan_str = ""
+        self.col_keys = []
+        self.owner = None
+        self.labels = []
 
         with self.canvas.before:
             self.bg_color = Color(0, 0, 0, 0)
             self.bg_rect = Rectangle(pos=self.pos, size=self.size)
         self.bind(pos=self._update_bg, size=self._update_bg)
 
+    def refresh_view_attrs(self, rv, index, data):
+        self.id_type = data["id_type"]
+        self.identifier = data["identifier"]
+        self.info = data["info"]
+        self.col_keys = data["col_keys"]
+        self.owner = data["owner"]
+        # computed here, so only the visible rows pay for it
+        self.lifespan_str = format_lifespan(self.info.lifespan)
+
         row_vals = self._make_values()
-        for val in row_vals:
-            text_val = str(val if val is not None else "")
+        while len(self.labels) < len(row_vals):
             lbl = Label(
-                text=text_val,
                 color=(1, 1, 1, 1),
                 halign='left',  # consistent left alignment
                 valign='middle'
             )
             lbl.bind(size=lambda inst, v: setattr(inst, 'text_size', v))
             self.add_widget(lbl)
+            self.labels.append(lbl)
+        while len(self.labels) > len(row_vals):
+            self.remove_widget(self.labels.pop())
+        for lbl, val in zip(self.labels, row_vals):
+            lbl.text = str(val if val is not None else "")
 
-        if (self.id_type, self.identifier) in self.selected_ids_ref:
+        if (self.id_type, self.identifier) in self.owner.selected_ids:
             self.bg_color.rgba = (0, 0.5, 1, 0.3)
+        else:
+            self.bg_color.rgba = (0, 0, 0, 0)
 
     def _make_values(self):
         vals = []
@@ -145,19 +271,15 @@ class TableRow(ButtonBehavior, BoxLayout):
             elif k == "identifier":
                 raw = self.identifier
             elif k == "count":
-                raw = self.info["count"]
+                raw = self.info.count
             elif k == "last_seen":
-                ls = self.info["last_seen"]
-                if ls and len(ls) >= 19:
-                    raw = ls[11:19]  # HH:MM:SS
-                else:
-                    raw = ls or ""
+                raw = format_ts(self.info.last_seen)[11:19]  # HH:MM:SS
             elif k == "lifespan":
                 raw = self.lifespan_str
             elif k == "tracking_area_code":
-                raw = self.info.get("tracking_area_code", "")
+                raw = self.info.tracking_area_code
             elif k == "cell_identity":
-                raw = self.info.get("cell_identity", "")
+                raw = self.info.cell_identity
             elif k == "active":
                 raw = self._compute_active()
             else:
@@ -168,34 +290,29 @@ class TableRow(ButtonBehavior, BoxLayout):
         return vals
 
     def _compute_active(self):
-        ls = self.info["last_seen"]
-        if not ls:
-            return "N/A"
-        try:
-            now = datetime.now()
-            dt2 = datetime.strptime(ls, "%Y-%m-%d %H:%M:%S")
-            diff = (now - dt2).total_seconds()
-            if diff < 3600:
-                return "<1h"
-            hrs = int(diff // 3600)
-            if hrs >= 24:
-                return f"{hrs // 24}d {hrs % 24}h"
-            return f"{hrs}h"
-        except:
+        ls = self.info.last_seen
+        if ls is None:
             return "N/A"
+        diff = time.time() - ls
+        if diff < 3600:
+            return "<1h"
+        hrs = int(diff // 3600)
+        if hrs >= 24:
+            return f"{hrs // 24}d {hrs % 24}h"
+        return f"{hrs}h"
 
     def on_release(self):
         key = (self.id_type, self.identifier)
-        if self.selection_mode_ref():
-            if key in self.selected_ids_ref:
-                self.selected_ids_ref.remove(key)
+        selected_ids = self.owner.selected_ids
+        if self.owner.selection_mode:
+            if key in selected_ids:
+                selected_ids.remove(key)
                 self.bg_color.rgba = (0, 0, 0, 0)
             else:
-                self.selected_ids_ref.add(key)
+                selected_ids.add(key)
                 self.bg_color.rgba = (0, 0.5, 1, 0.3)
         else:
-            if self.show_details_callback:
-                self.show_details_callback(self.id_type, self.identifier, self.info, self.lifespan_str)
+            self.owner._show_detail_popup(self.id_type, self.identifier, self.info, self.lifespan_str)
 
     def _update_bg(self, *args):
         self.bg_rect.pos = self.pos
@@ -212,52 +329,7 @@ class TestPanel(BoxLayout):
             self.bg = Rectangle(pos=self.pos, size=self.size)
         self.bind(pos=self._update_bg, size=self._update_bg)
 
-        # 6 tests + 2 placeholders
-        self.tests = [
-            {
-                "name": "ID frequently updated",
-                "description": "Fail if any m-TMSI lifespan>2h.",
-                "result": "Pending",
-                "info": ""
-            },
-            {
-                "name": "No IMSI sent in Paging",
-                "description": "Fail if IMSI found in paging.",
-                "result": "Pending",
-                "info": ""
-            },
-            {
-                "name": "No IMSI in Attach/Reg",
-                "description": "Fail if IMSI used in attach/reg or identity resp.",
-                "result": "Pending",
-                "info": ""
-            },
-            {
-                "name": "Only SUCI/GUTI sent",
-                "description": "Fail if non-SUCI/GUTI in paging.",
-                "result": "Pending",
-                "info": ""
-            },
-            {
-                "name": "No IMEISV seen",
-                "description": "Fail if any IMEISV is found at all.",
-                "result": "Pending",
-                "info": ""
-            },
-            {
-                "name": "No IMSI in Identity Response",
-                "description": "Fail if IMSI is found in Identity Response message.",
-                "result": "Pending",
-                "info": ""
-            }
-        ]
-        for i in range(6, 8):
-            self.tests.append({
-                "name": f"Test {i + 1}",
-                "description": "Not implemented.",
-                "result": "Pending",
-                "info": ""
-            })
+        self.tests = new_tests()
         self.test_rows = []
         for tdef in self.tests:
             row = self._build_test_row(tdef)
@@ -311,112 +383,9 @@ class TestPanel(BoxLayout):
         )
         popup.open()
 
-    def update_tests(self, ids_dict):
-        from datetime import datetime
-        #1 => ID frequently updated => fail if m-TMSI>2h
-        failing_mt = []
-        for ((filt, ident), info) in ids_dict.items():
-            if info["display_type"] == "m-TMSI" and info["first_seen"] and info["last_seen"]:
-                try:
-                    t1 = datetime.strptime(info["first_seen"], "%Y-%m-%d %H:%M:%S")
-                    t2 = datetime.strptime(info["last_seen"], "%Y-%m-%d %H:%M:%S")
-                    life = (t2 - t1).total_seconds()
-                    if life < 0:
-                        life += 86400
-                    if life > 7200:
-                        failing_mt.append(ident)
-                except:
-                    pass
-        if failing_mt:
-            self.tests[0]["result"] = "Fail"
-            show3 = failing_mt[:3]
-            self.tests[0]["info"] = "Failing m-TMSI:\n" + "\n".join(show3) + f"\nTotal= {len(failing_mt)}"
-        else:
-            any_mt = any(info["display_type"] == "m-TMSI" for (_,_), info in ids_dict.items())
-            if any_mt:
-                self.tests[0]["result"] = "Pass"
-                self.tests[0]["info"] = "No m-TMSI>2h"
-            else:
-                self.tests[0]["result"] = "Pending"
-                self.tests[0]["info"] = "No m-TMSI data yet"
-
-        #2 => no IMSI in paging
-        paging_imsi = []
-        for ((filt, ident), info) in ids_dict.items():
-            if info["display_type"] == "IMSI" and ("Paging" in info["sources"]):
-                paging_imsi.append(ident)
-        if paging_imsi:
-            self.tests[1]["result"] = "Fail"
-            self.tests[1]["info"] = "IMSI in Paging:\n" + "\n".join(paging_imsi)
-        else:
-            self.tests[1]["result"] = "Pass"
-            self.tests[1]["info"] = "No IMSI found in Paging."
-
-        #3 => no IMSI in attach/reg
-        attach_imsi = []
-        for ((filt, ident), info) in ids_dict.items():
-            if info["display_type"] == "IMSI":
-                for src in info["sources"]:
-                    s_low = src.lower()
-                    if ("attach" in s_low) or ("registration" in s_low) or ("identity response" in s_low):
-                        attach_imsi.append(ident)
-                        break
-        if attach_imsi:
-            self.tests[2]["result"] = "Fail"
-            self.tests[2]["info"] = "IMSI used:\n" + "\n".join(attach_imsi)
-        else:
-            self.tests[2]["result"] = "Pass"
-            self.tests[2]["info"] = "No IMSI found in Attach/Reg"
-
-        #4 => only SUCI/GUTI => fail if we see other ID in paging
-        non_target = []
-        for ((filt, ident), info) in ids_dict.items():
-            if "Paging" in info["sources"]:
-                dt = info["display_type"]
-                if dt not in ("m-TMSI", "5G-TMSI", "SUCI", "GUTI"):
-                    non_target.append(f"{dt}:{ident}")
-        if ids_dict:
-            if non_target:
-                self.tests[3]["result"] = "Fail"
-                self.tests[3]["info"] = "Non-SUCI/GUTI in paging:\n" + "\n".join(non_target)
-            else:
-                self.tests[3]["result"] = "Pass"
-                self.tests[3]["info"] = "All SUCI/GUTI in paging"
-        else:
-            self.tests[3]["result"] = "Pending"
-            self.tests[3]["info"] = "No paging events."
-
-        #5 => no IMEISV => fail if any IMEISV found
-        imeisv_ids = []
-        for ((filt, ident), info) in ids_dict.items():
-            if info["display_type"] == "IMEISV":
-                imeisv_ids.append(ident)
-        if imeisv_ids:
-            self.tests[4]["result"] = "Fail"
-            self.tests[4]["info"] = "IMEISV found:\n" + "\n".join(imeisv_ids)
-        else:
-            self.tests[4]["result"] = "Pass"
-            self.tests[4]["info"] = "No IMEISV found."
-
-        #6 => No IMSI in Identity Response => fail if IMSI + "Identity Response"
-        identity_imsi = []
-        for ((filt, ident), info) in ids_dict.items():
-            if info["display_type"] == "IMSI":
-                for src in info["sources"]:
-                    if "identity response" in src.lower():
-                        identity_imsi.append(ident)
-                        break
-        if identity_imsi:
-            self.tests[5]["result"] = "Fail"
-            self.tests[5]["info"] = "IMSI in Identity Response:\n" + "\n".join(identity_imsi)
-        else:
-            self.tests[5]["result"] = "Pass"
-            self.tests[5]["info"] = "No IMSI in Identity Response."
-
-        #7..8 => pending
-        for i in range(6, 8):
-            self.tests[i]["result"] = "Pending"
-            self.tests[i]["info"] = ""
+    def update_tests(self, state):
+        # state is the model's PrivacyTests, kept up to date on ingest
+        state.fill(self.tests)
 
         # update row colors
         for idx, td in enumerate(self.test_rows):
@@ -433,8 +402,184 @@ class TestPanel(BoxLayout):
             td["more_btn"].disabled = False
             td["more_btn"].opacity = 1.0
 
-class IdentifierDisplayMain(TabbedPanel):
+class StatsPanel(BoxLayout):
+    """
+    Pipeline metrics (see metrics.py) as text, rates taken between updates.
+    """
     def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.padding = 10
+        with self.canvas.before:
+            Color(0.105, 0.168, 0.247, 1)
+            self.bg = Rectangle(pos=self.pos, size=self.size)
+        self.bind(pos=self._update_bg, size=self._update_bg)
+        self.label = Label(color=(1, 1, 1, 1), font_name="RobotoMono-Regular", font_size=13,
+                           halign='left', valign='top')
+        self.label.bind(size=lambda w, _: setattr(w, 'text_size', w.size))
+        self.add_widget(self.label)
+        self._prev = None
+
+    def _update_bg(self, *args):
+        self.bg.pos = self.pos
+        self.bg.size = self.size
+
+    def update(self):
+        now = time.monotonic()
+        m = metrics.collect()
+
+        def val(name, default=0):
+            return m.get(name, {}).get(None, default)
+
+        parse = m.get("capture_parse_seconds", {})
+        cpu = m.get("process_cpu_seconds_total", {})
+        counts = {
+            "frames": val("capture_frames_total"),
+            "events": val("capture_queue_events_total"),
+            "rx": val("capture_interface_rx_packets_total"),
+        }
+        counts.update({("stream", k): h.count for k, h in parse.items()})
+        counts.update({("cpu", k): v for k, v in cpu.items()})
+        prev_t, prev = self._prev or (now, counts)
+        span = max(now - prev_t, 1e-9)
+        self._prev = (now, counts)
+
+        def rate(key):
+            return (counts.get(key, 0) - prev.get(key, 0)) / span if prev is not counts else 0.0
+
+        def us(h, q):
+            return f"{h.quantile(q) * 1e6:.0f} us" if h.count else "-"
+
+        def ms(h, q):
+            return f"{h.quantile(q) * 1e3:.1f} ms" if h is not None and h.count else "-"
+
+        lines = [
+            f"Frames read    {counts['frames']:>12}   {rate('frames'):8.0f}/s",
+            f"Events queued  {counts['events']:>12}   {rate('events'):8.0f}/s",
+            "",
+            f"{'Stream':<14}{'frames/s':>10}{'parse p50':>12}{'parse p99':>12}",
+        ]
+        for name, h in sorted(parse.items()):
+            lines.append(f"{name:<14}{rate(('stream', name)):>10.0f}{us(h, 0.5):>12}{us(h, 0.99):>12}")
+        lines += [
+            "",
+            f"Queue depth {val('capture_queue_depth')}   "
+            f"max {val('capture_queue_max_depth')}   "
+            f"oldest {val('capture_queue_age_seconds'):.2f} s   "
+            f"dropped {val('capture_queue_dropped_total')}",
+            f"Engine restarts {sum(m.get('capture_engine_restarts_total', {}).values())}   "
+            f"coalesced {val('capture_coalesced_total')}",
+            f"Capture dropped {val('capture_pcap_dropped_total')} (tshark, at engine exit)   "
+            f"log records dropped {val('log_records_dropped_total')}",
+            f"Interface rx {rate('rx'):.0f} pkt/s   "
+            f"driver dropped {val('capture_interface_rx_dropped_total', '-')}",
+            "",
+        ]
+        rss = m.get("process_resident_memory_bytes", {})
+        for name in sorted(rss):
+            lines.append(f"{name:<8} cpu {rate(('cpu', name)) * 100:5.1f}%   rss {rss[name] / 2**20:7.1f} MB")
+        lines += ["", f"{'GUI update':<14}{'p50':>10}{'p99':>10}"]
+        for name, key in (("drain", "gui_drain_seconds"), ("ingest", "gui_ingest_seconds"),
+                          ("refresh", "gui_refresh_seconds")):
+            h = m.get(key, {}).get(None)
+            lines.append(f"{name:<14}{ms(h, 0.5):>10}{ms(h, 0.99):>10}")
+        self.label.text = "\n".join(lines)
+
+class RatesPanel(BoxLayout):
+    """
+    Message rates of one cell (or all cells) over time, one line per kind,
+    from the model's RateAggregator (see rates.py).
+    """
+    colors = {"Paging": (0.3, 0.7, 1, 1), "RRC setup": (1, 0.7, 0.2, 1), "NAS": (0.4, 1, 0.4, 1)}
+
+    def __init__(self, model, **kwargs):
+        super().__init__(**kwargs)
+        self.model = model
+        self.orientation = 'vertical'
+        self.padding = 10
+        self.spacing = 5
+        with self.canvas.before:
+            Color(0.105, 0.168, 0.247, 1)
+            self.bg = Rectangle(pos=self.pos, size=self.size)
+        self.bind(pos=self._update_bg, size=self._update_bg)
+
+        bar = BoxLayout(size_hint_y=None, height=40, spacing=10)
+        self.res_spinner = Spinner(
+            text="1s",
+            values=[r[0] for r in RESOLUTIONS],
+            size_hint_x=0.15,
+            background_normal='',
+            background_color=(0.2, 0.3, 0.4, 1),
+            color=(1, 1, 1, 1)
+        )
+        self.cell_spinner = Spinner(
+            text="All cells",
+            values=("All cells",),
+            size_hint_x=0.35,
+            background_normal='',
+            background_color=(0.2, 0.3, 0.4, 1),
+            color=(1, 1, 1, 1)
+        )
+        self.res_spinner.bind(text=lambda *_: self.update())
+        self.cell_spinner.bind(text=lambda *_: self.update())
+        bar.add_widget(self.res_spinner)
+        bar.add_widget(self.cell_spinner)
+        self.legend = Label(markup=True, halign='left', valign='middle', size_hint_x=0.5)
+        self.legend.bind(size=lambda w, _: setattr(w, 'text_size', w.size))
+        bar.add_widget(self.legend)
+        self.add_widget(bar)
+
+        self.plot = Widget()
+        with self.plot.canvas:
+            self.lines = {}
+            for kind in KINDS:
+                Color(*self.colors[kind])
+                self.lines[kind] = Line(points=[], width=1.2)
+        self.plot.bind(pos=lambda *_: self.update(), size=lambda *_: self.update())
+        self.add_widget(self.plot)
+
+        self.axis_label = Label(size_hint_y=None, height=25, color=(1, 1, 1, 1), font_size=13)
+        self.add_widget(self.axis_label)
+        self._cells = {}
+
+    def _update_bg(self, *args):
+        self.bg.pos = self.pos
+        self.bg.size = self.size
+
+    def _update_cells(self):
+        rates = self.model.rates
+        cells = {}
+        for source, tac, cid in rates.cells():
+            name = f"TAC {tac} / CID {cid}"
+            cells[f"{name} ({source})" if source else name] = (source, tac, cid)
+        if cells.keys() != self._cells.keys():
+            self._cells = cells
+            self.cell_spinner.values = ["All cells"] + list(cells)
+
+    def update(self):
+        rates = self.model.rates
+        self._update_cells()
+        cell = self._cells.get(self.cell_spinner.text, ALL_CELLS)
+        res = self.res_spinner.text
+        # all series end at the same slot, the newest event
+        series = {kind: rates.values(cell, kind, res) for kind in KINDS}
+        peak = max(max(v) for v in series.values()) or 1
+        x0, y0 = self.plot.pos
+        w, h = self.plot.size
+        for kind, values in series.items():
+            step = w / max(len(values) - 1, 1)
+            pts = []
+            for i, v in enumerate(values):
+                pts += [x0 + i * step, y0 + h * v / peak]
+            self.lines[kind].points = pts
+        self.legend.text = "   ".join(
+            f"[color={''.join('%02x' % int(c * 255) for c in self.colors[k][:3])}]{k}: "
+            f"{series[k][-1]}[/color]" for k in KINDS)
+        size = len(next(iter(series.values())))
+        self.axis_label.text = (f"messages per {res}, last {size} slots, peak {peak}"
+                                f"{'' if rates.newest is None else ', newest ' + format_ts(rates.newest)}")
+
+class IdentifierDisplayMain(TabbedPanel):
+    def __init__(self, model=None, **kwargs):
         super().__init__(**kwargs)
         self.background_color = (0.2, 0.3, 0.4, 1)
         self.do_default_tab = False
@@ -442,31 +587,40 @@ class IdentifierDisplayMain(TabbedPanel):
         self.tab_pos = 'top_left'
         self.tab_width = 120
 
-        # store keyed by (filter_type, identifier)
-        self.ids_dict = defaultdict(lambda: {
-            "count": 0,
-            "first_seen": None,
-            "last_seen": None,
-            "tracking_area_code": None,
-            "cell_identity": None,
-            "mcc": None,
-            "mnc": None,
-            "sources": set(),
-            "display_type": "",
-            "mme_group_id": "",
-            "mme_code": ""
-        })
-        self.ue_events = []
+        self.model = model if model is not None else IdentifierModel()
+        self.ids_dict = self.model.ids_dict
+        self.ue_events = self.model.ue_events
         self.selection_mode = False
         self.track_mode = False
         self.selected_ids = set()
         self.sort_column = "last_seen"
         self.sort_ascending = True
         self.show_all = False
+        # (ID type, identifier) -> Details row data, see _row_data()
+        self._rows = {}
+        # last ("status", {...}) of each engine supervisor, keyed by capture
+        # source ("" for the single default source), see supervisor.py
+        self.engine_status = {}
 
         self._build_ue_tab()
         self._build_tests_tab()
         self._build_details_tab()
+        self._build_chains_tab()
+        self._build_rates_tab()
+        self._build_stats_tab()
+
+        self.refresh = RefreshScheduler()
+        self._views = {
+            self.details_tab: ("details", self._refresh_table),
+            self.tests_tab: ("tests", lambda: self.test_panel.update_tests(self.model.tests)),
+            self.ue_tab: ("ue", self._refresh_ue_table),
+            self.chains_tab: ("chains", self.update_chains),
+            self.rates_tab: ("rates", self.rates_panel.update),
+            self.stats_tab: ("stats", self.stats_panel.update),
+        }
+        self.refresh.mark("details", "tests", "ue", "chains", "rates")
+        # a tab that is switched to shows what changed while it was hidden
+        self.bind(current_tab=lambda *_: self.redraw())
 
     def _build_ue_tab(self):
         self.ue_tab = TabbedPanelItem(text="UE connected")
@@ -477,10 +631,7 @@ class IdentifierDisplayMain(TabbedPanel):
         cont.bind(pos=self._update_ue_bg, size=self._update_ue_bg)
 
         self.ue_header = BoxLayout(orientation='horizontal', size_hint_y=None, height=30, padding=(5, 0, 5, 0))
-        self.ue_columns = [
-            "Timestamp", "ID Type", "ID", "Packet Info", "TAC",
-            "CID", "MCC", "MNC", "MME Group ID", "MME Code"
-        ]
+        self.ue_columns = UE_COLUMNS
         for col in self.ue_columns:
             lbl = Label(
                 text=col,
@@ -492,17 +643,20 @@ class IdentifierDisplayMain(TabbedPanel):
             self.ue_header.add_widget(lbl)
         cont.add_widget(self.ue_header)
 
-        self.ue_scroll = ScrollView(
-            size_hint=(1, 1),
-            do_scroll_x=True,
-            do_scroll_y=True,
-            bar_width=20,
-            scroll_type=['bars']
+        # append-only and virtualized: new rows are added to the data list,
+        # and only the rows in the viewport are instantiated
+        self.ue_table = RecycleView(size_hint=(1, 1), do_scroll_x=False, bar_width=20, scroll_type=['bars'])
+        ue_box = RecycleBoxLayout(
+            orientation='vertical',
+            default_size=(None, 40),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+            spacing=1
         )
-        self.ue_box = BoxLayout(orientation='vertical', size_hint_y=None, spacing=1)
-        self.ue_box.bind(minimum_height=self.ue_box.setter('height'))
-        self.ue_scroll.add_widget(self.ue_box)
-        cont.add_widget(self.ue_scroll)
+        ue_box.bind(minimum_height=ue_box.setter('height'))
+        self.ue_table.add_widget(ue_box)
+        self.ue_table.viewclass = UEConnectedRow
+        cont.add_widget(self.ue_table)
 
         self.ue_tab.add_widget(cont)
         self.add_widget(self.ue_tab)
@@ -512,18 +666,27 @@ class IdentifierDisplayMain(TabbedPanel):
         self.ue_bg.size = layout.size
 
     def _refresh_ue_table(self):
-        self.ue_box.clear_widgets()
-        for ev in self.ue_events:
-            row = UEConnectedRow(ev, self.ue_columns)
-            self.ue_box.add_widget(row)
-            self.ue_box.add_widget(BoxLayout(size_hint_y=None, height=1))
-
-    def update_ue_info(self, data):
-        self.ue_events.append(data)
-        self._refresh_ue_table()
+        self.ue_table.data = list(self.ue_events)
+
+    def update_ue_info(self, rows):
+        """
+        Append the UE rows of one queue drain to the view in one update. The
+        model has already appended them to ue_events and may have trimmed
+        its window since the last call. While the tab is hidden the view is
+        only marked, and reloaded when it is shown.
+        """
+        if self.current_tab is not self.ue_tab:
+            self.refresh.mark("ue")
+            return
+        data = self.ue_table.data
+        if len(data) + len(rows) != len(self.ue_events):
+            # the window was trimmed (every ue_window/10 rows), reload it
+            self._refresh_ue_table()
+        else:
+            data.extend(rows)
 
     def _build_tests_tab(self):
-        tests_tab = TabbedPanelItem(text="Tests")
+        self.tests_tab = tests_tab = TabbedPanelItem(text="Tests")
         tests_container = AnchorLayout(anchor_x='left', anchor_y='top', padding=0)
         with tests_container.canvas.before:
             Color(0.105, 0.168, 0.247, 1)
@@ -541,8 +704,108 @@ class IdentifierDisplayMain(TabbedPanel):
         self.tests_bg.pos = layout.pos
         self.tests_bg.size = layout.size
 
+    def _build_chains_tab(self):
+        self.chains_tab = TabbedPanelItem(text="Chains")
+        cont = BoxLayout(orientation='vertical', spacing=2, padding=2)
+        with cont.canvas.before:
+            Color(0.105, 0.168, 0.247, 1)
+            self.chains_bg = Rectangle(pos=cont.pos, size=cont.size)
+        cont.bind(pos=self._update_chains_bg, size=self._update_chains_bg)
+
+        header = BoxLayout(orientation='horizontal', size_hint_y=None, height=30, padding=(5, 0, 5, 0))
+        for col in CHAIN_TAB_COLUMNS:
+            lbl = Label(text=col, color=(1, 1, 1, 1), halign='left', valign='middle')
+            lbl.bind(size=lambda w, _: setattr(w, 'text_size', w.size))
+            header.add_widget(lbl)
+        cont.add_widget(header)
+
+        self.chains_table = RecycleView(size_hint=(1, 1), do_scroll_x=False, bar_width=20, scroll_type=['bars'])
+        box = RecycleBoxLayout(
+            orientation='vertical',
+            default_size=(None, 40),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+            spacing=1
+        )
+        box.bind(minimum_height=box.setter('height'))
+        self.chains_table.add_widget(box)
+        self.chains_table.viewclass = ChainRow
+        cont.add_widget(self.chains_table)
+
+        self.chains_label = Label(text="", font_size=16, size_hint_y=None, height=30, color=(1, 1, 1, 1))
+        cont.add_widget(self.chains_label)
+
+        self.chains_tab.add_widget(cont)
+        self.add_widget(self.chains_tab)
+        self._chains_shown = None
+
+    def _update_chains_bg(self, layout, _):
+        self.chains_bg.pos = layout.pos
+        self.chains_bg.size = layout.size
+
+    def update_chains(self):
+        # rebuilt only when the linker has new links
+        linker = self.model.linker
+        state = (linker.links, len(linker.linked))
+        if self._chains_shown == state:
+            return
+        self._chains_shown = state
+        data = []
+        for chain in linker.chains(CHAINS_SHOWN):
+            cid, source, _mcc, _mnc, tac, cell_id, idents, reallocs, _ivals, last = chain_row(chain)
+            ivals = chain.intervals()
+            data.append({
+                "chain": cid,
+                "source": source,
+                "tac": tac,
+                "cid": cell_id,
+                "identifiers": idents,
+                "reallocations": reallocs,
+                "mean_interval": format_lifespan(sum(ivals) / len(ivals)) if ivals else "",
+                "last_seen": last,
+            })
+        self.chains_table.data = data
+        st = linker.stats()
+        self.chains_label.text = (f"UE chains: {st['chains']}   links: {st['links']}   "
+                                  f"ambiguous: {st['ambiguous']}   tracked IDs: {st['identities']}")
+
+    def _build_rates_tab(self):
+        self.rates_tab = TabbedPanelItem(text="Rates")
+        self.rates_panel = RatesPanel(self.model)
+        self.rates_tab.add_widget(self.rates_panel)
+        self.add_widget(self.rates_tab)
+
+    def _build_stats_tab(self):
+        self.stats_tab = TabbedPanelItem(text="Stats")
+        self.stats_panel = StatsPanel()
+        self.stats_tab.add_widget(self.stats_panel)
+        self.add_widget(self.stats_tab)
+
+    def data_changed(self):
+        """
+        Mark the views that show the model after an ingest.
+        """
+        self.refresh.mark("details", "tests", "chains", "rates")
+
+    def redraw(self):
+        """
+        Redraw the visible tab if it changed. Returns True if it was redrawn.
+        """
+        view = getattr(self, "_views", {}).get(self.current_tab)
+        if view is None:
+            return False
+        name, draw = view
+        # the Details table stays frozen while IDs are being selected
+        if name == "details" and self.selection_mode:
+            return False
+        if not self.refresh.take(name):
+            return False
+        draw()
+        REDRAWS.labels(name).inc()
+        return True
+
     def _build_details_tab(self):
-        details_tab = TabbedPanelItem(text="Details")
+        self.details_tab = details_tab = TabbedPanelItem(text="Details")
         details_layout = BoxLayout(orientation='vertical', spacing=10, padding=10)
         with details_layout.canvas.before:
             Color(0.105, 0.168, 0.247, 1)
@@ -564,7 +827,21 @@ class IdentifierDisplayMain(TabbedPanel):
         self.filter_spinner.bind(text=self._on_spinner_select)
         filter_bar.add_widget(self.filter_spinner)
 
-        self.top_bar_buttons = BoxLayout(size_hint_x=0.7, spacing=5)
+        # capture source filter, only useful (and shown) with several sources
+        self.source_spinner = Spinner(
+            text="All sources",
+            values=("All sources",),
+            size_hint_x=0.2,
+            background_normal='',
+            background_color=(0.2, 0.3, 0.4, 1),
+            color=(1, 1, 1, 1),
+            opacity=0,
+            disabled=True
+        )
+        self.source_spinner.bind(text=self._on_spinner_select)
+        filter_bar.add_widget(self.source_spinner)
+
+        self.top_bar_buttons = BoxLayout(size_hint_x=0.5, spacing=5)
         self._update_top_bar_buttons()
         filter_bar.add_widget(self.top_bar_buttons)
         details_layout.add_widget(filter_bar)
@@ -572,11 +849,19 @@ class IdentifierDisplayMain(TabbedPanel):
         self.header_layout = BoxLayout(orientation='horizontal', size_hint_y=None, height=35, padding=(5, 0, 5, 0))
         details_layout.add_widget(self.header_layout)
 
-        self.scroll_view = ScrollView(size_hint=(1, 1), do_scroll_x=True, bar_width=20, scroll_type=['bars'])
-        self.identifier_grid = BoxLayout(orientation='vertical', padding=(0, 0, 0, 0), spacing=0, size_hint_y=None)
-        self.identifier_grid.bind(minimum_height=self.identifier_grid.setter('height'))
-        self.scroll_view.add_widget(self.identifier_grid)
-        details_layout.add_widget(self.scroll_view)
+        # virtualized: only the rows in the viewport are instantiated
+        self.identifier_table = RecycleView(size_hint=(1, 1), do_scroll_x=False, bar_width=20, scroll_type=['bars'])
+        grid = RecycleBoxLayout(
+            orientation='vertical',
+            default_size=(None, 35),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+            spacing=1
+        )
+        grid.bind(minimum_height=grid.setter('height'))
+        self.identifier_table.add_widget(grid)
+        self.identifier_table.viewclass = TableRow
+        details_layout.add_widget(self.identifier_table)
 
         self.show_all_btn = Button(
             text="Show All",
@@ -605,43 +890,24 @@ class IdentifierDisplayMain(TabbedPanel):
         self.bg_rect.pos = args[0].pos
         self.bg_rect.size = args[0].size
 
+    def _update_source_spinner(self):
+        values = ("All sources",) + tuple(sorted(self.model.capture_sources))
+        if values != tuple(self.source_spinner.values):
+            self.source_spinner.values = values
+            shown = len(values) > 1
+            self.source_spinner.opacity = 1 if shown else 0
+            self.source_spinner.disabled = not shown
+
     def _on_spinner_select(self, spinner, text):
         self.selection_mode = False
         self._refresh_display()
         self._update_top_bar_buttons()
 
     def _toggle_show_all(self, _btn):
-        if not self.show_all:
-            box = BoxLayout(orientation='vertical', spacing=10, padding=10)
-            lbl = Label(
-                text="Are you sure you want to show all IDs? This may cause lag.",
-                color=(1, 1, 1, 1)
-            )
-            box.add_widget(lbl)
-            row = BoxLayout(orientation='horizontal', spacing=10, size_hint_y=None, height=40)
-            b_yes = Button(text="Yes", background_color=(0.8, 0, 0, 1), color=(1, 1, 1, 1))
-            b_no = Button(text="No", background_color=(0, 0.6, 0, 1), color=(1, 1, 1, 1))
-            row.add_widget(b_yes)
-            row.add_widget(b_no)
-            box.add_widget(row)
-            popup = Popup(title="Show All?", content=box, size_hint=(0.5, 0.3), auto_dismiss=False)
-
-            def do_yes(*_):
-                popup.dismiss()
-                self.show_all = True
-                self.show_all_btn.text = "Show Top 50"
-                self._refresh_display()
-
-            def do_no(*_):
-                popup.dismiss()
-
-            b_yes.bind(on_release=do_yes)
-            b_no.bind(on_release=do_no)
-            popup.open()
-        else:
-            self.show_all = False
-            self.show_all_btn.text = "Show All"
-            self._refresh_display()
+        # rows are recycled, so showing all IDs costs no more than the top 50
+        self.show_all = not self.show_all
+        self.show_all_btn.text = "Show Top 50" if self.show_all else "Show All"
+        self._refresh_display()
 
     def _update_top_bar_buttons(self):
         self.top_bar_buttons.clear_widgets()
@@ -780,131 +1046,119 @@ class IdentifierDisplayMain(TabbedPanel):
 
     def _get_sort_key(self, item):
         (filt, ident), info = item
-        from datetime import datetime
         if self.sort_column == "id_type":
             return filt or ""
         elif self.sort_column == "identifier":
             return ident or ""
         elif self.sort_column == "count":
-            return info["count"]
+            return info.count
         elif self.sort_column == "last_seen":
-            ls = info["last_seen"]
-            if not ls:
-                return datetime.min
-            try:
-                return datetime.strptime(ls, "%Y-%m-%d %H:%M:%S")
-            except:
-                return datetime.min
+            return info.last_seen or 0
         elif self.sort_column == "lifespan":
-            if info["first_seen"] and info["last_seen"]:
-                try:
-                    t1 = datetime.strptime(info["first_seen"], "%Y-%m-%d %H:%M:%S")
-                    t2 = datetime.strptime(info["last_seen"], "%Y-%m-%d %H:%M:%S")
-                    sec = (t2 - t1).total_seconds()
-                    if sec < 0:
-                        sec += 86400
-                    return sec
-                except:
-                    return 0
-            return 0
+            return info.lifespan
         elif self.sort_column == "tracking_area_code":
-            return info.get("tracking_area_code", "")
+            return info.tracking_area_code or ""
         elif self.sort_column == "cell_identity":
-            return info.get("cell_identity", "")
+            return info.cell_identity or ""
         elif self.sort_column == "active":
-            ls = info["last_seen"]
-            if not ls:
-                return 999999
-            try:
-                now = datetime.now()
-                dt2 = datetime.strptime(ls, "%Y-%m-%d %H:%M:%S")
-                return (now - dt2).total_seconds()
-            except:
+            if info.last_seen is None:
                 return 999999
+            return time.time() - info.last_seen
         return 0
 
     def _refresh_display(self):
         self.header_layout.clear_widgets()
         self.add_table_header()
-        self.identifier_grid.clear_widgets()
-
-        items = []
-        for (filt, ident), info in self.ids_dict.items():
-            # filter the display
-            if self.filter_spinner.text != "All" and self.filter_spinner.text != filt:
-                continue
-            items.append(((filt, ident), info))
-
-        pinned = []
-        normal = []
-        for (filt, ident), info in items:
-            if (filt, ident) in self.selected_ids:
-                pinned.append(((filt, ident), info))
-            else:
-                normal.append(((filt, ident), info))
-
+        self._refresh_table()
+
+    def _refresh_table(self):
+        self._update_source_spinner()
+        view_type = None if self.filter_spinner.text == "All" else self.filter_spinner.text
+        source = None if self.source_spinner.text == "All sources" else self.source_spinner.text
+        # the few pinned IDs are sorted here, the rest comes ordered from the index
+        pinned = [(key, self.ids_dict[key]) for key in self.selected_ids
+                  if key in self.ids_dict and (view_type is None or key[0] == view_type)
+                  and (source is None or self.ids_dict[key].capture_source == source)]
         pinned.sort(key=self._get_sort_key, reverse=not self.sort_ascending)
-        normal.sort(key=self._get_sort_key, reverse=not self.sort_ascending)
-        final_list = pinned + normal
+        pinned_keys = {key for key, _ in pinned}
 
+        normal = (key for key in self.model.views.ordered(view_type, self.sort_column, self.sort_ascending)
+                  if key not in pinned_keys)
+        if source is not None:
+            normal = (key for key in normal if self.ids_dict[key].capture_source == source)
         if not self.show_all:
-            final_list = final_list[:50]
-
-        if self.filter_spinner.text == "All":
-            col_keys = ["id_type", "identifier", "count", "last_seen", "lifespan", "tracking_area_code", "cell_identity", "active"]
-        else:
-            col_keys = ["identifier", "count", "last_seen", "lifespan", "tracking_area_code", "cell_identity", "active"]
-
-        for (filt, ident), info in final_list:
-            sec = 0
-            if info["first_seen"] and info["last_seen"]:
-                try:
-                    t1 = datetime.strptime(info["first_seen"], "%Y-%m-%d %H:%M:%S")
-                    t2 = datetime.strptime(info["last_seen"], "%Y-%m-%d %H:%M:%S")
-                    sec = (t2 - t1).total_seconds()
-                    if sec < 0:
-                        sec += 86400
-                except:
-                    pass
-            life_str = format_lifespan(sec)
-            row = TableRow(
-                filt, ident, info, life_str,
-                self._show_detail_popup,
-                selection_mode_ref=lambda: self.selection_mode,
-                track_mode_ref=lambda: self.track_mode,
-                selected_ids_ref=self.selected_ids,
-                col_keys=col_keys
-            )
-            self.identifier_grid.add_widget(row)
-            self.identifier_grid.add_widget(BoxLayout(size_hint_y=None, height=1))
+            normal = itertools.islice(normal, max(50 - len(pinned), 0))
+        final_list = pinned + [(key, self.ids_dict[key]) for key in normal]
+
+        col_keys = DETAIL_COLUMNS if view_type is None else TYPE_DETAIL_COLUMNS
+        if len(self._rows) > len(self.ids_dict):
+            # the table was replaced (daemon snapshot): drop the old rows
+            self._rows.clear()
+        self.identifier_table.data = [self._row_data(key, info, col_keys) for key, info in final_list]
+        self._update_counter_label()
+
+    def _row_data(self, key, info, col_keys):
+        """
+        The RecycleView data dict of one identifier. It only holds
+        references (the row reads the record when it is shown), so it is made
+        once per identifier and reused: with Show All a refresh doesn't
+        allocate a dict per row.
+        """
+        row = self._rows.get(key)
+        if row is None or row["info"] is not info or row["col_keys"] is not col_keys:
+            row = self._rows[key] = {"id_type": key[0], "identifier": key[1], "info": info,
+                                     "col_keys": col_keys, "owner": self}
+        return row
 
-        self.test_panel.update_tests(self.ids_dict)
-        self.counter_label.text = f"Total Unique IDs Captured: {len(self.ids_dict)}"
+    def _update_counter_label(self):
+        text = f"Total Unique IDs Captured: {len(self.ids_dict)}"
+        q = capture_queue.stats()
+        if q["dropped"]:
+            text += f"   (queue max {q['max_depth']}, dropped {q['dropped']})"
+        bad = False
+        for name, st in sorted(self.engine_status.items()):
+            if st["restarts"] or st["state"] != "running":
+                engine = f"{name} engine" if name else "engine"
+                text += (f"   {engine} {st['state']}, {st['restarts']} restart(s), "
+                         f"{format_ts(st['ts'])}: {st['message']}")
+            bad = bad or st["state"] != "running"
+        self.counter_label.text = text
+        self.counter_label.color = (1, 0.4, 0.4, 1) if bad else (1, 1, 1, 1)
+
+    def set_engine_status(self, status):
+        """
+        Show a state change of the capture engine (restart, stall, ...) at
+        once, also while the table is frozen for selection.
+        """
+        self.engine_status[status.get("source", "")] = status
+        self._update_counter_label()
 
     def _show_detail_popup(self, idtype, ident, info, life):
-        srclist = ", ".join(sorted(info["sources"])) or "N/A"
+        srclist = ", ".join(sorted(info.sources)) or "N/A"
         conv = convert_id(ident)
         # If the real type is different, show it
         real_type_line = ""
-        if idtype != info["display_type"]:
-            real_type_line = f"\nReal ID Type: {info['display_type']}"
+        if idtype != info.display_type:
+            real_type_line = f"\nReal ID Type: {info.display_type}"
 
         dtxt = (
             f"ID Type: {idtype}\n"
             f"Identifier: {ident}\n"
             f"{conv}{real_type_line}\n"
-            f"First Seen: {info.get('first_seen','N/A')}\n"
-            f"Last Seen: {info.get('last_seen','N/A')}\n"
-            f"Count: {info['count']}\n"
+            f"First Seen: {format_ts(info.first_seen) or 'N/A'}\n"
+            f"Last Seen: {format_ts(info.last_seen) or 'N/A'}\n"
+            f"Count: {info.count}\n"
             f"Lifespan: {life}\n"
-            f"TAC: {info.get('tracking_area_code','')}\n"
-            f"CID: {info.get('cell_identity','')}\n"
-            f"MCC: {info.get('mcc','')}\n"
-            f"MNC: {info.get('mnc','')}\n"
-            f"MME Group ID: {info.get('mme_group_id','')}\n"
-            f"MME Code: {info.get('mme_code','')}\n"
+            f"TAC: {info.tracking_area_code}\n"
+            f"CID: {info.cell_identity}\n"
+            f"MCC: {info.mcc}\n"
+            f"MNC: {info.mnc}\n"
+            f"MME Group ID: {info.mme_group_id}\n"
+            f"MME Code: {info.mme_code}\n"
             f"Message Types: {srclist}\n"
         )
+        if info.capture_source:
+            dtxt += f"Capture Source: {info.capture_source}\n"
         box = BoxLayout(orientation='vertical', spacing=10, padding=10)
         txt = TextInput(
             text=dtxt,
@@ -952,145 +1206,125 @@ class IdentifierDisplayMain(TabbedPanel):
         content = BoxLayout(orientation='vertical', spacing=10, padding=10)
         row1 = BoxLayout(orientation='horizontal', size_hint_y=None, height=40, spacing=10)
         row1.add_widget(Label(text="Filename:", size_hint_x=0.3, color=(1, 1, 1, 1)))
-        filename_input = TextInput(text="exported_identifiers.csv")
+        filename_input = TextInput(text="export.csv")
         row1.add_widget(filename_input)
         content.add_widget(row1)
 
+        # .parquet/.arrow only with pyarrow installed
+        exts = export_extensions()
+        status = Label(text="Identifiers and UE log (+ session events with --db). "
+                            + ", ".join(exts[:-1]) + " or " + exts[-1],
+                       size_hint_y=None, height=30, color=(1, 1, 1, 1))
+        content.add_widget(status)
+        progress = ProgressBar(max=1, value=0, size_hint_y=None, height=20)
+        content.add_widget(progress)
+
         row2 = BoxLayout(orientation='horizontal', size_hint_y=None, height=40, spacing=10)
         b_save = Button(text="Save")
-        b_cancel = Button(text="Cancel")
+        b_cancel = Button(text="Close")
         row2.add_widget(b_save)
         row2.add_widget(b_cancel)
         content.add_widget(row2)
 
-        popup = Popup(title="Export CSV", content=content, size_hint=(0.8, 0.3), auto_dismiss=False)
+        popup = Popup(title="Export", content=content, size_hint=(0.8, 0.4), auto_dismiss=False)
+
+        # the export runs on a worker thread; widgets are only touched via the Clock
+        def on_progress(done, total):
+            def show(_):
+                progress.max = max(total, 1)
+                progress.value = done
+                status.text = f"{done}/{total} rows"
+            Clock.schedule_once(show)
+
+        def on_done(files, error):
+            def show(_):
+                b_save.disabled = False
+                if error is not None:
+                    status.text = f"Export failed: {error}"
+                else:
+                    status.text = "Wrote " + ", ".join(files)
+            Clock.schedule_once(show)
+
         def do_save(_):
-            fname = filename_input.text.strip() or "exported_identifiers.csv"
-            try:
-                with open(fname, "w", newline="") as csvf:
-                    w = csv.writer(csvf)
-                    w.writerow([
-                        "Filter Type","Identifier","Count","First Seen","Last Seen",
-                        "TAC","CID","MCC","MNC","MME Group ID","MME Code","Message Types"
-                    ])
-                    for (filt, ident), info in self.ids_dict.items():
-                        srcs = ",".join(sorted(info["sources"]))
-                        w.writerow([
-                            filt,
-                            ident,
-                            info["count"],
-                            info.get("first_seen",""),
-                            info.get("last_seen",""),
-                            info.get("tracking_area_code",""),
-                            info.get("cell_identity",""),
-                            info.get("mcc",""),
-                            info.get("mnc",""),
-                            info.get("mme_group_id",""),
-                            info.get("mme_code",""),
-                            srcs
-                        ])
-            except Exception as e:
-                print("[DEBUG] Error writing CSV:", e)
-            popup.dismiss()
+            fname = filename_input.text.strip() or "export.csv"
+            b_save.disabled = True
+            status.text = "Exporting..."
+            progress.value = 0
+            start_export(self.model, fname, on_progress, on_done)
         b_save.bind(on_release=do_save)
         b_cancel.bind(on_release=lambda *_: popup.dismiss())
         popup.open()
 
-from kivy.clock import Clock
-
-
 class IdentifierApp(App):
+    def __init__(self, model=None, **kwargs):
+        super().__init__(**kwargs)
+        self.model = model
+        self.reorder = ReorderBuffer()
+        # releases the events held for reordering once their window is over
+        self._release = None
+
     def build(self):
         Window.bind(on_keyboard=self._on_keyboard)
         Window.bind(on_request_close=self.on_request_close)
-        # remember last UE event to skip identical repeats
-        self._last_ue_event = None
 
         root = BoxLayout(orientation='vertical')
-        self.disp = IdentifierDisplayMain()
+        self.disp = IdentifierDisplayMain(model=self.model)
         root.add_widget(self.disp)
-        Clock.schedule_interval(self.update_gui, 1.0)
+        Clock.schedule_once(self.update_gui, 1.0)
         return root
 
     def update_gui(self, dt):
-        while not capture_queue.empty():
-            item = capture_queue.get()
-
-            # new-style tuples with 11 items
-            if isinstance(item, tuple) and len(item) == 11:
-                (filt, ident, ts, mcc, mnc, tac, cid,
-                 packet_info, disp_type, mme_grp, mme_cd) = item
-
-                # non-paging => candidate for UE-connected
-                if "Paging" not in packet_info:
-                    ue_ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    ue_data = {
-                        "timestamp": ue_ts,
-                        "id_type": disp_type,
-                        "id": ident,
-                        "packet_info": packet_info,
-                        "tac": tac,
-                        "cid": cid,
-                        "mcc": mcc,
-                        "mnc": mnc,
-                        "mme_group_id": mme_grp,
-                        "mme_code": mme_cd
-                    }
-                    # skip if identical to last
-                    if ue_data != self._last_ue_event:
-                        self.disp.update_ue_info(ue_data)
-                        self._last_ue_event = ue_data.copy()
-
-                info = self.disp.ids_dict[(filt, ident)]
-                if not info["first_seen"]:
-                    info["first_seen"] = ts
-                info["last_seen"] = ts
-                info["count"] += 1
-                info["display_type"] = disp_type
-                if mcc: info["mcc"] = mcc
-                if mnc: info["mnc"] = mnc
-                if tac: info["tracking_area_code"] = tac
-                if cid: info["cell_identity"] = cid
-                info["mme_group_id"] = mme_grp
-                info["mme_code"] = mme_cd
-                info["sources"].add(packet_info)
-
-            # old-style tuples with 9 items
-            elif isinstance(item, tuple) and len(item) == 9:
-                (filt, ident, ts, mcc, mnc, tac, cid, packet_info, disp_type) = item
-
-                if "Paging" not in packet_info:
-                    ue_ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    ue_data = {
-                        "timestamp": ue_ts,
-                        "id_type": disp_type,
-                        "id": ident,
-                        "packet_info": packet_info,
-                        "tac": tac,
-                        "cid": cid,
-                        "mcc": mcc,
-                        "mnc": mnc,
-                        "mme_group_id": "",
-                        "mme_code": ""
-                    }
-                    if ue_data != self._last_ue_event:
-                        self.disp.update_ue_info(ue_data)
-                        self._last_ue_event = ue_data.copy()
-
-                info = self.disp.ids_dict[(filt, ident)]
-                if not info["first_seen"]:
-                    info["first_seen"] = ts
-                info["last_seen"] = ts
-                info["count"] += 1
-                info["display_type"] = disp_type
-                if mcc: info["mcc"] = mcc
-                if mnc: info["mnc"] = mnc
-                if tac: info["tracking_area_code"] = tac
-                if cid: info["cell_identity"] = cid
-                info["sources"].add(packet_info)
-
-        if not self.disp.selection_mode:
-            self.disp._refresh_display()
+        """
+        Drain the capture queue, ingest and redraw the visible tab if it
+        changed, then schedule the next update (see RefreshScheduler).
+        """
+        events = []
+        t0 = time.perf_counter()
+        drained = capture_queue.drain()
+        t1 = time.perf_counter()
+        DRAIN_SECONDS.observe(t1 - t0)
+        # one hand-off for everything queued since the last tick
+        for item in drained:
+            if item[0] == "snapshot":
+                # attached to a daemon: start over from its state
+                self.disp.model.load_snapshot(item[1])
+                self.disp.refresh.mark("ue")
+                self.disp.data_changed()
+                self.reorder.clear()
+                events = []
+                continue
+            if item[0] == "status":
+                self.disp.set_engine_status(item[1])
+                continue
+            events.append(item)
+        self.reorder.push(events)
+        self._ingest(self.reorder.pop_ready())
+        Clock.schedule_once(self.update_gui,
+                            self.disp.refresh.next_interval(len(drained), time.perf_counter() - t0))
+
+    def release_reorder(self, dt):
+        self._ingest(self.reorder.pop_ready())
+
+    def _ingest(self, ready):
+        """
+        Ingest the events released by the reorder buffer and redraw the
+        visible tab if it changed.
+        """
+        t1 = time.perf_counter()
+        ue_rows = self.disp.model.ingest_many(ready)
+        t2 = time.perf_counter()
+        INGEST_SECONDS.observe(t2 - t1)
+        if ready:
+            self.disp.data_changed()
+        if ue_rows:
+            self.disp.update_ue_info(ue_rows)
+        if self.disp.redraw():
+            REFRESH_SECONDS.observe(time.perf_counter() - t2)
+        wait = self.reorder.release_in()
+        if wait is not None:
+            if self._release is not None:
+                self._release.cancel()
+            self._release = Clock.schedule_once(self.release_reorder, wait)
 
     def _on_keyboard(self, window, key, scancode, codepoint, modifiers):
         if key == 27:
@@ -0,0 +1,175 @@
+"""
+Compact storage for the identifier table.
+
+One IdentifierRecord (__slots__, no per-record dict) per (filter_type,
+identifier). Timestamps are the capture epoch seconds the events carry, so
+sorting, lifespans and the tests never parse strings. The few distinct TAC/CID/MCC/MNC/type values are
+interned, and the message types an ID was seen in are a bitmask over a global
+source registry instead of a set per record.
+"""
+import sys
+from datetime import datetime
+from functools import lru_cache
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# packet_info string <-> bit, shared by all stores in the process
+_source_bits = {}
+_source_names = []
+
+def source_bit(name):
+    bit = _source_bits.get(name)
+    if bit is None:
+        bit = 1 << len(_source_names)
+        _source_bits[name] = bit
+        _source_names.append(sys.intern(name))
+    return bit
+
+def known_sources():
+    """
+    All message types registered so far; bit i stands for known_sources()[i].
+    """
+    return _source_names
+
+def source_names(bits):
+    names = []
+    i = 0
+    while bits:
+        if bits & 1:
+            names.append(_source_names[i])
+        bits >>= 1
+        i += 1
+    return names
+
+def format_ts(epoch):
+    """
+    Epoch seconds -> "%Y-%m-%d %H:%M:%S" local time, for display and export
+    only.
+    """
+    if epoch is None or epoch == "":
+        return ""
+    return _format_second(int(epoch))
+
+@lru_cache(maxsize=4096)
+def _format_second(second):
+    return datetime.fromtimestamp(second).strftime(TS_FORMAT)
+
+def intern_value(val):
+    return sys.intern(val) if isinstance(val, str) else val
+
+class IdentifierRecord:
+    __slots__ = (
+        "count", "first_seen", "last_seen", "tracking_area_code", "cell_identity",
+        "mcc", "mnc", "display_type", "mme_group_id", "mme_code", "source_bits",
+        "capture_source"
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.first_seen = None   # epoch seconds
+        self.last_seen = None    # epoch seconds
+        self.tracking_area_code = None
+        self.cell_identity = None
+        self.mcc = None
+        self.mnc = None
+        self.display_type = ""
+        self.mme_group_id = ""
+        self.mme_code = ""
+        self.source_bits = 0
+        # capture source (modem) that last reported the ID, "" = default
+        self.capture_source = ""
+
+    @property
+    def sources(self):
+        return set(source_names(self.source_bits))
+
+    def has_source(self, name):
+        bit = _source_bits.get(name)
+        return bit is not None and self.source_bits & bit != 0
+
+    def add_source(self, name):
+        self.source_bits |= source_bit(name)
+
+    @property
+    def lifespan(self):
+        if self.first_seen is None or self.last_seen is None:
+            return 0
+        return max(self.last_seen - self.first_seen, 0)
+
+    def to_list(self):
+        return [
+            self.count, self.first_seen, self.last_seen, self.tracking_area_code,
+            self.cell_identity, self.mcc, self.mnc, self.display_type,
+            self.mme_group_id, self.mme_code, sorted(self.sources), self.capture_source
+        ]
+
+    @classmethod
+    def from_list(cls, vals):
+        rec = cls()
+        (rec.count, rec.first_seen, rec.last_seen, tac, cid, mcc, mnc,
+         disp_type, mme_grp, mme_cd, sources, *capture_source) = vals
+        if capture_source:
+            rec.capture_source = intern_value(capture_source[0])
+        rec.tracking_area_code = intern_value(tac)
+        rec.cell_identity = intern_value(cid)
+        rec.mcc = intern_value(mcc)
+        rec.mnc = intern_value(mnc)
+        rec.display_type = intern_value(disp_type)
+        rec.mme_group_id = intern_value(mme_grp)
+        rec.mme_code = intern_value(mme_cd)
+        for name in sources:
+            rec.add_source(name)
+        return rec
+
+class IdentifierStore:
+    """
+    Mapping (filter_type, identifier) -> IdentifierRecord. Lookups behave
+    like a dict; record() creates missing entries.
+    """
+    def __init__(self):
+        self._records = {}
+        # filter_type -> keys of that type, in insertion order
+        self._by_type = {}
+
+    def record(self, key):
+        rec = self._records.get(key)
+        if rec is None:
+            rec = self[key] = IdentifierRecord()
+        return rec
+
+    def __getitem__(self, key):
+        return self._records[key]
+
+    def __setitem__(self, key, rec):
+        key = (sys.intern(key[0]), key[1])
+        if key not in self._records:
+            self._by_type.setdefault(key[0], {})[key] = None
+        self._records[key] = rec
+
+    def keys_of_type(self, filt):
+        return self._by_type.get(filt, {}).keys()
+
+    def get(self, key, default=None):
+        return self._records.get(key, default)
+
+    def __contains__(self, key):
+        return key in self._records
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __bool__(self):
+        return bool(self._records)
+
+    def items(self):
+        return self._records.items()
+
+    def values(self):
+        return self._records.values()
+
+    def clear(self):
+        self._records.clear()
+        self._by_type.clear()
@@ -0,0 +1,144 @@
+"""
+Logging for the capture pipeline, the GUI and the tools.
+
+Records are handed to a bounded ring (the oldest record is dropped when it is
+full) and written by a background QueueListener thread, so the capture reader
+never blocks on terminal or disk I/O. A per-logger rate limit (token bucket)
+keeps one chatty stream from flooding the ring. The raw engine-line trace
+("capture.raw") is off unless a trace file is given, and is then written
+gzip-compressed by its own listener.
+"""
+import atexit
+import gzip
+import logging
+import logging.handlers
+import queue
+import time
+
+import metrics
+
+LOG_FORMAT = "[%(asctime)s] [%(levelname)s] %(name)s: %(message)s"
+RAW_LOGGER = "capture.raw"
+
+class DroppingQueue(queue.Queue):
+    """
+    Bounded ring of log records: when full, the oldest record is dropped and
+    counted instead of blocking the producer.
+    """
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self.dropped = 0
+
+    def put_nowait(self, item):
+        while True:
+            try:
+                return super().put_nowait(item)
+            except queue.Full:
+                try:
+                    self.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per logger name: `rate` records per second with bursts of up
+    to `burst`. The next record let through reports how many were suppressed.
+    """
+    def __init__(self, rate=50.0, burst=200):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+
+    def filter(self, record):
+        now = time.monotonic()
+        tokens, last, suppressed = self._buckets.get(record.name, (self.burst, now, 0))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1 and record.levelno < logging.WARNING:
+            self._buckets[record.name] = (tokens, now, suppressed + 1)
+            return False
+        if suppressed:
+            record.msg = f"{record.msg} [{suppressed} suppressed]"
+        self._buckets[record.name] = (max(tokens - 1, 0), now, 0)
+        return True
+
+class GzipFileHandler(logging.FileHandler):
+    """
+    FileHandler writing a gzip-compressed text file. close() ends the gzip
+    member, so the file reads back without an EOFError.
+    """
+    def _open(self):
+        return gzip.open(self.baseFilename, self.mode + "t", encoding=self.encoding)
+
+_listeners = []
+
+def _start_listener(logger, handlers, ring, log_filter=None):
+    q = DroppingQueue(ring)
+    qh = logging.handlers.QueueHandler(q)
+    if log_filter is not None:
+        qh.addFilter(log_filter)
+    logger.addHandler(qh)
+    listener = logging.handlers.QueueListener(q, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append((listener, q, handlers))
+    return q
+
+def setup_logging(level="INFO", log_file=None, raw_trace=None, rate=50.0, burst=200, ring=10000):
+    """
+    Configure logging once per process. `raw_trace` is a path for the gzip
+    compressed trace of every engine line, or None to disable it.
+    """
+    shutdown_logging()
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    fmt = logging.Formatter(LOG_FORMAT, "%Y-%m-%d %H:%M:%S")
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    for h in handlers:
+        h.setFormatter(fmt)
+    _start_listener(root, handlers, ring, RateLimitFilter(rate, burst))
+
+    raw = logging.getLogger(RAW_LOGGER)
+    for h in list(raw.handlers):
+        raw.removeHandler(h)
+    raw.propagate = False
+    if raw_trace:
+        raw.setLevel(logging.DEBUG)
+        trace = GzipFileHandler(raw_trace, "a")
+        trace.setFormatter(logging.Formatter("%(created).6f %(message)s"))
+        _start_listener(raw, [trace], ring * 10)
+    else:
+        # disabled: capture pays one cached level check per line
+        raw.setLevel(logging.CRITICAL + 1)
+
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+def add_logging_args(parser, default_level="INFO"):
+    parser.add_argument("--log-level", choices=LEVELS, default=default_level,
+                        help=f"DEBUG includes the per-line reader output (default: {default_level})")
+    parser.add_argument("--log-file", help="also write the log to this file")
+    parser.add_argument("--raw-trace", metavar="FILE.gz",
+                        help="write every engine line gzip-compressed to this file")
+
+def setup_from_args(args):
+    setup_logging(args.log_level, args.log_file, args.raw_trace)
+
+def dropped_records():
+    return sum(q.dropped for _, q, _ in _listeners)
+
+metrics.Gauge("log_records_dropped_total", "Log records dropped by a full log buffer",
+              dropped_records, kind="counter")
+
+def shutdown_logging():
+    while _listeners:
+        listener, _, handlers = _listeners.pop()
+        listener.stop()
+        for h in handlers:
+            h.close()
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,308 @@
+"""
+Pipeline metrics.
+
+Counters, gauges and histograms cheap enough to stay on in the field: an
+observation is a bisect over fixed buckets and two additions, no locks (each
+series has a single writer thread). Gauges are callbacks evaluated when the
+metrics are read. Everything is exposed in the Prometheus text format on an
+optional local HTTP endpoint (--metrics-port) and read by the GUI Stats tab.
+"""
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# seconds, from 10 us to 1 s
+DEFAULT_BUCKETS = (
+    1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0
+)
+
+REGISTRY = []
+
+class _CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+class Counter:
+    """
+    Monotonic count, optionally split by one label.
+    """
+    kind = "counter"
+
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._children = {}
+        self._default = self.labels(None) if label is None else None
+        REGISTRY.append(self)
+
+    def labels(self, value):
+        child = self._children.get(value)
+        if child is None:
+            child = self._children[value] = _CounterValue()
+        return child
+
+    def inc(self, n=1):
+        self._default.value += n
+
+    def values(self):
+        return {k: c.value for k, c in self._children.items()}
+
+class Gauge:
+    """
+    Current value, read from `fn` when the metrics are collected. `fn`
+    returns a number, or {label value: number} for a labelled gauge. Counts
+    kept elsewhere (e.g. queue drops) are exposed with kind="counter".
+    """
+    def __init__(self, name, help, fn, label=None, kind="gauge"):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.label = label
+        self.fn = fn
+        REGISTRY.append(self)
+
+    def values(self):
+        val = self.fn()
+        if val is None:
+            return {}
+        return val if self.label is not None else {None: val}
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-quantile (inf if beyond the
+        last bucket, 0 without observations).
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else float("inf")
+        return float("inf")
+
+class Histogram:
+    """
+    Distribution of durations (seconds), optionally split by one label.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, help, label=None, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._children = {}
+        self._default = self.labels(None) if label is None else None
+        REGISTRY.append(self)
+
+    def labels(self, value):
+        child = self._children.get(value)
+        if child is None:
+            child = self._children[value] = _HistogramValue(self.buckets)
+        return child
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def values(self):
+        return dict(self._children)
+
+# ---------------- Processes ----------------
+_CLK_TCK = os.sysconf("SC_CLK_TCK")
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+# process label -> callable returning its pid (None if not running)
+_processes = {"app": os.getpid}
+
+def watch_process(name, pid_fn):
+    _processes[name] = pid_fn
+
+def process_stats(pid):
+    """
+    (cpu seconds, resident bytes) of `pid` from /proc, or None.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except (OSError, IndexError):
+        return None
+    # fields[0] is the state, field 3 of /proc/pid/stat
+    utime, stime, rss = int(fields[11]), int(fields[12]), int(fields[21])
+    return (utime + stime) / _CLK_TCK, rss * _PAGE_SIZE
+
+def _watched_stats():
+    stats = {}
+    for name, pid_fn in _processes.items():
+        pid = pid_fn()
+        st = process_stats(pid) if pid else None
+        if st is not None:
+            stats[name] = st
+    return stats
+
+Gauge("process_cpu_seconds_total", "CPU time (user+system) of the process",
+      lambda: {k: v[0] for k, v in _watched_stats().items()}, label="process", kind="counter")
+Gauge("process_resident_memory_bytes", "Resident memory of the process",
+      lambda: {k: v[1] for k, v in _watched_stats().items()}, label="process")
+
+def interface_stat(interface, name):
+    """
+    A /sys/class/net/<interface>/statistics counter, or None.
+    """
+    try:
+        with open(f"/sys/class/net/{interface}/statistics/{name}") as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+# ---------------- Capture sources ----------------
+# source name -> [(name, help, kind, label, values)], the last snapshot() a
+# source process (see sources.py) sent
+_sources = {}
+
+def snapshot():
+    """
+    The metrics of this process in a picklable form, for sending to the main
+    process: [(name, help, kind, label, {label value: value})].
+    """
+    return [(m.name, m.help, m.kind, m.label, m.values()) for m in REGISTRY]
+
+def update_source(source, snap):
+    _sources[source] = snap
+
+def drop_source(source):
+    _sources.pop(source, None)
+
+def _families():
+    """
+    name -> [help, kind, label, [(source, values)]]; source None is this
+    process.
+    """
+    families = {}
+    for m in REGISTRY:
+        families[m.name] = [m.help, m.kind, m.label, [(None, m.values())]]
+    for source, snap in list(_sources.items()):
+        for name, help, kind, label, values in snap:
+            fam = families.setdefault(name, [help, kind, label, []])
+            fam[3].append((source, values))
+    return families
+
+# ---------------- Exposition ----------------
+def _series(name, label, value, extra=""):
+    labels = []
+    if label is not None and value is not None:
+        labels.append(f'{label[0]}="{label[1]}"')
+    if extra:
+        labels.append(extra)
+    return name + ("{" + ",".join(labels) + "}" if labels else "")
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format. Metrics of source
+    processes carry a source="NAME" label.
+    """
+    out = []
+    for name, (help, kind, label, parts) in _families().items():
+        out.append(f"# HELP {name} {help}")
+        out.append(f"# TYPE {name} {kind}")
+        for source, values in parts:
+            src = f'source="{source}"' if source is not None else ""
+            for key, val in values.items():
+                lab = (label, key)
+                if kind != "histogram":
+                    out.append(f"{_series(name, lab, key, src)} {val}")
+                    continue
+                cum = 0
+                for bound, n in zip(val.bounds + (float("inf"),), val.counts):
+                    cum += n
+                    le = 'le="%s"' % ("+Inf" if bound == float("inf") else repr(bound))
+                    le = f"{src},{le}" if src else le
+                    out.append(f"{_series(name + '_bucket', lab, key, le)} {cum}")
+                out.append(f"{_series(name + '_sum', lab, key, src)} {val.sum}")
+                out.append(f"{_series(name + '_count', lab, key, src)} {val.count}")
+    return "\n".join(out) + "\n"
+
+def _combine(kind, a, b):
+    if kind == "histogram":
+        total = _HistogramValue(a.bounds)
+        total.counts = [x + y for x, y in zip(a.counts, b.counts)]
+        total.sum = a.sum + b.sum
+        total.count = a.count + b.count
+        return total
+    # counts add up; of gauges (depths, ages) the worst source is shown
+    return a + b if kind == "counter" else max(a, b)
+
+def collect():
+    """
+    {metric name: {label value: value}}; histogram values are the live
+    bucket objects (count, sum, quantile()). The unlabelled values of source
+    processes are combined with this process's (counters and histograms
+    summed, gauges the largest); labelled ones get "VALUE@SOURCE" labels.
+    """
+    out = {}
+    for name, (_, kind, label, parts) in _families().items():
+        merged = out[name] = {}
+        for source, values in parts:
+            for key, val in values.items():
+                if source is not None and key is not None:
+                    key = f"{key}@{source}"
+                if val is None:
+                    continue
+                merged[key] = _combine(kind, merged[key], val) if key in merged else val
+    return out
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve_metrics(port, host="127.0.0.1"):
+    """
+    Serve /metrics on a daemon thread. Returns the server.
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def add_metrics_args(parser):
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+
+def start_from_args(args):
+    if args.metrics_port:
+        return serve_metrics(args.metrics_port)
+    return None
@@ -0,0 +1,279 @@
+import csv
+import os
+import threading
+
+from id_store import IdentifierStore, IdentifierRecord, format_ts, intern_value
+from privacy_tests import PrivacyTests
+from rates import RateAggregator
+from sort_index import SortIndexes
+from tmsi_linker import TmsiLinker, CHAIN_COLUMNS, chain_row
+
+# Columns of the UE-connected log, as shown in the GUI and written on export.
+# The row dict key of a column is col.lower().replace(" ", "_").
+UE_COLUMNS = [
+    "Timestamp", "ID Type", "ID", "Packet Info", "TAC",
+    "CID", "MCC", "MNC", "MME Group ID", "MME Code", "Source"
+]
+
+IDENTIFIER_CSV_HEADER = [
+    "Filter Type", "Identifier", "Count", "First Seen", "Last Seen",
+    "TAC", "CID", "MCC", "MNC", "MME Group ID", "MME Code", "Message Types", "Source"
+]
+
+# UE-connected rows kept in memory by default; older rows are spilled to disk
+# (if a spill file is set) and dropped
+UE_WINDOW = 50000
+
+def identifier_row(key, rec):
+    """
+    (filter type, identifier, count, first seen, last seen, TAC, CID, MCC,
+    MNC, MME group, MME code, source bitmask, capture source) of a record.
+    """
+    return (key[0], key[1], rec.count, rec.first_seen, rec.last_seen, rec.tracking_area_code,
+            rec.cell_identity, rec.mcc, rec.mnc, rec.mme_group_id, rec.mme_code, rec.source_bits,
+            rec.capture_source)
+
+class FrozenView:
+    """
+    The identifiers and chains of a model as they were at freeze(), for a
+    worker thread while the model keeps changing. freeze() only takes
+    references. Before the model changes a record or chain of an open view
+    for the first time it saves its old row in the view (copy on write), so
+    the rows the worker builds are consistent without the GUI thread
+    copying every record.
+    """
+    def __init__(self, ids, chains):
+        self.ids = ids            # [(key, record)]
+        self.chains = chains      # [Chain]
+        self.saved_ids = {}       # key -> identifier_row() before the first change
+        self.saved_chains = {}    # chain id -> chain_row() before the first change
+
+    def save_id(self, key, rec):
+        if key not in self.saved_ids:
+            self.saved_ids[key] = identifier_row(key, rec)
+
+    def save_chain(self, chain):
+        if chain.id not in self.saved_chains:
+            self.saved_chains[chain.id] = chain_row(chain)
+
+    # a row is built first and the saved copy looked up after: a change
+    # starts with saving, so without a saved copy the row was read unchanged
+    def identifier_rows(self):
+        saved = self.saved_ids
+        for key, rec in self.ids:
+            row = identifier_row(key, rec)
+            yield saved.get(key, row)
+
+    def chain_rows(self):
+        saved = self.saved_chains
+        for chain in self.chains:
+            row = chain_row(chain)
+            yield saved.get(chain.id, row)
+
+class IdentifierModel:
+    """
+    Aggregated state built from capture events: the identifier table behind
+    the Details tab and the UE-connected log. Used by the GUI and by the
+    headless tools, so it must not depend on Kivy.
+
+    ue_events only holds the newest `ue_window` rows (None = unbounded).
+    Older rows are appended to the CSV file `ue_spill` if given, and
+    ue_spilled counts the rows moved out of memory.
+
+    With a SessionStore as `store`, every batch given to ingest_many() is
+    also queued for the session database.
+    """
+    def __init__(self, ue_window=UE_WINDOW, ue_spill=None, store=None):
+        # store keyed by (filter_type, identifier)
+        self.ids_dict = IdentifierStore()
+        # ordered views of ids_dict for the Details tab, see sort_index.py
+        self.views = SortIndexes(self.ids_dict)
+        # UE chains across TMSI reallocations, see tmsi_linker.py
+        self.linker = TmsiLinker()
+        self.tests = PrivacyTests(self.linker)
+        # message rates per cell over time, see rates.py
+        self.rates = RateAggregator()
+        self.ue_events = []
+        self.ue_window = ue_window
+        self.ue_spill = ue_spill
+        self.ue_spilled = 0
+        self.store = store
+        # names of the capture sources seen so far (multi-source runs)
+        self.capture_sources = set()
+        # remember last UE event to skip identical repeats
+        self._last_ue_key = None
+        # open FrozenViews (exports running), see freeze()
+        self._frozen = ()
+        self._frozen_lock = threading.Lock()
+
+    def ingest(self, item):
+        """
+        Apply one capture event. Returns the UE-connected row it added, or
+        None. Items that are not identifier tuples are ignored. An event the
+        capture Coalescer merged carries its number of repeats as a seventh
+        element.
+        """
+        if not isinstance(item, tuple) or len(item) not in (6, 7):
+            return None
+        filt, ident, ts, cell, packet_info, disp_type = item[:6]
+        repeats = item[6] if len(item) == 7 else 1
+        # one consistent cell context snapshot, see cell_context.py
+        _, mcc, mnc, tac, cid, mme_grp, mme_cd, source = cell
+
+        ue_row = None
+        # non-paging => candidate for UE-connected
+        if "Paging" not in packet_info:
+            # skip if identical to last within the same second
+            ue_key = (int(ts), disp_type, ident, packet_info, mcc, mnc, tac, cid, mme_grp, mme_cd, source)
+            if ue_key != self._last_ue_key:
+                ue_data = {
+                    "timestamp": ts,   # capture epoch, formatted on display/export
+                    "id_type": disp_type,
+                    "id": ident,
+                    "packet_info": packet_info,
+                    "tac": tac,
+                    "cid": cid,
+                    "mcc": mcc,
+                    "mnc": mnc,
+                    "mme_group_id": mme_grp,
+                    "mme_code": mme_cd,
+                    "source": source
+                }
+                self.ue_events.append(ue_data)
+                self._last_ue_key = ue_key
+                ue_row = ue_data
+                # trim in chunks of 10% so the list isn't shifted for every row
+                if self.ue_window and len(self.ue_events) > self.ue_window * 1.1:
+                    self._trim_ue_events()
+
+        key = (filt, ident)
+        info = self.ids_dict.record(key)
+        if self._frozen and info.count:
+            for view in self._frozen:
+                view.save_id(key, info)
+        if info.first_seen is None:
+            info.first_seen = ts
+        info.last_seen = ts
+        info.count += repeats
+        info.display_type = intern_value(disp_type)
+        if mcc: info.mcc = intern_value(mcc)
+        if mnc: info.mnc = intern_value(mnc)
+        if tac: info.tracking_area_code = intern_value(tac)
+        if cid: info.cell_identity = intern_value(cid)
+        info.mme_group_id = intern_value(mme_grp)
+        info.mme_code = intern_value(mme_cd)
+        info.add_source(packet_info)
+        if source:
+            info.capture_source = source
+            self.capture_sources.add(source)
+        self.tests.observe(key, info)
+        self.views.touch(key)
+        self.linker.observe(ident, ts, cell, packet_info, disp_type)
+        self.rates.add(ts, cell, filt, packet_info, repeats)
+        return ue_row
+
+    def ingest_many(self, items):
+        """
+        Apply a batch of capture events. Returns the UE-connected rows added.
+        """
+        ue_rows = []
+        for item in items:
+            ue_data = self.ingest(item)
+            if ue_data is not None:
+                ue_rows.append(ue_data)
+        self.rates.flush()
+        if self.store is not None and items:
+            self.store.put_many(items)
+        return ue_rows
+
+    def _trim_ue_events(self):
+        n = len(self.ue_events) - self.ue_window
+        if self.ue_spill:
+            append_ue_events_csv(self.ue_events[:n], self.ue_spill)
+        del self.ue_events[:n]
+        self.ue_spilled += n
+
+    def snapshot(self):
+        """
+        JSON-serializable copy of the state, see load_snapshot().
+        """
+        ids = [[filt, ident] + info.to_list() for (filt, ident), info in self.ids_dict.items()]
+        return {"ids": ids, "ue_events": list(self.ue_events), "chains": self.linker.snapshot()}
+
+    def freeze(self):
+        """
+        A FrozenView of the identifiers and chains for a worker thread;
+        thaw() it when done.
+        """
+        view = FrozenView(list(self.ids_dict.items()), list(self.linker.linked.values()))
+        with self._frozen_lock:
+            self._frozen += (view,)
+            self.linker.frozen = self._frozen
+        return view
+
+    def thaw(self, view):
+        with self._frozen_lock:
+            self._frozen = tuple(v for v in self._frozen if v is not view)
+            self.linker.frozen = self._frozen
+
+    def load_snapshot(self, snap):
+        """
+        Replace the state with a snapshot() taken elsewhere, e.g. by the daemon.
+        """
+        self.ids_dict.clear()
+        for row in snap["ids"]:
+            self.ids_dict[(row[0], row[1])] = IdentifierRecord.from_list(row[2:])
+        self.tests.reset(self.ids_dict)
+        self.views.reset()
+        self.ue_events[:] = snap["ue_events"]
+        self.linker.load_snapshot(snap.get("chains", []))
+        # rates are not part of the snapshot, they start over from here
+        self.rates = RateAggregator()
+        self.capture_sources = {rec.capture_source for rec in self.ids_dict.values()} - {""}
+        self._last_ue_key = None
+
+def write_identifiers_csv(ids_dict, fname):
+    with open(fname, "w", newline="") as csvf:
+        w = csv.writer(csvf)
+        w.writerow(IDENTIFIER_CSV_HEADER)
+        for (filt, ident), info in ids_dict.items():
+            srcs = ",".join(sorted(info.sources))
+            w.writerow([
+                filt,
+                ident,
+                info.count,
+                format_ts(info.first_seen),
+                format_ts(info.last_seen),
+                info.tracking_area_code,
+                info.cell_identity,
+                info.mcc,
+                info.mnc,
+                info.mme_group_id,
+                info.mme_code,
+                srcs,
+                info.capture_source
+            ])
+
+def write_chains_csv(linker, fname):
+    with open(fname, "w", newline="") as csvf:
+        w = csv.writer(csvf)
+        w.writerow(CHAIN_COLUMNS)
+        for chain in linker.linked.values():
+            row = list(chain_row(chain))
+            row[-1] = format_ts(row[-1])
+            w.writerow(row)
+
+def write_ue_events_csv(ue_events, fname, mode="w"):
+    keys = [col.lower().replace(" ", "_") for col in UE_COLUMNS]
+    new_file = mode == "w" or not os.path.exists(fname) or os.path.getsize(fname) == 0
+    with open(fname, mode, newline="") as csvf:
+        w = csv.writer(csvf)
+        if new_file:
+            w.writerow(UE_COLUMNS)
+        for ev in ue_events:
+            row = [ev.get(k, "") for k in keys]
+            row[0] = format_ts(row[0])
+            w.writerow(row)
+
+def append_ue_events_csv(ue_events, fname):
+    write_ue_events_csv(ue_events, fname, mode="a")
@@ -0,0 +1,212 @@
+from id_store import known_sources
+
+# 7 tests + 1 placeholder
+TEST_DEFS = [
+    {
+        "name": "ID frequently updated",
+        "description": "Fail if any m-TMSI lifespan>2h."
+    },
+    {
+        "name": "No IMSI sent in Paging",
+        "description": "Fail if IMSI found in paging."
+    },
+    {
+        "name": "No IMSI in Attach/Reg",
+        "description": "Fail if IMSI used in attach/reg or identity resp."
+    },
+    {
+        "name": "Only SUCI/GUTI sent",
+        "description": "Fail if non-SUCI/GUTI in paging."
+    },
+    {
+        "name": "No IMEISV seen",
+        "description": "Fail if any IMEISV is found at all."
+    },
+    {
+        "name": "No IMSI in Identity Response",
+        "description": "Fail if IMSI is found in Identity Response message."
+    },
+    {
+        "name": "TMSI reallocated in time",
+        "description": "Fail if a UE chain kept a TMSI >2h before reallocation."
+    }
+] + [
+    {"name": f"Test {i + 1}", "description": "Not implemented."} for i in range(7, 8)
+]
+
+def new_tests():
+    return [dict(tdef, result="Pending", info="") for tdef in TEST_DEFS]
+
+# identifier types that may be sent in paging (test 4)
+PAGING_OK_TYPES = ("m-TMSI", "5G-TMSI", "SUCI", "GUTI")
+
+def _is_attach_source(name):
+    s_low = name.lower()
+    return ("attach" in s_low) or ("registration" in s_low) or ("identity response" in s_low)
+
+def _is_identity_response(name):
+    return "identity response" in name.lower()
+
+class PrivacyTests:
+    """
+    Incremental privacy test state. observe() is called for every ingested
+    event with the record it updated and only re-checks that one record, so
+    the cost per event and per fill() doesn't grow with the number of IDs.
+    The failing sets are dicts (key -> shown text) to keep the order in which
+    the IDs started failing. Test 7 reads the TMSI linker of the model, which
+    follows the events itself.
+    """
+    def __init__(self, linker=None):
+        self.linker = linker
+        self.m_tmsi = set()           # keys with display type m-TMSI
+        self.long_lived_mt = {}       #1 m-TMSI lifespan > 2h
+        self.paging_imsi = {}         #2 IMSI seen in paging
+        self.attach_imsi = {}         #3 IMSI in attach/registration/identity response
+        self.paging_non_target = {}   #4 non SUCI/GUTI type in paging
+        self.imeisv = {}              #5 any IMEISV
+        self.identity_imsi = {}       #6 IMSI in identity response
+        self.seen_any = False
+        # source bitmasks for tests 3 and 6, extended as new message types show up
+        self._known_sources = 0
+        self._attach_bits = 0
+        self._identity_bits = 0
+
+    def _update_source_masks(self):
+        names = known_sources()
+        for i in range(self._known_sources, len(names)):
+            if _is_attach_source(names[i]):
+                self._attach_bits |= 1 << i
+            if _is_identity_response(names[i]):
+                self._identity_bits |= 1 << i
+        self._known_sources = len(names)
+
+    @staticmethod
+    def _mark(failing, key, fails, text):
+        if fails:
+            if key not in failing:
+                failing[key] = text
+        elif key in failing:
+            del failing[key]
+
+    def observe(self, key, info):
+        if len(known_sources()) != self._known_sources:
+            self._update_source_masks()
+        self.seen_any = True
+        ident = key[1]
+        dt = info.display_type
+        is_imsi = dt == "IMSI"
+        in_paging = info.has_source("Paging")
+
+        if dt == "m-TMSI":
+            self.m_tmsi.add(key)
+        else:
+            self.m_tmsi.discard(key)
+        self._mark(self.long_lived_mt, key, dt == "m-TMSI" and info.lifespan > 7200, ident)
+        self._mark(self.paging_imsi, key, is_imsi and in_paging, ident)
+        self._mark(self.attach_imsi, key, is_imsi and info.source_bits & self._attach_bits, ident)
+        self._mark(self.paging_non_target, key, in_paging and dt not in PAGING_OK_TYPES, f"{dt}:{ident}")
+        self._mark(self.imeisv, key, dt == "IMEISV", ident)
+        self._mark(self.identity_imsi, key, is_imsi and info.source_bits & self._identity_bits, ident)
+
+    def reset(self, ids_dict):
+        """
+        Rebuild the state from a whole identifier table, e.g. after loading a
+        snapshot.
+        """
+        self.__init__(self.linker)
+        for key, info in ids_dict.items():
+            self.observe(key, info)
+
+    def fill(self, tests=None):
+        """
+        Fill in "result" and "info" of `tests` (a list from new_tests()) from
+        the current state and return it.
+        """
+        if tests is None:
+            tests = new_tests()
+
+        #1 => ID frequently updated => fail if m-TMSI>2h
+        failing_mt = list(self.long_lived_mt.values())
+        if failing_mt:
+            tests[0]["result"] = "Fail"
+            show3 = failing_mt[:3]
+            tests[0]["info"] = "Failing m-TMSI:\n" + "\n".join(show3) + f"\nTotal= {len(failing_mt)}"
+        elif self.m_tmsi:
+            tests[0]["result"] = "Pass"
+            tests[0]["info"] = "No m-TMSI>2h"
+        else:
+            tests[0]["result"] = "Pending"
+            tests[0]["info"] = "No m-TMSI data yet"
+
+        #2 => no IMSI in paging
+        if self.paging_imsi:
+            tests[1]["result"] = "Fail"
+            tests[1]["info"] = "IMSI in Paging:\n" + "\n".join(self.paging_imsi.values())
+        else:
+            tests[1]["result"] = "Pass"
+            tests[1]["info"] = "No IMSI found in Paging."
+
+        #3 => no IMSI in attach/reg
+        if self.attach_imsi:
+            tests[2]["result"] = "Fail"
+            tests[2]["info"] = "IMSI used:\n" + "\n".join(self.attach_imsi.values())
+        else:
+            tests[2]["result"] = "Pass"
+            tests[2]["info"] = "No IMSI found in Attach/Reg"
+
+        #4 => only SUCI/GUTI => fail if we see other ID in paging
+        if self.seen_any:
+            if self.paging_non_target:
+                tests[3]["result"] = "Fail"
+                tests[3]["info"] = "Non-SUCI/GUTI in paging:\n" + "\n".join(self.paging_non_target.values())
+            else:
+                tests[3]["result"] = "Pass"
+                tests[3]["info"] = "All SUCI/GUTI in paging"
+        else:
+            tests[3]["result"] = "Pending"
+            tests[3]["info"] = "No paging events."
+
+        #5 => no IMEISV => fail if any IMEISV found
+        if self.imeisv:
+            tests[4]["result"] = "Fail"
+            tests[4]["info"] = "IMEISV found:\n" + "\n".join(self.imeisv.values())
+        else:
+            tests[4]["result"] = "Pass"
+            tests[4]["info"] = "No IMEISV found."
+
+        #6 => No IMSI in Identity Response => fail if IMSI + "Identity Response"
+        if self.identity_imsi:
+            tests[5]["result"] = "Fail"
+            tests[5]["info"] = "IMSI in Identity Response:\n" + "\n".join(self.identity_imsi.values())
+        else:
+            tests[5]["result"] = "Pass"
+            tests[5]["info"] = "No IMSI in Identity Response."
+
+        #7 => TMSI reallocation intervals of the UE chains
+        linker = self.linker
+        if linker is None or not linker.intervals_seen:
+            tests[6]["result"] = "Pending"
+            tests[6]["info"] = "No TMSI reallocation linked yet"
+        elif linker.slow_chains:
+            # the text of chains evicted from the linker is gone, not their count
+            slow = list(linker.slow_reallocs.values())
+            tests[6]["result"] = "Fail"
+            tests[6]["info"] = "TMSI kept >2h:\n" + "\n".join(slow[:3]) + f"\nTotal= {linker.slow_chains}"
+        else:
+            tests[6]["result"] = "Pass"
+            tests[6]["info"] = f"{linker.intervals_seen} reallocation(s), all within 2h"
+
+        #8 => pending
+        for i in range(7, 8):
+            tests[i]["result"] = "Pending"
+            tests[i]["info"] = ""
+
+        return tests
+
+def evaluate_tests(ids_dict, tests=None):
+    """
+    One-shot evaluation over a whole identifier table.
+    """
+    state = PrivacyTests()
+    state.reset(ids_dict)
+    return state.fill(tests)
@@ -0,0 +1,170 @@
+"""
+Message rates over time, per cell, in fixed memory.
+
+Every identifier event is counted under its cell (source, TAC, CID) and
+message kind (paging, RRC setup, NAS) and under the "all cells" total of
+that kind. Each series keeps one ring buffer per resolution:
+
+    1s   last 5 minutes
+    1m   last 2 hours
+    1h   last 2 days
+
+Events are first counted per (series, second) in a small pending dict; a
+flush (after every ingest batch, or when the dict fills) rolls each count
+up into the three rings, so a paging storm costs one dict increment per
+event. Series of cells not seen for a while are evicted once MAX_SERIES is
+reached, so memory stays the same however long the session runs.
+"""
+from array import array
+from collections import OrderedDict
+
+# (name, seconds per slot, slots)
+RESOLUTIONS = (("1s", 1, 300), ("1m", 60, 120), ("1h", 3600, 48))
+KINDS = ("Paging", "RRC setup", "NAS")
+# per-cell series kept (the all-cells totals come on top)
+MAX_SERIES = 512
+# pending (series, second) counts before a flush is forced
+MAX_PENDING = 4096
+
+# the cell key of the totals
+ALL_CELLS = ("", "*", "*")
+
+RRC_SETUP = ("RRCConnectionRequest", "RRC Setup Request")
+NAS_FILTERS = ("NAS-EPS", "NAS-5GS", "MSIN")
+
+def message_kind(filt, packet_info):
+    """
+    KINDS entry an event is counted under, or None.
+    """
+    if "Paging" in packet_info:
+        return "Paging"
+    if packet_info in RRC_SETUP:
+        return "RRC setup"
+    # Part1/Part2 of an NR setup request repeat the combined event
+    if filt in NAS_FILTERS and not packet_info.startswith(("RRC", "packet=")):
+        return "NAS"
+    return None
+
+class Ring:
+    """
+    Counts of the newest `size` slots; `head` is the newest slot number.
+    Counts for slots older than the ring are dropped.
+    """
+    __slots__ = ("counts", "head")
+
+    def __init__(self, size):
+        self.counts = array("L", bytes(array("L").itemsize * size))
+        self.head = None
+
+    def add(self, slot, n):
+        counts = self.counts
+        size = len(counts)
+        head = self.head
+        if head is None:
+            self.head = slot
+        elif slot > head:
+            self._clear(head, slot)
+            self.head = slot
+        elif slot <= head - size:
+            return
+        counts[slot % size] += n
+
+    def _clear(self, head, slot):
+        counts = self.counts
+        size = len(counts)
+        if slot - head >= size:
+            for i in range(size):
+                counts[i] = 0
+        else:
+            for s in range(head + 1, slot + 1):
+                counts[s % size] = 0
+
+    def values(self, until=None):
+        """
+        Counts oldest first, ending at slot `until` (default: the newest
+        slot), so idle time shows up as zeros.
+        """
+        size = len(self.counts)
+        if self.head is None:
+            return [0] * size
+        end = self.head if until is None or until < self.head else until
+        return [self.counts[s % size] if s <= self.head else 0
+                for s in range(end - size + 1, end + 1)]
+
+class Series:
+    __slots__ = ("rings",)
+
+    def __init__(self):
+        self.rings = [Ring(size) for _name, _res, size in RESOLUTIONS]
+
+    def add(self, second, n):
+        for ring, (_name, res, _size) in zip(self.rings, RESOLUTIONS):
+            ring.add(second // res, n)
+
+class RateAggregator:
+    def __init__(self, max_series=MAX_SERIES):
+        self.max_series = max_series
+        # (source, TAC, CID, kind) -> Series, least recently updated first
+        self.series = OrderedDict()
+        self.totals = {kind: Series() for kind in KINDS}
+        self.evicted = 0
+        self.newest = None
+        self._pending = {}
+
+    def add(self, ts, cell, filt, packet_info, n=1):
+        """
+        Count one event (n for a merged one) of cell snapshot `cell`.
+        """
+        kind = message_kind(filt, packet_info)
+        if kind is None:
+            return
+        key = ((cell[7], cell[3], cell[4], kind), int(ts))
+        pending = self._pending
+        pending[key] = pending.get(key, 0) + n
+        if len(pending) >= MAX_PENDING:
+            self.flush()
+
+    def flush(self):
+        """
+        Roll the pending counts up into the rings.
+        """
+        if not self._pending:
+            return
+        series = self.series
+        for (key, second), n in self._pending.items():
+            s = series.get(key)
+            if s is None:
+                s = series[key] = Series()
+                if len(series) > self.max_series:
+                    series.popitem(last=False)
+                    self.evicted += 1
+            else:
+                series.move_to_end(key)
+            s.add(second, n)
+            self.totals[key[3]].add(second, n)
+            if self.newest is None or second > self.newest:
+                self.newest = second
+        self._pending.clear()
+
+    def cells(self):
+        """
+        (source, TAC, CID) of the cells with a series, sorted.
+        """
+        return sorted({key[:3] for key in self.series},
+                      key=lambda c: tuple("" if v is None else str(v) for v in c))
+
+    def values(self, cell, kind, resolution, until=None):
+        """
+        Counts of `kind` in `cell` (ALL_CELLS for the totals) at
+        `resolution` ("1s", "1m" or "1h"), oldest first, ending at the slot
+        of epoch second `until` (default: the newest event).
+        """
+        self.flush()
+        idx = [r[0] for r in RESOLUTIONS].index(resolution)
+        res = RESOLUTIONS[idx][1]
+        s = self.totals[kind] if cell == ALL_CELLS else self.series.get(cell + (kind,))
+        if s is None:
+            return [0] * RESOLUTIONS[idx][2]
+        if until is None:
+            until = self.newest
+        return s.rings[idx].values(None if until is None else int(until) // res)
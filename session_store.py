@@ -0,0 +1,341 @@
+"""
+Persistent session store (SQLite, WAL mode).
+
+Every capture event is appended to the `events` table, tagged with the
+session it belongs to. The GUI/daemon thread only hands each ingested batch
+to put_many(); a writer thread owned by the store turns the batches into
+rows and inserts them with one executemany() per transaction, so the display
+never waits for the disk. Indexes on identifier, ID type, TAC/CID and time
+make queries over past sessions fast, and a session can be resumed after a
+restart by replaying its events into a fresh IdentifierModel.
+
+    python3 session_store.py campaign.db --sessions
+    python3 session_store.py campaign.db --id 0x1a2b3c4d
+    python3 session_store.py campaign.db --tac 1234 --cid 5678 --since "2025-05-01 08:00:00"
+"""
+import argparse
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from cell_context import CellSnapshot
+from id_store import format_ts, TS_FORMAT
+from shared_queue import EventQueue
+
+log = logging.getLogger("session_store")
+
+# events buffered for the writer before new ones are dropped (and counted)
+WRITE_BACKLOG = 1000000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    started REAL,
+    interface TEXT
+);
+CREATE TABLE IF NOT EXISTS events (
+    session INTEGER,
+    ts REAL,
+    filter_type TEXT,
+    identifier TEXT,
+    id_type TEXT,
+    packet_info TEXT,
+    mcc TEXT,
+    mnc TEXT,
+    tac TEXT,
+    cid TEXT,
+    mme_group TEXT,
+    mme_code TEXT,
+    count INTEGER NOT NULL DEFAULT 1,
+    source TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS events_session ON events (session, ts);
+CREATE INDEX IF NOT EXISTS events_identifier ON events (identifier, ts);
+CREATE INDEX IF NOT EXISTS events_id_type ON events (id_type, ts);
+CREATE INDEX IF NOT EXISTS events_cell ON events (tac, cid, ts);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+"""
+
+EVENT_COLUMNS = (
+    "session", "ts", "filter_type", "identifier", "id_type", "packet_info",
+    "mcc", "mnc", "tac", "cid", "mme_group", "mme_code", "count", "source"
+)
+
+# columns added after the first version of the schema
+MIGRATIONS = (
+    ("count", "INTEGER NOT NULL DEFAULT 1"),     # coalesced repeats
+    ("source", "TEXT NOT NULL DEFAULT ''"),      # capture source (modem)
+)
+
+def connect(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL + NORMAL: a crash can lose the last transactions, never corrupt the file
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    # files written by older versions: add the columns they lack, in order
+    columns = [r[1] for r in conn.execute("PRAGMA table_info(events)")]
+    for name, decl in MIGRATIONS:
+        if name not in columns:
+            conn.execute(f"ALTER TABLE events ADD COLUMN {name} {decl}")
+    conn.execute("CREATE INDEX IF NOT EXISTS events_source ON events (source, ts)")
+    return conn
+
+class Barrier:
+    """
+    Queued behind the events put so far (SessionStore.barrier()). The writer
+    sets it once they are committed, with `last_row` the highest rowid of the
+    events table then, so a reader can stop at exactly those events.
+    """
+    def __init__(self):
+        self.last_row = None
+        self._done = threading.Event()
+
+    def release(self, last_row):
+        self.last_row = last_row
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """
+        True once the events before the barrier are committed.
+        """
+        return self._done.wait(timeout)
+
+class SessionStore:
+    """
+    Appends capture events of one session to the database at `path`. With
+    resume=True the newest session in the file is continued instead of
+    starting a new one.
+    """
+    def __init__(self, path, resume=False, interface=None, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.written = 0
+        self._queue = EventQueue(WRITE_BACKLOG)
+        self._stop = threading.Event()
+
+        conn = connect(path)
+        row = conn.execute("SELECT MAX(id) FROM sessions").fetchone()
+        if resume and row[0] is not None:
+            self.session = row[0]
+        else:
+            with conn:
+                cur = conn.execute("INSERT INTO sessions (started, interface) VALUES (?, ?)",
+                                   (time.time(), interface))
+            self.session = cur.lastrowid
+        conn.close()
+
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    @property
+    def dropped(self):
+        return self._queue.dropped
+
+    def put_many(self, items):
+        """
+        Queue a batch of capture events for writing. Never blocks on the disk.
+        """
+        self._queue.put_many(items)
+
+    def barrier(self):
+        """
+        A Barrier released once every event put so far is on disk. Only
+        queues it, so it is cheap on the GUI thread.
+        """
+        barrier = Barrier()
+        dropped = self._queue.dropped
+        self._queue.put(barrier)
+        if self._queue.dropped != dropped:
+            # backlog full: nothing later can be cut off more precisely
+            # than what is on disk when it is read
+            barrier.release(None)
+        return barrier
+
+    def _write_loop(self):
+        # sqlite connections belong to the thread that opened them
+        conn = connect(self.path)
+        insert = f"INSERT INTO events VALUES ({', '.join('?' * len(EVENT_COLUMNS))})"
+        session = self.session
+        while True:
+            stopping = self._stop.is_set()
+            items = self._queue.drain(timeout=self.flush_interval)
+            if items:
+                rows = []
+                for it in items:
+                    if type(it) is Barrier:
+                        self._write(conn, insert, rows)
+                        rows = []
+                        it.release(conn.execute("SELECT MAX(rowid) FROM events").fetchone()[0] or 0)
+                        continue
+                    rows.append(
+                        (session, it[2], it[0], it[1], it[5], it[4], it[3].mcc, it[3].mnc,
+                         it[3].tac, it[3].cid, it[3].mme_group, it[3].mme_code,
+                         it[6] if len(it) == 7 else 1, it[3].source))
+                self._write(conn, insert, rows)
+            elif stopping:
+                break
+        conn.close()
+
+    def _write(self, conn, insert, rows):
+        if not rows:
+            return
+        try:
+            with conn:
+                conn.executemany(insert, rows)
+            self.written += len(rows)
+        except sqlite3.Error as e:
+            log.error("writing %d events to %s: %s", len(rows), self.path, e)
+
+    def close(self):
+        """
+        Write what is still queued and stop the writer thread.
+        """
+        self._stop.set()
+        self._writer.join()
+
+    def replay(self, model):
+        """
+        Rebuild `model` from the events stored for this session, in capture
+        order. Returns the number of events replayed.
+        """
+        # the replayed rows are already on disk, don't spill them again
+        spill, model.ue_spill = model.ue_spill, None
+        n = 0
+        try:
+            for row in iter_events(self.path, session=self.session):
+                model.ingest(row_to_event(row))
+                n += 1
+        finally:
+            model.ue_spill = spill
+        return n
+
+def add_session_args(parser):
+    parser.add_argument("--db", metavar="FILE",
+                        help="record every event in this SQLite session store")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the newest session in --db instead of starting a new one")
+
+def open_session(args, model):
+    """
+    Attach the SessionStore selected by --db/--resume to `model`, replaying
+    the resumed session first. Returns the store, or None without --db.
+    """
+    if not args.db:
+        return None
+    store = SessionStore(args.db, resume=args.resume, interface=args.interface)
+    if args.resume:
+        n = store.replay(model)
+        log.info("resumed session %d from %s: %d events", store.session, args.db, n)
+    else:
+        log.info("recording session %d to %s", store.session, args.db)
+    model.store = store
+    return store
+
+def row_to_event(row):
+    (_, ts, filt, ident, disp_type, packet_info,
+     mcc, mnc, tac, cid, mme_grp, mme_cd, count, source) = row
+    event = (filt, ident, ts, CellSnapshot(0, mcc, mnc, tac, cid, mme_grp, mme_cd, source),
+             packet_info, disp_type)
+    return event + (count,) if count != 1 else event
+
+def _connect_ro(path):
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+def _event_filter(session=None, identifier=None, id_type=None, tac=None, cid=None,
+                  since=None, until=None, source=None, last_row=None):
+    where, args = [], []
+    for col, val in (("session", session), ("identifier", identifier), ("id_type", id_type),
+                     ("tac", tac), ("cid", cid), ("source", source)):
+        if val is not None:
+            where.append(f"{col} = ?")
+            args.append(val)
+    if since is not None:
+        where.append("ts >= ?")
+        args.append(since)
+    if until is not None:
+        where.append("ts <= ?")
+        args.append(until)
+    if last_row is not None:
+        where.append("rowid <= ?")
+        args.append(last_row)
+    return (" WHERE " + " AND ".join(where) if where else ""), args
+
+def iter_events(path, session=None, identifier=None, id_type=None, tac=None, cid=None,
+                since=None, until=None, limit=None, source=None, last_row=None):
+    """
+    Stored events matching all given filters, ordered by capture time.
+    `since`/`until` are epoch seconds, `last_row` a Barrier.last_row (only
+    the events written before the barrier). Yields rows in EVENT_COLUMNS
+    order.
+    """
+    where, args = _event_filter(session, identifier, id_type, tac, cid, since, until,
+                                source, last_row)
+    sql = "SELECT * FROM events" + where + " ORDER BY ts"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    conn = _connect_ro(path)
+    try:
+        yield from conn.execute(sql, args)
+    finally:
+        conn.close()
+
+def count_events(path, **filters):
+    """
+    Number of rows iter_events() yields for the same filters.
+    """
+    where, args = _event_filter(**filters)
+    conn = _connect_ro(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM events" + where, args).fetchone()[0]
+    finally:
+        conn.close()
+
+def list_sessions(path):
+    """
+    (id, started, interface, events, first ts, last ts) per session.
+    """
+    conn = _connect_ro(path)
+    try:
+        return conn.execute(
+            "SELECT s.id, s.started, s.interface, TOTAL(e.count), MIN(e.ts), MAX(e.ts) "
+            "FROM sessions s LEFT JOIN events e ON e.session = s.id "
+            "GROUP BY s.id ORDER BY s.id"
+        ).fetchall()
+    finally:
+        conn.close()
+
+def _parse_time(text):
+    return datetime.strptime(text, TS_FORMAT).timestamp()
+
+def main():
+    parser = argparse.ArgumentParser(description="Query a persistent capture session store.")
+    parser.add_argument("db", help="SQLite file written with --db")
+    parser.add_argument("--sessions", action="store_true", help="list the stored sessions")
+    parser.add_argument("--session", type=int)
+    parser.add_argument("--id", dest="identifier")
+    parser.add_argument("--id-type")
+    parser.add_argument("--tac")
+    parser.add_argument("--cid")
+    parser.add_argument("--source", help="capture source name (multi-source runs)")
+    time_help = "local time, " + TS_FORMAT.replace("%", "%%")
+    parser.add_argument("--since", type=_parse_time, help=time_help)
+    parser.add_argument("--until", type=_parse_time, help=time_help)
+    parser.add_argument("--limit", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.sessions:
+        for sid, started, iface, n, first, last in list_sessions(args.db):
+            print(f"{sid}\t{format_ts(started)}\t{iface or ''}\t{int(n)} events\t"
+                  f"{format_ts(first)} - {format_ts(last)}")
+        return
+    rows = iter_events(args.db, args.session, args.identifier, args.id_type, args.tac,
+                       args.cid, args.since, args.until, args.limit, args.source)
+    print("\t".join(EVENT_COLUMNS))
+    for row in rows:
+        print("\t".join([str(row[0]), format_ts(row[1])] + ["" if v is None else str(v) for v in row[2:]]))
+
+if __name__ == "__main__":
+    main()
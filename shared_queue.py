@@ -1,4 +1,243 @@
-from queue import Queue
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+# Events queued before new ones are dropped (and counted) because the
+# consumer is not keeping up.
+QUEUE_CAPACITY = 1000000
+
+class EventBatch(list):
+    """
+    Collects the events of one engine line/record on the reader thread, which
+    then hands the whole block over with one put_many().
+    """
+    put = list.append
+    put_many = list.extend
+
+class EventQueue:
+    """
+    Batched transport between the capture reader and the consumer (GUI or
+    daemon). Producers hand over whole blocks with put_many(), the consumer
+    takes everything queued in one drain(), so the lock is taken once per
+    block instead of once per event.
+    """
+    def __init__(self, capacity=QUEUE_CAPACITY):
+        self.capacity = capacity
+        self._items = deque()
+        self._cond = threading.Condition(threading.Lock())
+        self.dropped = 0
+        self.max_depth = 0
+        self.events = 0
+        self.batches = 0
+        # monotonic time the oldest queued event was put
+        self._oldest = None
+
+    def put(self, item):
+        self.put_many((item,))
+
+    def put_many(self, items):
+        with self._cond:
+            room = self.capacity - len(self._items)
+            if len(items) > room:
+                self.dropped += len(items) - max(room, 0)
+                items = items[:max(room, 0)]
+            if not items:
+                return
+            if not self._items:
+                self._oldest = time.monotonic()
+            self._items.extend(items)
+            self.events += len(items)
+            self.batches += 1
+            if len(self._items) > self.max_depth:
+                self.max_depth = len(self._items)
+            self._cond.notify()
+
+    def drain(self, timeout=0):
+        """
+        Take all queued events. Waits up to `timeout` seconds (None = forever)
+        for the first one; returns [] if none arrived.
+        """
+        with self._cond:
+            if not self._items and timeout != 0:
+                self._cond.wait_for(lambda: self._items, timeout)
+            items = self._items
+            self._items = deque()
+            self._oldest = None
+        return items
+
+    def age(self):
+        """
+        Seconds the oldest queued event has been waiting, 0 if empty.
+        """
+        oldest = self._oldest
+        return time.monotonic() - oldest if oldest is not None else 0.0
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        return {
+            "depth": len(self._items),
+            "age": self.age(),
+            "max_depth": self.max_depth,
+            "dropped": self.dropped,
+            "events": self.events,
+            "batches": self.batches
+        }
+
+# Seconds repeats of an event are merged by the Coalescer
+COALESCE_WINDOW = 0.5
+
+class Coalescer:
+    """
+    Merges repeats of an event on the capture side, before the queue. Events
+    with the same (identifier, ID type, packet info, cell) key are repeats,
+    the cell being the snapshot's source, MCC, MNC, TAC and CID (not its
+    version, which every MME update bumps): the first one goes to `queue` at
+    once, the repeats that follow within `window` seconds are held back and,
+    when the window closes, sent as one event (the last repeat, so with the
+    latest snapshot) with the number of repeats appended as a seventh
+    element. Paging retransmissions and the per-code duplicates of NAS
+    messages thus cost one or two queue items per window instead of one per
+    frame, without delaying the first sighting of an identifier.
+
+    Takes put()/put_many() like an EventQueue, from any number of threads.
+    Closed windows are flushed on the next put_many() and by a timer thread
+    (start()/stop()).
+    """
+    def __init__(self, queue, window=COALESCE_WINDOW):
+        self.queue = queue
+        self.window = window
+        # key -> [window end (monotonic), repeats, last repeat]
+        self._open = {}
+        self._lock = threading.Lock()
+        self._next_flush = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self.events = 0
+        self.merged = 0
+
+    def put(self, item):
+        self.put_many((item,))
+
+    def put_many(self, items):
+        now = time.monotonic()
+        out = []
+        with self._lock:
+            opened = self._open
+            for item in items:
+                snap = item[3]
+                key = (item[1], item[5], item[4], snap[7], snap[1], snap[2], snap[3], snap[4], item[0])
+                entry = opened.get(key)
+                if entry is None or entry[0] <= now:
+                    if entry is not None and entry[1]:
+                        out.append(entry[2] + (entry[1],))
+                        self.merged += entry[1] - 1
+                    opened[key] = [now + self.window, 0, None]
+                    out.append(item)
+                else:
+                    entry[1] += 1
+                    entry[2] = item
+            self.events += len(items)
+            if now >= self._next_flush:
+                out += self._close_windows(now)
+        if out:
+            self.queue.put_many(out)
+
+    def _close_windows(self, now, until=None):
+        """
+        Remove the windows that ended by `until` (default `now`) and return
+        their merged events. Called with the lock held.
+        """
+        self._next_flush = now + self.window / 2
+        until = now if until is None else until
+        out = []
+        closed = [key for key, entry in self._open.items() if entry[0] <= until]
+        for key in closed:
+            end, repeats, last = self._open.pop(key)
+            if repeats:
+                out.append(last + (repeats,))
+                self.merged += repeats - 1
+        return out
+
+    def flush(self, everything=False):
+        """
+        Send the merged events of the closed windows (all windows if
+        `everything`, e.g. when the capture stops).
+        """
+        with self._lock:
+            out = self._close_windows(time.monotonic(), float("inf") if everything else None)
+        if out:
+            self.queue.put_many(out)
+
+    def _run(self):
+        while not self._stop.wait(self.window / 2):
+            self.flush()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="coalescer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush(everything=True)
+
+class ReorderBuffer:
+    """
+    Puts events from several readers/sources back into capture-time order.
+    Events (item[2] is the capture epoch) are held until they are `window`
+    seconds older than the newest one seen, or until no new events arrived
+    for `window` seconds of wall time.
+    """
+    def __init__(self, window=0.5):
+        self.window = window
+        self._heap = []
+        self._seq = itertools.count()
+        self._newest = None
+        self._last_push = 0.0
+
+    def push(self, items):
+        for item in items:
+            ts = item[2]
+            heapq.heappush(self._heap, (ts, next(self._seq), item))
+            if self._newest is None or ts > self._newest:
+                self._newest = ts
+        if items:
+            self._last_push = time.monotonic()
+
+    def pop_ready(self):
+        heap = self._heap
+        if not heap:
+            return []
+        if time.monotonic() - self._last_push >= self.window:
+            limit = float("inf")
+        else:
+            limit = self._newest - self.window
+        ready = []
+        while heap and heap[0][0] <= limit:
+            ready.append(heapq.heappop(heap)[2])
+        return ready
+
+    def release_in(self):
+        """
+        Seconds until pop_ready() releases every held event if nothing new
+        is pushed, or None if nothing is held.
+        """
+        if not self._heap:
+            return None
+        return max(self.window - (time.monotonic() - self._last_push), 0.0)
+
+    def clear(self):
+        self._heap.clear()
+        self._newest = None
+
+    def __len__(self):
+        return len(self._heap)
 
 # A single global queue used to pass events from capture.py to the GUI.
-capture_queue = Queue()
+capture_queue = EventQueue()
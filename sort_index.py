@@ -0,0 +1,175 @@
+"""
+Ordered views of the identifier table for the Details tab.
+
+An index per (filter type, sort column) keeps the matching identifiers in a
+blocked sorted list (a list of short sorted lists, found by bisecting the
+block maxima), so inserting or moving one entry costs O(log n + block) and
+the top N rows are read straight off either end. The model marks every
+identifier it touches as dirty in the indexes that exist; an index applies
+its dirty keys when it is read. A refresh therefore costs O(changed + N)
+instead of filtering and sorting the whole table.
+
+Indexes are built the first time a view is shown and kept afterwards, so
+switching back to a view only replays what changed in between.
+"""
+import itertools
+from bisect import bisect_left, bisect_right, insort
+
+# Sort value per column; "active" is the age of last_seen, so it is served
+# by the last_seen index in the opposite direction.
+SORT_VALUES = {
+    "id_type": lambda key, rec: key[0] or "",
+    "identifier": lambda key, rec: key[1] or "",
+    "count": lambda key, rec: rec.count,
+    "last_seen": lambda key, rec: rec.last_seen or 0,
+    "lifespan": lambda key, rec: rec.lifespan,
+    "tracking_area_code": lambda key, rec: rec.tracking_area_code or "",
+    "cell_identity": lambda key, rec: rec.cell_identity or "",
+}
+
+class SortedBlocks:
+    """
+    Sorted list of unique, comparable entries, stored in blocks of at most
+    2 * LOAD entries.
+    """
+    LOAD = 500
+
+    def __init__(self, entries=()):
+        entries = sorted(entries)
+        self._blocks = [entries[i:i + self.LOAD] for i in range(0, len(entries), self.LOAD)]
+        self._maxes = [b[-1] for b in self._blocks]
+        self._len = len(entries)
+
+    def add(self, entry):
+        if not self._blocks:
+            self._blocks.append([entry])
+            self._maxes.append(entry)
+        else:
+            i = min(bisect_right(self._maxes, entry), len(self._blocks) - 1)
+            block = self._blocks[i]
+            insort(block, entry)
+            self._maxes[i] = block[-1]
+            if len(block) > 2 * self.LOAD:
+                self._blocks[i:i + 1] = [block[:self.LOAD], block[self.LOAD:]]
+                self._maxes[i:i + 1] = [self._blocks[i][-1], self._blocks[i + 1][-1]]
+        self._len += 1
+
+    def remove(self, entry):
+        i = bisect_left(self._maxes, entry)
+        block = self._blocks[i]
+        del block[bisect_left(block, entry)]
+        if block:
+            self._maxes[i] = block[-1]
+        else:
+            del self._blocks[i]
+            del self._maxes[i]
+        self._len -= 1
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._blocks)
+
+    def __reversed__(self):
+        return itertools.chain.from_iterable(reversed(b) for b in reversed(self._blocks))
+
+class ColumnIndex:
+    """
+    Identifiers of one filter type (None = all) ordered by one column.
+    Entries are (value, seq, key); seq is the order the identifier was first
+    indexed, so equal values never compare the keys.
+    """
+    def __init__(self, store, filt, column, seq):
+        self.store = store
+        self.filt = filt
+        self.value = SORT_VALUES[column]
+        self.dirty = set()
+        self._seq = seq
+        self._entries = {}
+        keys = store.keys_of_type(filt) if filt is not None else store
+        for key in keys:
+            self._entries[key] = (self.value(key, store[key]), seq(key), key)
+        self._sorted = SortedBlocks(self._entries.values())
+
+    def touch(self, key):
+        if self.filt is None or key[0] == self.filt:
+            self.dirty.add(key)
+
+    def _apply_dirty(self):
+        store = self.store
+        for key in self.dirty:
+            old = self._entries.get(key)
+            new = (self.value(key, store[key]), old[1] if old else self._seq(key), key)
+            if new == old:
+                continue
+            if old is not None:
+                self._sorted.remove(old)
+            self._sorted.add(new)
+            self._entries[key] = new
+        self.dirty.clear()
+
+    def iter_keys(self, ascending=True):
+        self._apply_dirty()
+        if ascending:
+            return (entry[2] for entry in self._sorted)
+        return self._iter_descending()
+
+    def _iter_descending(self):
+        # values from the top down, but equal values still in arrival
+        # order, as sorted(..., reverse=True) would give them
+        group = []
+        for entry in reversed(self._sorted):
+            if group and entry[0] != group[-1][0]:
+                for e in reversed(group):
+                    yield e[2]
+                group.clear()
+            group.append(entry)
+        for e in reversed(group):
+            yield e[2]
+
+class SortIndexes:
+    """
+    The ColumnIndexes of one IdentifierStore, created on first use.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.reset()
+
+    def reset(self):
+        """
+        Drop every index, e.g. after the store was replaced wholesale.
+        """
+        self._indexes = {}
+        self._order = {}
+        self._next = itertools.count()
+
+    def _seq(self, key):
+        seq = self._order.get(key)
+        if seq is None:
+            seq = self._order[key] = next(self._next)
+        return seq
+
+    def touch(self, key):
+        if self._indexes:
+            # number new keys in the order they arrive: the dirty keys are
+            # a set, so numbering them when an index applies them would
+            # order equal values arbitrarily
+            self._seq(key)
+        for index in self._indexes.values():
+            index.touch(key)
+
+    def index(self, filt, column):
+        index = self._indexes.get((filt, column))
+        if index is None:
+            index = self._indexes[(filt, column)] = ColumnIndex(self.store, filt, column, self._seq)
+        return index
+
+    def ordered(self, filt, column, ascending=True):
+        """
+        Keys of filter type `filt` (None = all) in column order, lazily, so
+        taking the first N costs O(N).
+        """
+        if column == "active":
+            column, ascending = "last_seen", not ascending
+        return self.index(filt, column).iter_keys(ascending)
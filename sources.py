@@ -0,0 +1,217 @@
+"""
+Capture sources: several modems / SCAT instances captured in parallel.
+
+A CaptureSource is one modem: a name, the UDP port its SCAT instance sends
+GSMTAP to and the interface to capture it on. Every source runs its own
+pipeline (tshark engine under its supervisor, optional native listener,
+coalescer) in its own process, so throughput scales with cores and each
+source has its own cell/MME context. Events are tagged with the source name
+through their cell snapshot (CellSnapshot.source) and forwarded in batches
+to the capture queue of the main process.
+
+    python3 controller.py --source telia:4729 --source telenor:4730:lo
+
+Without --source the single default pipeline runs in the main process as
+before.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+
+import capture
+import metrics
+from log_setup import setup_logging
+
+log = logging.getLogger("sources")
+
+# seconds between the batches a source process sends
+FORWARD_INTERVAL = 0.05
+# seconds between the metric snapshots a source process sends
+METRICS_INTERVAL = 1.0
+# delay before a source process that died is started again
+RESTART_DELAY = 5.0
+
+class CaptureSource:
+    def __init__(self, name, port=capture.GSMTAP_PORT, interface="lo"):
+        self.name = name
+        self.port = port
+        self.interface = interface
+
+    def __repr__(self):
+        return f"CaptureSource({self.name!r}, {self.port}, {self.interface!r})"
+
+    def capture_kwargs(self, args):
+        """
+        capture_identifiers() arguments for this source: the capture flags
+        of `args`, with the GSMTAP port and interface of the source.
+        """
+        kwargs = capture.capture_kwargs(args)
+        kwargs["interface"] = self.interface
+        if args.capture_filter is None:
+            kwargs["capture_filter"] = capture.gsmtap_filter((self.port,), args.gsmtap_types)
+            kwargs["gsmtap"] = ((self.port,), args.gsmtap_types)
+        if kwargs["native_ports"]:
+            kwargs["native_ports"] = (self.port,)
+        return kwargs
+
+def parse_source(text):
+    """
+    "NAME:PORT[:INTERFACE]" -> CaptureSource.
+    """
+    m = re.fullmatch(r"([\w.-]+):(\d+)(?::([\w.:-]+))?", text)
+    if m is None:
+        raise ValueError(f"bad source {text!r}, expected NAME:PORT[:INTERFACE]")
+    return CaptureSource(m.group(1), int(m.group(2)), m.group(3) or "lo")
+
+def _source_type(text):
+    try:
+        return parse_source(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def add_source_args(parser):
+    parser.add_argument("--source", type=_source_type, action="append", metavar="NAME:PORT[:IFACE]",
+                        help="capture this modem's GSMTAP port as a separate source, in its own "
+                             "process (repeatable; interface default: lo)")
+
+def source_trace(path, name):
+    """
+    The raw trace file of source `name`: "trace.gz" -> "trace.NAME.gz".
+    """
+    if not path:
+        return None
+    root, ext = os.path.splitext(path)
+    return f"{root}.{name}{ext}"
+
+def _run_source(name, kwargs, logging_args, conn):
+    """
+    Entry point of a source process: run the capture pipeline and send the
+    events to the main process in batches, and a ("metrics", snapshot) of
+    this process's metrics every METRICS_INTERVAL.
+    """
+    import signal
+    from shared_queue import EventQueue
+
+    # the main process stops us with SIGTERM; unwind so tshark is stopped too
+    def on_term(*_):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, on_term)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setup_logging(*logging_args)
+    capture.set_source(name)
+    queue = EventQueue()
+    done = threading.Event()
+
+    def forward():
+        next_metrics = 0.0
+        while not done.is_set() or len(queue):
+            items = queue.drain(timeout=FORWARD_INTERVAL)
+            if items:
+                conn.send([_tag_status(item, name) for item in items])
+            now = time.monotonic()
+            if now >= next_metrics:
+                conn.send(("metrics", metrics.snapshot()))
+                next_metrics = now + METRICS_INTERVAL
+
+    sender = threading.Thread(target=forward, daemon=True)
+    sender.start()
+    try:
+        capture.capture_identifiers(queue, **kwargs)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        done.set()
+        sender.join(timeout=5)
+        conn.close()
+
+def _tag_status(item, name):
+    if item[0] == "status":
+        return ("status", dict(item[1], source=name))
+    return item
+
+class SourceProcess:
+    """
+    One CaptureSource running in a child process; a thread of the main
+    process puts the events it sends on `queue`, its metrics in the metrics
+    registry (labelled with the source name), and starts it again if it
+    dies. The child logs with the same level and log file, and writes its
+    raw trace to its own file (source_trace()).
+    """
+    def __init__(self, source, kwargs, queue, log_level="INFO", log_file=None, raw_trace=None):
+        self.source = source
+        self.kwargs = kwargs
+        self.queue = queue
+        self.logging_args = (log_level, log_file, source_trace(raw_trace, source.name))
+        self.proc = None
+        self.restarts = 0
+        self._stop = threading.Event()
+        # spawn, not fork: the main process may already run Kivy/SDL threads
+        self._ctx = multiprocessing.get_context("spawn")
+
+    def start(self):
+        threading.Thread(target=self._run, name=f"source-{self.source.name}", daemon=True).start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            recv, send = self._ctx.Pipe(duplex=False)
+            self.proc = self._ctx.Process(
+                target=_run_source, name=f"source-{self.source.name}", daemon=True,
+                args=(self.source.name, self.kwargs, self.logging_args, send))
+            self.proc.start()
+            send.close()
+            log.info("source %s: pid %d, %s port %d", self.source.name, self.proc.pid,
+                     self.source.interface, self.source.port)
+            try:
+                while True:
+                    msg = recv.recv()
+                    if isinstance(msg, tuple):
+                        metrics.update_source(self.source.name, msg[1])
+                    else:
+                        self.queue.put_many(msg)
+            except (EOFError, OSError):
+                pass
+            recv.close()
+            self.proc.join()
+            if self._stop.is_set():
+                break
+            self.restarts += 1
+            msg = f"source process exited with code {self.proc.exitcode}; restarting"
+            log.warning("source %s: %s", self.source.name, msg)
+            self.queue.put(("status", {"ts": time.time(), "state": "restarting",
+                                       "restarts": self.restarts, "message": msg,
+                                       "source": self.source.name}))
+            self._stop.wait(RESTART_DELAY)
+
+    def stop(self):
+        self._stop.set()
+        proc = self.proc
+        if proc is not None and proc.is_alive():
+            proc.terminate()
+            proc.join(timeout=10)
+
+def check_sources(parser, args):
+    """
+    parser.error() for --source lists that would capture the same port twice.
+    """
+    names = [s.name for s in args.source or ()]
+    ports = [(s.interface, s.port) for s in args.source or ()]
+    if len(set(names)) != len(names):
+        parser.error("--source names must be unique")
+    if len(set(ports)) != len(ports):
+        parser.error("two --source entries capture the same interface and port")
+
+def start_sources(args, queue):
+    """
+    Start a SourceProcess per --source. Returns them (stop() each on exit).
+    """
+    procs = []
+    for source in args.source:
+        sp = SourceProcess(source, source.capture_kwargs(args), queue, args.log_level,
+                           args.log_file, args.raw_trace)
+        sp.start()
+        procs.append(sp)
+    return procs
@@ -0,0 +1,306 @@
+"""
+Supervision of the tshark capture engine.
+
+capture_identifiers() runs the engine under an EngineSupervisor instead of
+starting it once, so a dissector that dies (interface reset, SCAT restart,
+OOM kill) or hangs no longer takes its stream away for the rest of the run:
+
+    exit     the process exited or its output closed
+    stall    no engine output for `stall_timeout` seconds although packets
+             the engine should see kept arriving (an idle radio is quiet
+             on the interface too, so silence alone is not a stall)
+
+Either way the engine is stopped and started again after a backoff that
+doubles from `backoff` up to `max_backoff` seconds and is reset once an
+engine ran for `healthy_after` seconds. The cell/MME context lives in
+capture.cell_context and is kept across restarts, so events of the new
+engine carry the last known cell until the next SIB1.
+
+Every state change is put on the status queue as ("status", {...}) for the
+GUI (and the daemon's subscribers) to show.
+"""
+import ctypes
+import logging
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+import metrics
+
+log = logging.getLogger("capture.supervisor")
+
+RESTARTS = metrics.Counter("capture_engine_restarts_total", "Restarts of the tshark engine",
+                           label="reason")
+
+# packets the engine must be sent during a silent `stall_timeout` for it to
+# count as stalled
+STALL_MIN_PACKETS = 100
+
+# ---------------- Engine traffic ----------------
+# The stall test counts only the packets tshark's capture filter passes:
+# GSMTAP on the engine's ports and channel types, without the datagrams the
+# native listener decodes. Counting every packet of the interface would
+# include other local services, the excluded channels and, with several
+# sources on lo, the other sources' GSMTAP, so a quiet modem would get its
+# engine restarted over and over. The same test runs in the kernel as a
+# classic BPF program on a packet socket that is never read: the socket's
+# PACKET_STATISTICS is the count, so unrelated packets cost nothing here.
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+SO_ATTACH_FILTER = 26
+ETH_P_ALL = 0x0003
+ETH_P_IP = 0x0800
+PACKET_OUTGOING = 4
+SKF_AD_PKTTYPE = 0xfffff000 + 4
+
+# /sys/class/net/<interface>/type -> offset of the IP header in a frame
+LINK_OFFSETS = {
+    1: 14,      # ARPHRD_ETHER
+    772: 14,    # ARPHRD_LOOPBACK
+    519: 0,     # ARPHRD_RAWIP
+    65534: 0,   # ARPHRD_NONE (tun, wwan)
+}
+
+# classic BPF opcodes
+LD_W_ABS, LD_H_ABS, LD_B_ABS = 0x20, 0x28, 0x30
+LD_H_IND, LD_B_IND = 0x48, 0x50
+LDX_B_MSH = 0xb1
+ALU_AND_K = 0x54
+JEQ_K, JSET_K = 0x15, 0x45
+RET_K = 0x06
+
+def gsmtap_program(link_offset, ports, types=None, exclude=()):
+    """
+    BPF instructions (code, jt, jf, k) passing IPv4 UDP to `ports` whose
+    GSMTAP header matches one of `types` ((version, type), type None = any
+    of that version; None = every channel) and none of `exclude`
+    ((version, type, sub_type)). Outgoing copies are dropped, so lo counts
+    each datagram once.
+    """
+    ip = link_offset
+    # (opcode, k, label) per instruction; label: jump target if the test
+    # fails, "next" falls through
+    prog = [("ld", LD_W_ABS, SKF_AD_PKTTYPE), ("ne", PACKET_OUTGOING, "reject")]
+    if link_offset:
+        prog += [("ld", LD_H_ABS, 12), ("eq", ETH_P_IP, "reject")]
+    else:
+        prog += [("ld", LD_B_ABS, 0), ("and", 0xf0), ("eq", 0x40, "reject")]
+    prog += [("ld", LD_B_ABS, ip + 9), ("eq", socket.IPPROTO_UDP, "reject"),
+             ("ld", LD_H_ABS, ip + 6), ("unset", 0x1fff, "reject"),
+             ("ldx", LDX_B_MSH, ip), ("ld", LD_H_IND, ip + 2)]
+    for i, port in enumerate(ports):
+        prog.append(("jeq", port, "port_ok") if i < len(ports) - 1 else ("eq", port, "reject"))
+    prog.append(("label", "port_ok"))
+    udp = ip + 8
+    # (size, offset in the datagram's UDP payload) of the GSMTAP fields
+    version, v2_type, v2_sub, v3_type, v3_sub = (
+        (LD_B_IND, 0), (LD_B_IND, 2), (LD_B_IND, 12), (LD_H_IND, 4), (LD_H_IND, 6))
+    for n, (ver, gtype, sub) in enumerate(exclude):
+        tests = ([version, ver], [v2_type if ver == 2 else v3_type, gtype],
+                 [v2_sub if ver == 2 else v3_sub, sub])
+        for load, value in tests:
+            prog += [("ld", load[0], udp + load[1]), ("eq", value, f"excl{n}")]
+        prog += [("ret", 0), ("label", f"excl{n}")]
+    if types:
+        for n, (ver, gtype) in enumerate(types):
+            prog += [("ld", version[0], udp + version[1]), ("eq", ver, f"type{n}")]
+            if gtype is not None:
+                load = v2_type if ver == 2 else v3_type
+                prog += [("ld", load[0], udp + load[1]), ("eq", gtype, f"type{n}")]
+            prog += [("ret", 0xffff), ("label", f"type{n}")]
+        prog.append(("ret", 0))
+    else:
+        prog.append(("ret", 0xffff))
+    prog += [("label", "reject"), ("ret", 0)]
+    return _assemble(prog)
+
+def _assemble(prog):
+    labels = {}
+    pc = 0
+    for ins in prog:
+        if ins[0] == "label":
+            labels[ins[1]] = pc
+        else:
+            pc += 1
+    out = []
+    for ins in prog:
+        op = ins[0]
+        if op == "label":
+            continue
+        pc = len(out)
+        if op in ("ld", "ldx"):
+            out.append((ins[1], 0, 0, ins[2]))
+        elif op == "and":
+            out.append((ALU_AND_K, 0, 0, ins[1]))
+        elif op == "ret":
+            out.append((RET_K, 0, 0, ins[1]))
+        elif op == "jeq":
+            # jump to the label if equal
+            out.append((JEQ_K, labels[ins[2]] - pc - 1, 0, ins[1]))
+        elif op in ("eq", "ne", "unset"):
+            # fall through if the test holds, else jump to the label
+            far = labels[ins[2]] - pc - 1
+            code = JSET_K if op == "unset" else JEQ_K
+            out.append((code, far, 0, ins[1]) if op in ("ne", "unset") else (code, 0, far, ins[1]))
+    if any(jt > 255 or jf > 255 for _code, jt, jf, _k in out):
+        raise ValueError("BPF program too long")
+    return out
+
+class EngineTraffic:
+    """
+    Counts the packets of `interface` that gsmtap_program() passes.
+    Raises OSError if that can't be done (no packet sockets, no root,
+    unknown link type).
+    """
+    def __init__(self, interface, ports, types=None, exclude=()):
+        try:
+            with open(f"/sys/class/net/{interface}/type") as f:
+                link = int(f.read())
+        except (OSError, ValueError) as e:
+            raise OSError(f"no link type for {interface}: {e}") from None
+        if link not in LINK_OFFSETS:
+            raise OSError(f"unsupported link type {link} on {interface}")
+        code = gsmtap_program(LINK_OFFSETS[link], ports, types, exclude)
+        self._insns = ctypes.create_string_buffer(
+            b"".join(struct.pack("HBBI", *ins) for ins in code))
+        fprog = struct.pack("HL", len(code), ctypes.addressof(self._insns))
+        # protocol 0 receives nothing until bind(), i.e. until the filter is on
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1)
+            self.sock.bind((interface, ETH_P_ALL))
+        except OSError:
+            self.sock.close()
+            raise
+        self.packets = 0
+        self._stats()
+
+    def _stats(self):
+        # tp_packets includes the drops of the (never read) full receive
+        # buffer; reading the statistics resets them
+        packets, _drops = struct.unpack("II", self.sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, 8))
+        return packets
+
+    def __call__(self):
+        if self.sock.fileno() < 0:
+            return None
+        self.packets += self._stats()
+        return self.packets
+
+    def close(self):
+        self.sock.close()
+
+class EngineSupervisor:
+    """
+    Keeps the engine started by `start()` running. `start()` returns
+    (process, reader thread). `progress()` returns a number that grows while
+    the engine produces output (capture.FRAMES), `traffic()` one that grows
+    while the engine is sent packets (an EngineTraffic; None if unknown,
+    which turns the stall test off).
+    """
+    def __init__(self, start, progress, traffic=None, status_queue=None, stall_timeout=30.0,
+                 backoff=1.0, max_backoff=60.0, healthy_after=60.0, check_interval=1.0,
+                 max_restarts=None):
+        self.start = start
+        self.progress = progress
+        self.traffic = traffic or (lambda: None)
+        self.status_queue = status_queue
+        self.stall_timeout = stall_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.healthy_after = healthy_after
+        self.check_interval = check_interval
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self.state = "starting"
+        self.proc = None
+        self._stop = threading.Event()
+
+    def _status(self, state, message):
+        self.state = state
+        if self.status_queue is not None:
+            self.status_queue.put(("status", {
+                "ts": time.time(), "state": state, "restarts": self.restarts, "message": message
+            }))
+
+    def run(self):
+        """
+        Supervise until stop() is called (or `max_restarts` is used up).
+        """
+        delay = self.backoff
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.proc, reader = self.start()
+            except OSError as e:
+                reason, kind = f"engine failed to start: {e}", "start"
+            else:
+                self._status("running", f"engine running (pid {self.proc.pid})")
+                reason, kind = self._watch(self.proc, reader)
+                self._terminate(self.proc)
+                reader.join(timeout=5)
+            if self._stop.is_set():
+                break
+            if time.monotonic() - started >= self.healthy_after:
+                delay = self.backoff
+            if self.max_restarts is not None and self.restarts >= self.max_restarts:
+                log.info("Engine ended: %s", reason)
+                self._status("stopped", reason)
+                return
+            self.restarts += 1
+            RESTARTS.labels(kind).inc()
+            log.warning("%s; restarting in %.0f s (restart %d)", reason, delay, self.restarts)
+            self._status("restarting", f"{reason}; restarting in {delay:.0f} s")
+            if self._stop.wait(delay):
+                break
+            delay = min(delay * 2, self.max_backoff)
+        self._status("stopped", "capture stopped")
+
+    def _watch(self, proc, reader):
+        """
+        Wait until the engine exits or stalls. Returns (reason, kind).
+        """
+        seen = self.progress()
+        last_output = time.monotonic()
+        rx_base = self.traffic()
+        while not self._stop.is_set():
+            # the reader ends at EOF, i.e. as soon as the engine exits
+            reader.join(self.check_interval)
+            if self._stop.is_set():
+                break
+            if not reader.is_alive() or proc.poll() is not None:
+                try:
+                    code = proc.wait(timeout=1)
+                except subprocess.TimeoutExpired:
+                    return "engine output closed", "exit"
+                return f"engine exited with code {code}", "exit"
+            now = time.monotonic()
+            count = self.progress()
+            rx = self.traffic()
+            if count != seen:
+                seen, last_output, rx_base = count, now, rx
+            elif now - last_output >= self.stall_timeout:
+                if rx is not None and rx_base is not None and rx - rx_base >= STALL_MIN_PACKETS:
+                    return (f"engine stalled: no output for {now - last_output:.0f} s while "
+                            f"{rx - rx_base} packets arrived for it"), "stall"
+                # quiet radio: start a new observation period
+                last_output, rx_base = now, rx
+        return "stopping", "stop"
+
+    def _terminate(self, proc):
+        if proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+    def stop(self):
+        self._stop.set()
+        proc = self.proc
+        if proc is not None:
+            self._terminate(proc)
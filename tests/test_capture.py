@@ -0,0 +1,37 @@
+import capture
+from shared_queue import EventQueue
+
+def cell_events(queue):
+    return [item for item in queue.drain(timeout=0) if item[0] == "CELL"]
+
+def test_sib_5g_ignores_a_concurrent_mme_change(monkeypatch):
+    capture.reset_context()
+    queue = EventQueue()
+    capture.update_sib_5g(queue, ("242", "01"), "100", "7")
+    assert len(cell_events(queue)) == 1
+
+    # the native listener publishes an MME change while the SIB1 is applied
+    update = capture.cell_context.update
+
+    def racing_update(**changes):
+        update(mme_group="32770", mme_code="1")
+        return update(**changes)
+    monkeypatch.setattr(capture.cell_context, "update", racing_update)
+    capture.update_sib_5g(queue, ("242", "01"), "100", "7")
+    assert cell_events(queue) == []
+
+    capture.update_sib_5g(queue, ("242", "01"), "100", "8")
+    assert [e[1] for e in cell_events(queue)] == ["8"]
+    capture.reset_context()
+
+def test_engine_stderr_counts_capture_drops():
+    import subprocess
+    import sys
+    script = ("import sys; sys.stderr.write('Running as user root\\n"
+              "1200 packets captured\\n37 packets dropped from lo\\n')")
+    proc = subprocess.Popen([sys.executable, "-c", script], stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    before = capture.PCAP_DROPPED._default.value
+    capture.read_engine_stderr(proc)
+    proc.wait()
+    assert capture.PCAP_DROPPED._default.value - before == 37
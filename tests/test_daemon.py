@@ -0,0 +1,38 @@
+import socket
+import threading
+
+import pytest
+
+import daemon
+
+def test_second_daemon_does_not_take_over_the_socket(tmp_path):
+    path = str(tmp_path / "app.sock")
+    server = daemon.serve(daemon.IdentifierDaemon(), path)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with pytest.raises(OSError, match="already serving"):
+            daemon.serve(daemon.IdentifierDaemon(), path)
+        # the first daemon still answers
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(path)
+            s.sendall(b'{"cmd": "snapshot"}\n')
+            assert b'"type": "snapshot"' in s.makefile("rb").readline()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_stale_socket_is_replaced(tmp_path):
+    path = str(tmp_path / "app.sock")
+    # a daemon that died leaves its socket file behind
+    dead = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    dead.bind(path)
+    dead.close()
+    server = daemon.serve(daemon.IdentifierDaemon(), path)
+    server.server_close()
+
+def test_refuses_to_remove_other_files(tmp_path):
+    path = tmp_path / "app.sock"
+    path.write_text("not a socket")
+    with pytest.raises(OSError, match="not a socket"):
+        daemon.serve(daemon.IdentifierDaemon(), str(path))
+    assert path.read_text() == "not a socket"
@@ -0,0 +1,73 @@
+import csv
+
+import exporter
+from cell_context import CellSnapshot
+from model import IdentifierModel
+
+CELL = CellSnapshot(1, "242", "01", "100", "7", "1", "2", "modem1")
+
+def reallocation(ts, old, new):
+    return [
+        ("NAS-EPS", old, ts, CELL, "RRCConnectionRequest", "m-TMSI"),
+        ("NAS-EPS", old, ts + 0.2, CELL, "TAU Request", "m-TMSI"),
+        ("NAS-EPS", new, ts + 0.5, CELL, "TAU Accept", "m-TMSI"),
+    ]
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))[1:]
+
+def test_export_is_the_state_at_the_snapshot(tmp_path):
+    model = IdentifierModel()
+    model.ingest_many(reallocation(1000, "aaaa0001", "bbbb0002"))
+    snap = exporter.take_snapshot(model)
+    # the model changes while the export runs: existing records and the
+    # chain change, new ones appear
+    model.ingest_many(reallocation(2000, "bbbb0002", "cccc0003"))
+    model.ingest_many([("m-TMSI", "dddd0004", 2100, CELL, "Paging", "m-TMSI")])
+    try:
+        files = exporter.run_export(snap, str(tmp_path / "out.csv"))
+    finally:
+        exporter.release_snapshot(snap)
+    ids = {row[1]: row for row in read_csv(files[0])}
+    assert sorted(ids) == ["aaaa0001", "bbbb0002"]
+    assert ids["aaaa0001"][2] == "2" and ids["bbbb0002"][2] == "1"
+    chains = read_csv(files[2])
+    assert len(chains) == 1 and chains[0][6] == "aaaa0001 > bbbb0002"
+    # released: changes are no longer copied
+    assert model._frozen == () and model.linker.frozen == ()
+
+def test_export_after_changes_stop(tmp_path):
+    model = IdentifierModel()
+    model.ingest_many(reallocation(1000, "aaaa0001", "bbbb0002"))
+    model.ingest_many(reallocation(2000, "bbbb0002", "cccc0003"))
+    snap = exporter.take_snapshot(model)
+    files = exporter.run_export(snap, str(tmp_path / "out.csv.gz"))
+    exporter.release_snapshot(snap)
+    assert files[0].endswith("out_identifiers.csv.gz")
+    assert exporter.split_name(files[0]) == (str(tmp_path / "out_identifiers"), ".csv.gz")
+
+def test_arrow_formats_only_with_pyarrow():
+    exts = exporter.export_extensions()
+    assert ".csv" in exts and ".csv.gz" in exts
+    assert (".parquet" in exts) == (exporter.pa is not None)
+
+def test_events_table_stops_at_the_snapshot(tmp_path):
+    from session_store import SessionStore
+    store = SessionStore(str(tmp_path / "s.db"))
+    model = IdentifierModel(store=store)
+    try:
+        model.ingest_many(reallocation(1000, "aaaa0001", "bbbb0002"))
+        snap = exporter.take_snapshot(model)
+        model.ingest_many(reallocation(2000, "bbbb0002", "cccc0003"))
+        totals = []
+        files = exporter.run_export(snap, str(tmp_path / "out.csv"),
+                                    lambda done, total: totals.append(total))
+        exporter.release_snapshot(snap)
+    finally:
+        store.close()
+    events = read_csv(files[3])
+    # every event ingested before the snapshot, none after, and the
+    # progress total counts exactly those rows
+    assert [row[2] for row in events] == ["aaaa0001", "aaaa0001", "bbbb0002"]
+    assert totals[-1] == sum(len(read_csv(f)) for f in files)
@@ -0,0 +1,105 @@
+"""
+Golden tests: the events of a natively decoded datagram must be the events
+tshark's fields for the same frame give, identifiers byte for byte. The
+expected values are written as tshark prints them: BIT STRINGs are FT_BYTES,
+left-aligned in whole octets, lowercase hex without "0x".
+"""
+import capture
+import gsmtap_listener
+from bench.generator import (BitWriter, encode_lte_connreq, encode_lte_paging, encode_nr_paging,
+                             encode_nr_setup, gsmtap_v2)
+from shared_queue import EventBatch
+
+TS = 1700000000.5
+
+def native_events(data):
+    batch = EventBatch()
+    assert gsmtap_listener.dispatch_datagram(data, TS, batch)
+    return batch
+
+def tshark_events(protos, fields):
+    rec = {"frame.protocols": ["gsmtap:" + protos], "frame.time_epoch": ["%.6f" % TS]}
+    rec.update(fields)
+    batch = EventBatch()
+    capture.dispatch_record(rec, batch)
+    return batch
+
+def idents(events):
+    return [(e[0], e[1], e[4], e[5]) for e in events]
+
+def test_bits_hex():
+    assert gsmtap_listener.bits_hex(0xc20184bd, 32) == "c20184bd"
+    assert gsmtap_listener.bits_hex(0x1d, 8) == "1d"
+    # 39 bits: left-aligned, the last bit of the fifth octet is padding
+    assert gsmtap_listener.bits_hex(0x7fffffffff, 39) == "fffffffffe"
+    assert gsmtap_listener.bits_hex(1, 39) == "0000000002"
+
+def test_lte_paging():
+    data = encode_lte_paging([0x0000abcd, 0xc20184bd], ["242011234567890"])
+    native = native_events(data)
+    tshark = tshark_events("lte_rrc", {
+        "lte-rrc.PagingRecord_element": ["1", "1", "1"],
+        "lte-rrc.ue_Identity": ["0", "0", "1"],
+        "lte-rrc.m_TMSI": ["0000abcd", "c20184bd"],
+        "lte-rrc.IMSI_Digit": list("242011234567890"),
+        "lte-rrc.imsi": ["15"],
+    })
+    assert idents(native) == idents(tshark)
+    assert idents(native) == [("m-TMSI", "0000abcd", "Paging", "m-TMSI"),
+                              ("m-TMSI", "c20184bd", "Paging", "m-TMSI"),
+                              ("IMSI", "242011234567890", "Paging", "IMSI")]
+
+def test_lte_paging_extension_identity():
+    # an m-TMSI record and an ng-5G-S-TMSI-r15 record (extension
+    # alternative 0: index, open type length 6, 48 bits)
+    w = BitWriter().put(0, 1).put(0b1000, 4).put(1, 4)
+    w.put(0, 3).put(0x12, 8).put(0x01020304, 32).put(0, 1)
+    w.put(0, 1).put(1, 1).put(0, 7).put(6, 8).put(0x0a0b0c0d0e0f, 48).put(0, 1)
+    before = gsmtap_listener._skipped_lte[0].value
+    native = native_events(gsmtap_v2(0x0d, 6, w.data()))
+    tshark = tshark_events("lte_rrc", {
+        "lte-rrc.PagingRecord_element": ["1", "1"],
+        "lte-rrc.ue_Identity": ["0", "2"],
+        "lte-rrc.m_TMSI": ["01020304"],
+        "lte-rrc.ng_5G_S_TMSI_r15": ["0a0b0c0d0e0f"],
+    })
+    assert idents(native) == idents(tshark) == [("m-TMSI", "01020304", "Paging", "m-TMSI")]
+    assert gsmtap_listener._skipped_lte[0].value == before + 1
+
+def test_nr_paging():
+    native = native_events(encode_nr_paging([0x00000000abcd, 0x123456789abc]))
+    tshark = tshark_events("nr-rrc", {
+        "nr-rrc.pagingRecordList": ["1"],
+        "nr-rrc.ng_5G_S_TMSI": ["00000000abcd", "123456789abc"],
+    })
+    assert idents(native) == idents(tshark)
+    assert [e[1] for e in native] == ["00000000abcd", "123456789abc"]
+
+def test_lte_connreq_s_tmsi():
+    native = native_events(encode_lte_connreq(mmec=0x1d, mtmsi=0x00c0ffee))
+    tshark = tshark_events("lte_rrc", {
+        "lte-rrc.rrcConnectionRequest_element": ["1"],
+        "lte-rrc.mmec": ["1d"],
+        "lte-rrc.m_TMSI": ["00c0ffee"],
+    })
+    assert idents(native) == idents(tshark) == [("NAS-EPS", "00c0ffee", "RRCConnectionRequest", "m-TMSI")]
+
+def test_lte_connreq_random_value():
+    native = native_events(encode_lte_connreq(randv=0x00123456ff))
+    tshark = tshark_events("lte_rrc", {
+        "lte-rrc.rrcConnectionRequest_element": ["1"],
+        "lte-rrc.randomValue": ["00123456ff"],
+    })
+    assert idents(native) == idents(tshark)
+    assert native[0][1] == "00123456ff"
+
+def test_nr_setup_part1():
+    native = native_events(encode_nr_setup(part1=0x0123456789))
+    tshark = tshark_events("nr-rrc", {"nr-rrc.ng_5G_S_TMSI_Part1": ["02468acf12"]})
+    assert idents(native) == idents(tshark)
+    assert {e[1] for e in native} == {"02468acf12"}
+
+def test_nr_setup_random_value():
+    native = native_events(encode_nr_setup(randv=0x7fffffffff))
+    tshark = tshark_events("nr-rrc", {"nr-rrc.randomValue": ["fffffffffe"]})
+    assert idents(native) == idents(tshark) == [("NAS-5GS", "fffffffffe", "RRC Setup Request", "randomValue")]
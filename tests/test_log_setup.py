@@ -0,0 +1,29 @@
+import gzip
+import logging
+
+import log_setup
+
+def test_raw_trace_is_a_complete_gzip_file(tmp_path):
+    path = tmp_path / "trace.gz"
+    try:
+        for run in range(2):
+            log_setup.setup_logging("WARNING", raw_trace=str(path))
+            raw = logging.getLogger(log_setup.RAW_LOGGER)
+            for i in range(100):
+                raw.debug("run %d line %d", run, i)
+            # held like a running process holds it: closing must not depend
+            # on the handler being garbage collected
+            handlers = [h for _, _, hs in log_setup._listeners for h in hs]
+            log_setup.shutdown_logging()
+            # readable after every shutdown; a new run appends a gzip member
+            with gzip.open(path, "rt") as f:
+                lines = f.read().splitlines()
+            assert len(lines) == 100 * (run + 1)
+            assert handlers
+        assert lines[-1].endswith("run 1 line 99")
+    finally:
+        log_setup.shutdown_logging()
+        for name in ("", log_setup.RAW_LOGGER):
+            logger = logging.getLogger(name)
+            for h in list(logger.handlers):
+                logger.removeHandler(h)
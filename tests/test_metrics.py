@@ -0,0 +1,35 @@
+import pickle
+
+import metrics
+from sources import source_trace
+
+def test_source_metrics_are_merged_and_labelled():
+    frames = metrics.Counter("test_frames_total", "Frames")
+    parse = metrics.Histogram("test_parse_seconds", "Parse time", label="stream")
+    try:
+        frames.inc(3)
+        parse.labels("paging").observe(0.001)
+        # what a source process sends through its pipe
+        snap = pickle.loads(pickle.dumps(metrics.snapshot()))
+        metrics.update_source("telia", snap)
+
+        m = metrics.collect()
+        assert m["test_frames_total"][None] == 6
+        assert m["test_parse_seconds"]["paging"].count == 1
+        assert m["test_parse_seconds"]["paging@telia"].count == 1
+
+        text = metrics.render()
+        assert "test_frames_total 3\n" in text
+        assert 'test_frames_total{source="telia"} 3\n' in text
+        assert 'test_parse_seconds_count{stream="paging",source="telia"} 1\n' in text
+        assert 'test_parse_seconds_bucket{stream="paging",source="telia",le="+Inf"} 1\n' in text
+        # one HELP/TYPE block per metric, with the source series in it
+        assert text.count("# TYPE test_frames_total counter") == 1
+    finally:
+        metrics.drop_source("telia")
+        metrics.REGISTRY.remove(frames)
+        metrics.REGISTRY.remove(parse)
+
+def test_source_trace_path():
+    assert source_trace("trace.gz", "telia") == "trace.telia.gz"
+    assert source_trace(None, "telia") is None
@@ -0,0 +1,55 @@
+import time
+
+from cell_context import CellSnapshot
+from shared_queue import Coalescer, EventBatch
+
+CELL = CellSnapshot(1, "242", "01", "100", "7", "", "", "modem1")
+
+def event(ident="c20184bd", cell=CELL, info="Paging"):
+    return ("m-TMSI", ident, time.time(), cell, info, "m-TMSI")
+
+def test_first_event_immediate_repeats_merged():
+    out = EventBatch()
+    c = Coalescer(out, window=60)
+    for _ in range(5):
+        c.put(event())
+    # the first sighting goes through at once, the repeats are held back
+    assert len(out) == 1 and len(out[0]) == 6
+    c.flush(everything=True)
+    assert len(out) == 2
+    assert out[1][6] == 4
+    assert c.events == 5 and c.merged == 3
+
+def test_snapshot_version_is_not_part_of_the_key():
+    out = EventBatch()
+    c = Coalescer(out, window=60)
+    # every MME update bumps the snapshot version
+    for version in range(1, 6):
+        c.put(event(cell=CELL._replace(version=version, mme_code=str(version))))
+    c.flush(everything=True)
+    assert len(out) == 2
+    # the merged event carries the latest snapshot
+    assert out[1][3].version == 5 and out[1][3].mme_code == "5"
+    assert out[1][6] == 4
+
+def test_different_cells_and_sources_are_not_merged():
+    out = EventBatch()
+    c = Coalescer(out, window=60)
+    c.put(event())
+    c.put(event(cell=CELL._replace(cid="8")))
+    c.put(event(cell=CELL._replace(source="modem2")))
+    c.put(event(info="RRCConnectionRequest"))
+    c.flush(everything=True)
+    assert len(out) == 4 and all(len(e) == 6 for e in out)
+
+def test_window_reopens_after_it_closed():
+    out = EventBatch()
+    c = Coalescer(out, window=0.05)
+    c.put(event())
+    c.put(event())
+    time.sleep(0.06)
+    # a closed window: its merged repeat goes out, the new event is a first
+    # sighting again
+    c.put(event())
+    assert [len(e) for e in out] == [6, 7, 6]
+    assert out[1][6] == 1
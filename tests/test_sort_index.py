@@ -0,0 +1,108 @@
+import random
+
+from id_store import IdentifierStore
+from sort_index import SortedBlocks, SortIndexes
+
+class SmallBlocks(SortedBlocks):
+    # blocks split above 8 entries, so a few hundred operations split and
+    # empty many of them
+    LOAD = 4
+
+def check(blocks, expected):
+    expected = sorted(expected)
+    assert list(blocks) == expected
+    assert list(reversed(blocks)) == expected[::-1]
+    assert len(blocks) == len(expected)
+    assert all(blocks._blocks) and all(len(b) <= 2 * blocks.LOAD for b in blocks._blocks)
+    assert blocks._maxes == [b[-1] for b in blocks._blocks]
+
+def test_matches_sorted_under_random_operations():
+    rng = random.Random(15)
+    for _ in range(20):
+        seq = iter(range(10 ** 9))
+        # few distinct values: many ties, broken by the sequence number
+        live = {(rng.randint(0, 20), next(seq)) for _ in range(rng.randint(0, 40))}
+        blocks = SmallBlocks(live)
+        check(blocks, live)
+        for _ in range(400):
+            op = rng.random()
+            if op < 0.45 or not live:
+                entry = (rng.randint(0, 20), next(seq))
+                blocks.add(entry)
+                live.add(entry)
+            elif op < 0.75:
+                entry = rng.choice(sorted(live))
+                blocks.remove(entry)
+                live.remove(entry)
+            else:
+                # update: a new value for an existing entry
+                old = rng.choice(sorted(live))
+                new = (rng.randint(0, 20), old[1])
+                blocks.remove(old)
+                blocks.add(new)
+                live.remove(old)
+                live.add(new)
+            check(blocks, live)
+
+def test_block_splits_and_empty_blocks():
+    blocks = SmallBlocks()
+    for i in range(100):
+        blocks.add(i)
+    check(blocks, range(100))
+    assert len(blocks._blocks) > 10
+    # descending inserts all land in the first block and split it
+    for i in range(-1, -50, -1):
+        blocks.add(i)
+    check(blocks, range(-49, 100))
+    # emptying blocks removes them
+    for i in range(-49, 90):
+        blocks.remove(i)
+    check(blocks, range(90, 100))
+    for i in range(90, 100):
+        blocks.remove(i)
+    check(blocks, [])
+    assert blocks._blocks == []
+    blocks.add(7)
+    check(blocks, [7])
+
+def test_bulk_load_splits_into_blocks():
+    entries = list(range(1000, 0, -1))
+    blocks = SmallBlocks(entries)
+    check(blocks, entries)
+    assert len(blocks._blocks) == 250
+
+class Rec:
+    def __init__(self, count):
+        self.count = count
+        self.last_seen = 0
+        self.first_seen = 0
+        self.lifespan = 0
+        self.tracking_area_code = ""
+        self.cell_identity = ""
+
+def test_column_index_matches_sorted_with_ties():
+    rng = random.Random(3)
+    store = IdentifierStore()
+    indexes = SortIndexes(store)
+    order = []
+    for i in range(300):
+        key = (rng.choice(["m-TMSI", "IMSI"]), "%04d" % i)
+        store[key] = Rec(rng.randint(0, 5))
+        order.append(key)
+        indexes.touch(key)
+        if i == 100:
+            # built here, then kept up to date from the touched keys
+            indexes.index(None, "count")
+            indexes.index("IMSI", "count")
+    for _ in range(500):
+        key = rng.choice(order)
+        store[key].count = rng.randint(0, 5)
+        indexes.touch(key)
+    # equal counts keep the order the identifiers were first indexed in
+    first = {key: n for n, key in enumerate(order)}
+    for filt in (None, "IMSI"):
+        keys = [k for k in order if filt is None or k[0] == filt]
+        expected = sorted(keys, key=lambda k: (store[k].count, first[k]))
+        assert list(indexes.ordered(filt, "count")) == expected
+        descending = sorted(keys, key=lambda k: store[k].count, reverse=True)
+        assert list(indexes.ordered(filt, "count", ascending=False)) == descending
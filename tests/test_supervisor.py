@@ -0,0 +1,98 @@
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import capture
+from gsmtap_listener import CHANNELS
+from supervisor import EngineSupervisor, EngineTraffic, STALL_MIN_PACKETS
+
+PORT = 47290
+
+def gsmtap_v2(gtype, sub):
+    hdr = bytearray(16)
+    hdr[0], hdr[1], hdr[2], hdr[12] = 2, 4, gtype, sub
+    return bytes(hdr) + b"\x40\x00"
+
+def send(port, data, n):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        for _ in range(n):
+            s.sendto(data, ("127.0.0.1", port))
+
+def traffic_or_skip(**kwargs):
+    try:
+        return EngineTraffic("lo", (PORT,), **kwargs)
+    except OSError as e:
+        pytest.skip(f"no packet socket on lo: {e}")
+
+def silent_engine():
+    """
+    A tshark stand-in that never prints anything.
+    """
+    proc = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    reader = threading.Thread(target=proc.wait, daemon=True)
+    reader.start()
+    return proc, reader
+
+class StatusQueue(list):
+    def put(self, item):
+        self.append(item[1]["message"])
+
+def supervise(traffic, feed, seconds=1.5):
+    """
+    Run a silent engine under a supervisor for `seconds`, calling `feed()`
+    meanwhile. Returns the status messages.
+    """
+    statuses = StatusQueue()
+    sup = EngineSupervisor(silent_engine, progress=lambda: 0, traffic=traffic, status_queue=statuses,
+                           stall_timeout=0.5, check_interval=0.1, max_restarts=0)
+    runner = threading.Thread(target=sup.run, daemon=True)
+    runner.start()
+    end = time.monotonic() + seconds
+    while runner.is_alive() and time.monotonic() < end:
+        feed()
+        time.sleep(0.05)
+    sup.stop()
+    runner.join(10)
+    assert sup.proc.poll() is not None
+    return statuses
+
+def test_counts_only_engine_gsmtap():
+    traffic = traffic_or_skip(types=[capture.GSMTAP_TYPES["lte_rrc"]], exclude=list(CHANNELS))
+    try:
+        send(PORT + 1, gsmtap_v2(0x0d, 0), 20)       # other port
+        send(PORT, gsmtap_v2(0x12, 0), 20)           # channel type not captured
+        send(PORT, gsmtap_v2(0x0d, 6), 20)           # decoded natively (LTE PCCH)
+        time.sleep(0.1)
+        assert traffic() == 0
+        send(PORT, gsmtap_v2(0x0d, 4), 7)            # LTE RRC DL-DCCH: tshark's
+        time.sleep(0.1)
+        assert traffic() == 7
+    finally:
+        traffic.close()
+
+def test_unrelated_traffic_is_no_stall():
+    traffic = traffic_or_skip(exclude=list(CHANNELS))
+    try:
+        statuses = supervise(traffic, lambda: (send(PORT + 1, gsmtap_v2(0x0d, 4), 50),
+                                               send(PORT, gsmtap_v2(0x0d, 6), 50)))
+    finally:
+        traffic.close()
+    assert statuses[-1] == "capture stopped"
+    assert not any("stalled" in m for m in statuses)
+
+def test_engine_traffic_stall():
+    traffic = traffic_or_skip()
+    try:
+        statuses = supervise(traffic, lambda: send(PORT, gsmtap_v2(0x0d, 4), STALL_MIN_PACKETS))
+    finally:
+        traffic.close()
+    # max_restarts=0: the stall ends the run instead of restarting
+    assert statuses[-1].startswith("engine stalled")
+
+def test_no_traffic_count_is_no_stall():
+    statuses = supervise(None, lambda: None)
+    assert statuses[-1] == "capture stopped"
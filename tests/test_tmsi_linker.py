@@ -0,0 +1,155 @@
+import random
+
+from cell_context import CellSnapshot
+from privacy_tests import PrivacyTests
+from tmsi_linker import REALLOC_LIMIT, SWEEP_INTERVAL, TmsiLinker
+
+CELL = CellSnapshot(1, "242", "01", "100", "7", "1", "2", "modem1")
+LATE = REALLOC_LIMIT + 800
+
+def reallocate(linker, ts, old, new, request="TAU Request", accept="TAU Accept", cell=CELL):
+    """
+    A connection of the UE holding `old` in which it is given `new`.
+    """
+    linker.observe(old, ts, cell, "RRCConnectionRequest", "m-TMSI")
+    linker.observe(old, ts + 0.2, cell, request, "m-TMSI")
+    linker.observe(new, ts + 0.5, cell, accept, "m-TMSI")
+
+def privacy_test7(linker):
+    return PrivacyTests(linker).fill()[6]
+
+def chain_of(linker, ident, disp_type="m-TMSI"):
+    return linker.identities[disp_type, ident][0]
+
+def test_links_reallocations():
+    linker = TmsiLinker()
+    reallocate(linker, 0, "aaaa0001", "bbbb0002")
+    reallocate(linker, 600, "bbbb0002", "cccc0003", accept="GUTI Reallocation Command")
+    chain = chain_of(linker, "cccc0003")
+    assert [m[1] for m in chain.members] == ["aaaa0001", "bbbb0002", "cccc0003"]
+    assert chain is chain_of(linker, "aaaa0001")
+    assert list(linker.linked) == [chain.id]
+    # aaaa0001 was first seen in a request: only bbbb0002's interval counts
+    assert chain.intervals() == [600.0]
+    assert linker.intervals_seen == 1 and linker.slow_chains == 0
+    assert privacy_test7(linker)["result"] == "Pass"
+
+def test_ambiguous_connections_do_not_link():
+    linker = TmsiLinker()
+    linker.observe("aaaa0001", 0, CELL, "RRCConnectionRequest", "m-TMSI")
+    linker.observe("dddd0004", 0.1, CELL, "RRCConnectionRequest", "m-TMSI")
+    linker.observe("bbbb0002", 0.5, CELL, "TAU Accept", "m-TMSI")
+    assert linker.ambiguous == 1
+    assert not linker.linked
+    # and another cell's connection is no candidate at all
+    linker.observe("eeee0005", 10, CELL._replace(cid="8"), "RRCConnectionRequest", "m-TMSI")
+    linker.observe("ffff0006", 10.5, CELL, "TAU Accept", "m-TMSI")
+    assert not linker.linked
+
+def test_slow_reallocation_fails_test7():
+    linker = TmsiLinker()
+    assert privacy_test7(linker)["result"] == "Pending"
+    reallocate(linker, 0, "aaaa0001", "bbbb0002")
+    reallocate(linker, LATE, "bbbb0002", "cccc0003")
+    assert linker.slow_chains == 1
+    result = privacy_test7(linker)
+    assert result["result"] == "Fail"
+    assert "bbbb0002 held 2.2 h" in result["info"] and "Total= 1" in result["info"]
+
+def test_merge_accounts_the_merged_intervals():
+    linker = TmsiLinker()
+    # UE seen as aaaa0001 -> bbbb0002 ...
+    reallocate(linker, 0, "aaaa0001", "bbbb0002")
+    # ... and, unlinked, attaching with a randomValue and getting cccc0003
+    linker.observe("1234567890", LATE, CELL, "RRCConnectionRequest", "randomValue")
+    linker.observe("242011234567890", LATE + 0.2, CELL, "Attach Request", "IMSI")
+    linker.observe("cccc0003", LATE + 0.5, CELL, "Attach Accept", "m-TMSI")
+    first, second = chain_of(linker, "bbbb0002"), chain_of(linker, "cccc0003")
+    assert first is not second
+    assert linker.intervals_seen == 0
+    # a connection that shows both chains' identities merges them
+    linker.observe("cccc0003", LATE + 100, CELL, "RRCConnectionRequest", "m-TMSI")
+    linker.observe("bbbb0002", LATE + 100.2, CELL, "TAU Request", "m-TMSI")
+    merged = chain_of(linker, "bbbb0002")
+    assert merged is chain_of(linker, "cccc0003") is chain_of(linker, "242011234567890", "IMSI")
+    assert list(linker.linked) == [merged.id]
+    assert [m[1] for m in merged.tmsis()] == ["aaaa0001", "bbbb0002", "cccc0003"]
+    # bbbb0002 (assigned at 0.5) was only replaced by cccc0003 in the merge
+    assert linker.intervals_seen == 1 and linker.slow_chains == 1
+    assert list(linker.slow_reallocs) == [merged.id]
+
+def test_eviction_keeps_the_test7_count():
+    linker = TmsiLinker(max_chains=1)
+    reallocate(linker, 0, "aaaa0001", "bbbb0002")
+    reallocate(linker, LATE, "bbbb0002", "cccc0003")
+    reallocate(linker, LATE + 10, "dddd0004", "eeee0005")
+    assert len(linker.linked) == 1
+    assert linker.slow_reallocs == {}
+    assert linker.slow_chains == 1
+    assert privacy_test7(linker)["result"] == "Fail"
+
+def test_expiry():
+    linker = TmsiLinker(ttl=100)
+    reallocate(linker, 0, "aaaa0001", "bbbb0002")
+    assert ("m-TMSI", "bbbb0002") in linker.identities
+    linker.observe("ffff0006", 50, CELL, "Paging", "m-TMSI")
+    linker.observe("bbbb0002", 60, CELL, "Paging", "m-TMSI")
+    # the first sweep after the TTL drops what wasn't seen since
+    linker.observe("ffff0006", 60 + SWEEP_INTERVAL + 1, CELL, "Paging", "m-TMSI")
+    assert ("m-TMSI", "aaaa0001") not in linker.identities
+    assert ("m-TMSI", "bbbb0002") in linker.identities
+    linker.observe("ffff0006", 200 + 2 * SWEEP_INTERVAL, CELL, "Paging", "m-TMSI")
+    assert ("m-TMSI", "bbbb0002") not in linker.identities
+    # expiry forgets the identity, not the chain
+    assert len(linker.linked) == 1
+    assert not linker.open
+
+def test_identities_stay_in_timestamp_order():
+    rng = random.Random(7)
+    linker = TmsiLinker(ttl=600)
+    tmsis = ["%08x" % rng.getrandbits(32) for _ in range(50)]
+    kinds = ["RRCConnectionRequest", "TAU Request", "TAU Accept", "Attach Accept",
+             "GUTI Reallocation Command", "Paging"]
+    ts = 0.0
+    for _ in range(5000):
+        ts += rng.random() * 0.5
+        cell = CELL._replace(cid=str(rng.randint(1, 3)))
+        linker.observe(rng.choice(tmsis), ts, cell, rng.choice(kinds), "m-TMSI")
+        stamps = [entry[1] for entry in linker.identities.values()]
+        assert stamps == sorted(stamps)
+    assert linker.links
+
+def test_snapshot_round_trip():
+    linker = TmsiLinker()
+    reallocate(linker, 0, "aaaa0001", "bbbb0002")
+    reallocate(linker, LATE, "bbbb0002", "cccc0003")
+    reallocate(linker, 50, "dddd0004", "eeee0005")
+    loaded = TmsiLinker()
+    loaded.load_snapshot(linker.snapshot())
+    assert [c.to_list() for c in loaded.chains()] == [c.to_list() for c in linker.chains()]
+    assert (loaded.intervals_seen, loaded.slow_chains) == (linker.intervals_seen, linker.slow_chains)
+    assert loaded.slow_reallocs == linker.slow_reallocs
+    stamps = [entry[1] for entry in loaded.identities.values()]
+    assert stamps == sorted(stamps)
+
+def test_merge_while_a_connection_is_open_on_the_absorbed_chain():
+    linker = TmsiLinker()
+    other_cell = CELL._replace(cid="8")
+    reallocate(linker, 0, "aaaa0001", "bbbb0002", cell=other_cell)
+    reallocate(linker, 10, "dddd0004", "eeee0005")
+    absorbed = chain_of(linker, "bbbb0002")
+    # a connection of the UE opens on its chain in one cell...
+    linker.observe("bbbb0002", 1000, other_cell, "TAU Request", "m-TMSI")
+    # ...while in another cell it is seen on a connection of the other chain
+    linker.observe("eeee0005", 1000.1, CELL, "RRCConnectionRequest", "m-TMSI")
+    linker.observe("bbbb0002", 1000.2, CELL, "TAU Request", "m-TMSI")
+    merged = chain_of(linker, "eeee0005")
+    assert chain_of(linker, "bbbb0002") is merged and absorbed.live() is merged
+    assert list(linker.linked) == [merged.id]
+    # the first connection gets the new TMSI: it goes to the merged chain,
+    # the absorbed one is not linked again
+    linker.observe("ffff0006", 1000.5, other_cell, "TAU Accept", "m-TMSI")
+    assert chain_of(linker, "ffff0006") is merged
+    assert list(linker.linked) == [merged.id]
+    assert linker.intervals_seen == len(merged.intervals())
+    assert privacy_test7(linker)["result"] == "Pass"
@@ -0,0 +1,422 @@
+"""
+Links the identifiers of one UE across TMSI reallocations.
+
+A passive capture sees a UE identify itself when it sets up a connection
+(RRCConnectionRequest / RRC Setup Request with its S-TMSI or a randomValue,
+then Attach/TAU/Service/Registration Request) and, in the same connection,
+the network assign it a new TMSI (GUTI Reallocation Command/Complete,
+Attach/TAU/Registration Accept). A handover hands it a new UE identity
+(RRCReconfiguration newUE_Identity). Each such step is tied to the
+connection it belongs to by cell and time, and the identifiers of a UE end
+up in one chain:
+
+    0x1a2b3c4d --(TAU, 41 min)--> 0x5e6f7a8b --(GUTI Realloc, 2 h 3 min)--> ...
+
+Two hash indexes keep this O(1) per event:
+
+    open      cell -> deque of the connections opened there in the last
+              `window` seconds; expired from the left as events arrive
+    identity  (ID type, identifier) -> chain, in the order the identities
+              were last seen (event time); identities not seen for `ttl`
+              seconds are dropped from the front every SWEEP_INTERVAL seconds
+
+A step only links when exactly one connection of the cell is a candidate;
+with several UEs connecting within `window` it is counted as ambiguous and
+starts a chain of its own. Time is the capture time of the events, so a
+replayed session links the same way as the live one.
+"""
+from collections import OrderedDict, deque
+
+# seconds between a connection request and the messages that belong to it
+LINK_WINDOW = 2.0
+# seconds an identifier is remembered after it was last seen
+IDENTITY_TTL = 6 * 3600
+# linked chains (two identifiers or more) kept for display and export
+MAX_CHAINS = 100000
+# a TMSI kept longer than this before reallocation is reported (privacy test 7)
+REALLOC_LIMIT = 7200
+
+# identifier types that take part in chains
+TMSI_TYPES = ("m-TMSI", "5G-TMSI")
+MEMBER_TYPES = frozenset(TMSI_TYPES + ("IMSI", "randomValue", "UE-IDENTITY"))
+# short-lived identities (C-RNTIs) that are added to chains but never looked up
+UNINDEXED_TYPES = ("UE-IDENTITY",)
+
+# packet_info -> step kind
+RRC_OPEN = "rrc"         # connection request, starts a connection
+NAS_OPEN = "nas"         # first NAS message of the connection
+ASSIGN = "assign"        # new TMSI for the UE of the connection
+HANDOVER = "handover"    # new UE identity for the UE of the connection
+STEPS = {
+    "RRCConnectionRequest": RRC_OPEN,
+    "RRC Setup Request": RRC_OPEN,
+    "Attach Request": NAS_OPEN,
+    "TAU Request": NAS_OPEN,
+    "Extended Service Request": NAS_OPEN,
+    "Registration request": NAS_OPEN,
+    "Service request": NAS_OPEN,
+    "GUTI Reallocation Command": ASSIGN,
+    "GUTI Reallocation Complete": ASSIGN,
+    "Attach Accept": ASSIGN,
+    "TAU Accept": ASSIGN,
+    "Registration accept": ASSIGN,
+    "RRCReconfiguration": HANDOVER,
+}
+
+# seconds (capture time) between expiring identities and dropping cells
+# without connections
+SWEEP_INTERVAL = 60.0
+
+class Chain:
+    """
+    The identifiers of one UE in the order they were linked. members are
+    (ts, identifier, ID type, packet_info) tuples. A chain merged into
+    another one points at it with merged_into.
+    """
+    __slots__ = ("id", "members", "cell", "source", "last_seen", "merged_into")
+
+    def __init__(self, chain_id, member, cell):
+        self.id = chain_id
+        self.members = [member]
+        self.cell = cell
+        self.source = cell[0]
+        self.last_seen = member[0]
+        self.merged_into = None
+
+    def live(self):
+        """
+        The chain this one ended up in after merges (itself if none).
+        """
+        chain = self
+        while chain.merged_into is not None:
+            chain = chain.merged_into
+        return chain
+
+    def tmsis(self):
+        return [m for m in self.members if m[2] in TMSI_TYPES]
+
+    def intervals(self):
+        """
+        Seconds each TMSI of the chain was used before it was reallocated.
+        Only TMSIs seen being assigned count; one first seen in a request
+        was assigned at an unknown time.
+        """
+        tmsis = self.tmsis()
+        return [b[0] - a[0] for a, b in zip(tmsis, tmsis[1:]) if STEPS.get(a[3]) == ASSIGN]
+
+    def reallocations(self):
+        return max(len(self.tmsis()) - 1, 0)
+
+    def to_list(self):
+        return [self.id, list(self.cell), self.last_seen, [list(m) for m in self.members]]
+
+    @classmethod
+    def from_list(cls, row):
+        chain_id, cell, last_seen, members = row
+        chain = cls(chain_id, tuple(members[0]), tuple(cell))
+        chain.members = [tuple(m) for m in members]
+        chain.last_seen = last_seen
+        return chain
+
+class _Connection:
+    __slots__ = ("ts", "chain", "member", "has_nas", "assigned")
+
+    def __init__(self, ts, chain, member):
+        self.ts = ts
+        self.chain = chain
+        self.member = member     # identity of a connection without a chain yet
+        self.has_nas = False
+        self.assigned = False
+
+class TmsiLinker:
+    def __init__(self, window=LINK_WINDOW, ttl=IDENTITY_TTL, max_chains=MAX_CHAINS):
+        self.window = window
+        self.ttl = ttl
+        self.max_chains = max_chains
+        self.open = {}                   # cell key -> deque of _Connection
+        self.identities = OrderedDict()  # (ID type, identifier) -> [chain, last seen]
+        self.linked = OrderedDict()      # chain id -> Chain with 2+ members, oldest first
+        self.links = 0
+        self.ambiguous = 0
+        # reallocation intervals seen and chains with one > REALLOC_LIMIT,
+        # evicted chains included; slow_reallocs holds the text of the
+        # slow chains still in `linked`
+        self.intervals_seen = 0
+        self.slow_chains = 0
+        self.slow_reallocs = {}
+        self._next_id = 1
+        self._next_sweep = 0.0
+        self._ts = 0.0
+        # open model.FrozenViews: a chain's row is saved before it changes
+        self.frozen = ()
+
+    # ---------------- Events ----------------
+    def observe(self, ident, ts, cell, packet_info, disp_type):
+        """
+        Apply one identifier event (the fields of a capture event tuple).
+        """
+        if disp_type not in MEMBER_TYPES:
+            return
+        self._ts = max(self._ts, ts)
+        if ts >= self._next_sweep:
+            self._sweep(ts)
+            self._next_sweep = ts + SWEEP_INTERVAL
+
+        key = (disp_type, ident)
+        ids = self.identities
+        entry = ids.get(key)
+        if entry is not None:
+            entry[1] = self._ts
+            if ts > entry[0].last_seen:
+                for view in self.frozen:
+                    view.save_chain(entry[0])
+                entry[0].last_seen = ts
+            ids.move_to_end(key)
+        step = STEPS.get(packet_info)
+        if step is None:
+            return
+        # source, PLMN, TAC and CID of the snapshot
+        ckey = (cell[7], cell[1], cell[2], cell[3], cell[4])
+        member = (ts, ident, disp_type, packet_info)
+        chain = entry[0] if entry is not None else None
+
+        if step == RRC_OPEN:
+            self._open(ckey, ts).append(_Connection(ts, chain, member))
+        elif step == NAS_OPEN:
+            conn = self._candidate(ckey, ts, lambda c: not c.has_nas)
+            if conn is None:
+                conn = _Connection(ts, chain, member)
+                self._open(ckey, ts).append(conn)
+            else:
+                self._join(conn, chain, member, ckey)
+            conn.has_nas = True
+        elif step == HANDOVER:
+            conn = self._candidate(ckey, ts, lambda c: True)
+            if conn is not None:
+                self._join(conn, None, member, ckey)
+        elif entry is None:
+            # a TMSI not seen before
+            conn = self._candidate(ckey, ts, lambda c: not c.assigned)
+            if conn is None:
+                self._new_chain(member, ckey)
+            else:
+                self._join(conn, None, member, ckey)
+                conn.assigned = True
+
+    def _open(self, ckey, ts):
+        conns = self.open.get(ckey)
+        if conns is None:
+            conns = self.open[ckey] = deque()
+        else:
+            self._expire_open(conns, ts)
+        return conns
+
+    def _expire_open(self, conns, ts):
+        limit = ts - self.window
+        while conns and conns[0].ts < limit:
+            conns.popleft()
+
+    def _candidate(self, ckey, ts, pick):
+        """
+        The one open connection of the cell that `pick` accepts, or None if
+        there is none or more than one (counted as ambiguous).
+        """
+        conns = self.open.get(ckey)
+        if not conns:
+            return None
+        self._expire_open(conns, ts)
+        found = None
+        for conn in conns:
+            if pick(conn):
+                if found is not None:
+                    self.ambiguous += 1
+                    return None
+                found = conn
+        return found
+
+    def _join(self, conn, chain, member, ckey):
+        """
+        Link `member` (with the chain it is in, if any) to the UE of `conn`.
+        """
+        if conn.chain is not None:
+            # the connection's chain may have been merged since it opened
+            conn.chain = conn.chain.live()
+        elif chain is None:
+            conn.chain = self._new_chain(conn.member, ckey)
+        else:
+            conn.chain = chain
+            self._add(chain, conn.member, ckey)
+        if chain is None:
+            self._add(conn.chain, member, ckey)
+        elif chain is not conn.chain:
+            self._merge(conn.chain, chain)
+
+    # ---------------- Chains ----------------
+    def _new_chain(self, member, ckey):
+        chain = Chain(self._next_id, member, ckey)
+        self._next_id += 1
+        self._index((member[2], member[1]), chain)
+        return chain
+
+    def _index(self, key, chain):
+        """
+        Point identity `key` at `chain`, seen now: it moves to the end, so
+        `identities` stays in timestamp order for the expiry.
+        """
+        ids = self.identities
+        entry = ids.get(key)
+        if entry is None:
+            ids[key] = [chain, self._ts]
+        else:
+            entry[0] = chain
+            entry[1] = self._ts
+            ids.move_to_end(key)
+
+    def _add(self, chain, member, ckey):
+        key = (member[2], member[1])
+        if key in self.identities:
+            return
+        for view in self.frozen:
+            view.save_chain(chain)
+        tmsi = member[2] in TMSI_TYPES
+        if tmsi:
+            self._account(chain, -1)
+        chain.members.append(member)
+        chain.cell = ckey
+        chain.last_seen = max(chain.last_seen, member[0])
+        if member[2] not in UNINDEXED_TYPES:
+            self._index(key, chain)
+        self.links += 1
+        self._mark_linked(chain)
+        if tmsi:
+            self._account(chain, 1)
+
+    def _account(self, chain, sign):
+        """
+        Add (sign 1) or remove (-1) the reallocation intervals of `chain`
+        to/from the totals; a chain is taken out before it changes and put
+        back after, so the totals always match its current members.
+        """
+        tmsis = chain.tmsis()
+        held = [(b[0] - a[0], a[1]) for a, b in zip(tmsis, tmsis[1:]) if STEPS.get(a[3]) == ASSIGN]
+        if not held:
+            return
+        self.intervals_seen += sign * len(held)
+        seconds, tmsi = max(held)
+        if seconds <= REALLOC_LIMIT:
+            return
+        self.slow_chains += sign
+        if sign < 0:
+            self.slow_reallocs.pop(chain.id, None)
+        elif chain.id in self.linked:
+            self.slow_reallocs[chain.id] = f"{tmsi} held {seconds / 3600:.1f} h"
+
+    def _merge(self, into, other):
+        """
+        Move the identities of `other` into `into` (the same UE was seen
+        under both before they were linked).
+        """
+        for view in self.frozen:
+            view.save_chain(into)
+        self._account(into, -1)
+        self._account(other, -1)
+        into.members.extend(other.members)
+        into.members.sort()
+        into.last_seen = max(into.last_seen, other.last_seen)
+        for m in other.members:
+            entry = self.identities.get((m[2], m[1]))
+            if entry is not None:
+                entry[0] = into
+        # open connections still holding `other` follow the pointer in _join
+        other.merged_into = into
+        self.linked.pop(other.id, None)
+        self.links += 1
+        self._mark_linked(into)
+        self._account(into, 1)
+
+    def _mark_linked(self, chain):
+        self.linked[chain.id] = chain
+        self.linked.move_to_end(chain.id)
+        while len(self.linked) > self.max_chains:
+            # the totals keep counting an evicted chain, its text goes
+            evicted, _chain = self.linked.popitem(last=False)
+            self.slow_reallocs.pop(evicted, None)
+
+    # ---------------- Expiry ----------------
+    def _expire_identities(self, ts):
+        limit = ts - self.ttl
+        ids = self.identities
+        while ids:
+            key, entry = next(iter(ids.items()))
+            if entry[1] >= limit:
+                break
+            del ids[key]
+
+    def _sweep(self, ts):
+        self._expire_identities(ts)
+        for ckey in list(self.open):
+            conns = self.open[ckey]
+            self._expire_open(conns, ts)
+            if not conns:
+                del self.open[ckey]
+
+    # ---------------- Views ----------------
+    def chains(self, limit=None):
+        """
+        Linked chains, most recently updated first.
+        """
+        out = []
+        for chain in reversed(self.linked.values()):
+            if limit is not None and len(out) >= limit:
+                break
+            out.append(chain)
+        return out
+
+    def stats(self):
+        return {"chains": len(self.linked), "links": self.links, "ambiguous": self.ambiguous,
+                "identities": len(self.identities),
+                "open": sum(len(c) for c in self.open.values())}
+
+    def snapshot(self):
+        """
+        JSON-serializable copy of the linked chains, see load_snapshot().
+        Open connections are not kept.
+        """
+        return [chain.to_list() for chain in self.linked.values()]
+
+    def load_snapshot(self, rows):
+        frozen = self.frozen
+        self.__init__(self.window, self.ttl, self.max_chains)
+        self.frozen = frozen
+        chains = [Chain.from_list(row) for row in rows]
+        for chain in chains:
+            self.linked[chain.id] = chain
+            self._next_id = max(self._next_id, chain.id + 1)
+            self._account(chain, 1)
+        # identities in timestamp order, as observe() keeps them
+        for chain in sorted(chains, key=lambda c: c.last_seen):
+            self._ts = chain.last_seen
+            for m in chain.members:
+                if m[2] not in UNINDEXED_TYPES:
+                    self._index((m[2], m[1]), chain)
+
+# ---------------- Table ----------------
+CHAIN_COLUMNS = [
+    "Chain", "Source", "MCC", "MNC", "TAC", "CID", "Identifiers",
+    "Reallocations", "Intervals", "Last Seen"
+]
+CHAIN_KINDS = ["int"] + ["str"] * 6 + ["int", "str", "ts"]
+
+def chain_row(chain):
+    """
+    One row of CHAIN_COLUMNS: the identifiers in link order and the
+    reallocation intervals in whole seconds.
+    """
+    source, mcc, mnc, tac, cid = chain.cell
+    return (
+        chain.id, source, mcc, mnc, tac, cid,
+        " > ".join(m[1] for m in chain.members),
+        chain.reallocations(),
+        ",".join(str(int(round(s))) for s in chain.intervals()),
+        chain.last_seen,
+    )